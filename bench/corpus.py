@@ -0,0 +1,122 @@
+import html
+import json
+import os
+import random
+import re
+from xml.sax.saxutils import escape
+
+from src.feed.models import FeedItemDescriptionBlock
+
+RESULT_PATH = os.path.join(os.path.dirname(__file__), '..', 'result.json')
+SIZES = (10, 100, 1000, 10000)
+SHAPES = ('synthetic', 'result', 'atom')
+
+WORDS = ('carro', 'motor', 'elétrico', 'preço', 'lançamento', 'versão', 'câmbio', 'consumo', 'potência', 'teste',
+         'rodovia', 'segurança', 'mercado', 'vendas', 'modelo', 'híbrido', 'autonomia', 'bateria', 'design', 'cidade',
+         'the', 'new', 'engine', 'price', 'review', 'launch', 'fuel', 'power', 'safety', 'market', 'sales', '2019')
+
+
+def read_result():
+    """
+    :return: The items of result.json, as dictionaries.
+    """
+    with open(RESULT_PATH, encoding='utf-8') as f:
+        # result.json's items are "item" keyed pairs inside a list, which have to be unwrapped to be valid JSON.
+        return json.loads(re.sub(r'"item":\s*{', '{', f.read()))['feed']
+
+
+def description_html(blocks):
+    """
+    Turns an item's parsed description back into HTML shaped like the one it was parsed from.
+
+    :param blocks: The description's blocks, as serialized in result.json.
+    :return: The description HTML.
+    """
+    parts = []
+    for block in blocks:
+        if block['type'] == FeedItemDescriptionBlock.TEXT_TYPE:
+            parts.append(f'<p>\n\t{html.escape(block["content"])}</p>')
+        elif block['type'] == FeedItemDescriptionBlock.IMAGE_TYPE:
+            parts.append(f'<div><img src="{html.escape(block["content"])}" /></div>')
+        else:
+            links = ''.join(f'<li><a href="{html.escape(link)}">link</a></li>' for link in block['content'])
+            parts.append(f'<div><ul>{links}</ul></div>')
+    return '\n'.join(parts)
+
+
+def result_items():
+    """
+    Loads the items of result.json, turning each description back into HTML shaped like the one it was parsed from.
+
+    :return: A list of (title, link, description HTML) tuples.
+    """
+    return [(item['title'], item['link'], description_html(item['description'])) for item in read_result()]
+
+
+def synthetic_description(rng, index):
+    parts = []
+    for block in range(rng.randint(1, 8)):
+        kind = rng.random()
+        if kind < 0.65:
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 60)))
+            parts.append(f'<p>\n\t{text}&nbsp;<b>{rng.choice(WORDS)}</b> &amp; {rng.choice(WORDS)}.</p>')
+        elif kind < 0.85:
+            parts.append(f'<div><img src="https://img.example.com/{index}/{block}.jpg" alt="{rng.choice(WORDS)}" />'
+                         f'</div>')
+        else:
+            links = ''.join(f'<li><a href="https://example.com/noticia/{index}/{link}.html">{rng.choice(WORDS)}</a>'
+                            f'</li>' for link in range(rng.randint(1, 4)))
+            parts.append(f'<div><ul>{links}</ul></div>')
+    return '\n'.join(parts)
+
+
+def generate_feed(size, shape='synthetic', seed=0):
+    """
+    Generates a feed, identical for the same arguments.
+
+    :param size: Number of items.
+    :param shape: 'synthetic', for random items, 'result', for result.json's items repeated over and over, or 'atom',
+    for random items in an Atom feed.
+    :param seed: Seed of the random generator.
+    :return: The feed's contents, as bytes.
+    """
+    if shape == 'atom':
+        return generate_atom_feed(size, seed)
+    rng = random.Random(f'{shape}:{size}:{seed}')
+    templates = result_items() if shape == 'result' else None
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel>',
+             f'<title>{shape} feed</title><link>https://example.com/{shape}</link>']
+    for index in range(size):
+        if templates is not None:
+            title, link, description = templates[index % len(templates)]
+            link = f'{link}?item={index}'
+        else:
+            title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+            link = f'https://example.com/noticia/{seed}/{index}.html'
+            description = synthetic_description(rng, index)
+        parts.append(f'<item><title>{escape(title)}</title><link>{escape(link)}</link>'
+                     f'<guid isPermaLink="false">{shape}-{seed}-{index}</guid>'
+                     f'<description>{escape(description)}</description></item>')
+    parts.append('</channel></rss>')
+    return ''.join(parts).encode('utf-8')
+
+
+def generate_atom_feed(size, seed=0):
+    """
+    Generates an Atom feed of random items, shaped like the synthetic RSS ones.
+
+    :param size: Number of entries.
+    :param seed: Seed of the random generator.
+    :return: The feed's contents, as bytes.
+    """
+    rng = random.Random(f'atom:{size}:{seed}')
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">',
+             '<title>atom feed</title><link href="https://example.com/atom"/><id>https://example.com/atom</id>']
+    for index in range(size):
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+        link = f'https://example.com/noticia/{seed}/{index}.html'
+        parts.append(f'<entry><title>{escape(title)}</title><link rel="alternate" href="{escape(link)}"/>'
+                     f'<id>atom-{seed}-{index}</id><updated>2019-01-01T00:00:00Z</updated>'
+                     f'<content type="html">{escape(synthetic_description(rng, index))}</content></entry>')
+    parts.append('</feed>')
+    return ''.join(parts).encode('utf-8')
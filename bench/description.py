@@ -0,0 +1,93 @@
+"""
+Microbenchmarks the description parsing backends, on the descriptions of the corpus' feeds:
+
+    python -m bench.description [--backends soup events] [--shapes synthetic result] [--size 1000] [--repeat 5]
+
+Unlike bench.run, which times the configured backend as one of the pipeline's stages, every backend is timed here on
+the same descriptions, already extracted from their feeds, reporting the median time spent per item. Backends are
+also checked to produce identical blocks, so that a backend drifting from the others does not go unnoticed.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from bench.corpus import SHAPES, generate_feed
+from src.feed.description import DESCRIPTION_PARSERS, create_description_parser
+from src.feed.formats import detect_format
+from src.feed.reader import FeedReader
+
+
+def corpus_descriptions(shape, size, seed=0):
+    """
+    :param shape: Corpus shape, as accepted by generate_feed.
+    :param size: Number of items.
+    :param seed: Seed of the corpus.
+    :return: A list of the feed's descriptions HTML, one per item.
+    """
+    FeedReader.XML_PARSER.max_bytes = max(FeedReader.XML_PARSER.max_bytes, 256 * 1024 * 1024)
+    root = FeedReader.get_feed_root(generate_feed(size, shape, seed))
+    feed_format = detect_format(root.tag)
+    descriptions = (feed_format.description(item) for item in root.iterfind(feed_format.ITEM_TAG))
+    return [description.text or '' if description is not None else '' for description in descriptions]
+
+
+def serialize(blocks):
+    return '[' + ', '.join(block.to_json() for block in blocks) + ']'
+
+
+def measure_backends(backends, descriptions, repeat):
+    """
+    :param backends: Names of the backends to time, as accepted by create_description_parser.
+    :param descriptions: Descriptions HTML.
+    :param repeat: Number of timed runs of each backend.
+    :return: A dictionary mapping each backend to its median microseconds per item, and a digest of its output.
+    """
+    results = {}
+    for name in backends:
+        backend = create_description_parser(name)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text in descriptions:
+                backend.parse(text)
+            timings.append(time.perf_counter() - start)
+        seconds = statistics.median(timings)
+        output = [serialize(backend.parse(text)) for text in descriptions]
+        results[name] = {'us_per_item': seconds / len(descriptions) * 1e6 if descriptions else 0.0,
+                         'output': hash(tuple(output))}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Microbenchmarks the description parsing backends.')
+    parser.add_argument('--backends', nargs='+', choices=sorted(DESCRIPTION_PARSERS),
+                        default=sorted(DESCRIPTION_PARSERS))
+    parser.add_argument('--shapes', nargs='+', choices=SHAPES, default=list(SHAPES))
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file the results are written to, as JSON')
+    args = parser.parse_args(argv)
+
+    results = {}
+    status = 0
+    print(f'{"shape":<12} {"backend":<10} {"us/item":>10} {"items/s":>12}')
+    for shape in args.shapes:
+        results[shape] = measure_backends(args.backends, corpus_descriptions(shape, args.size, args.seed), args.repeat)
+        for name, measured in results[shape].items():
+            rate = 1e6 / measured['us_per_item'] if measured['us_per_item'] else 0.0
+            print(f'{shape:<12} {name:<10} {measured["us_per_item"]:>10.1f} {rate:>12.0f}')
+        if len({measured['output'] for measured in results[shape].values()}) > 1:
+            print(f'MISMATCH {shape}: the backends produced different blocks')
+            status = 1
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({shape: {name: measured['us_per_item'] for name, measured in measured_backends.items()}
+                       for shape, measured_backends in results.items()}, f, indent=2, sort_keys=True)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Benchmarks the feed pipeline's stages against a seeded corpus, served by a local stand-in HTTP server:
+
+    python -m bench.run [--sizes 10 100 1000 10000] [--shapes synthetic result] [--repeat 5] [--check]
+
+Each stage is timed separately, reporting its median time, its throughput in items per second and its peak memory,
+and compared against bench/baseline.json. Stages slower, or hungrier, than the baseline by more than the tolerance are
+flagged as regressions. Timings depend on the machine, so the baseline should be saved again, with --save-baseline,
+when the reference machine changes.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from bench.corpus import SIZES, SHAPES
+from bench.server import CorpusServer
+from src.feed.formats import detect_format
+from src.feed.reader import FeedReader, FeedParser
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+STAGES = ('get_content', 'get_feed_root', 'parse_feed', 'parse_description', 'to_json')
+# The biggest result shaped feeds are past the default HTTP_MAX_BYTES and XML_MAX_BYTES.
+MAX_BYTES = 256 * 1024 * 1024
+# Differences below these many seconds, or bytes, are noise, and never flagged.
+NOISE_FLOOR = {'seconds': 0.0005, 'peak_bytes': 64 * 1024}
+
+
+def stage_runs(url):
+    """
+    Builds the functions running each of the pipeline's stages for a feed, along with the state they start from. Every
+    run starts from empty caches, so that it measures actual work.
+
+    :param url: Feed's url, on the corpus server.
+    :return: A dictionary mapping each stage's name to a function running it.
+    """
+    FeedReader.FETCH_CACHE.clear()
+    content = FeedReader.get_content(url)
+    root = FeedReader.get_feed_root(content)
+    feed_format = detect_format(root.tag)
+    descriptions = [feed_format.description(item) for item in root.iterfind(feed_format.ITEM_TAG)]
+    feed = FeedParser.parse_feed(root)
+
+    def get_content():
+        FeedReader.FETCH_CACHE.clear()
+        FeedReader.get_content(url)
+
+    def parse_feed():
+        FeedParser.ITEM_CACHE.clear()
+        FeedParser.parse_feed(root)
+
+    def parse_description():
+        for description in descriptions:
+            FeedParser.parse_description(description)
+
+    return {
+        'get_content': get_content,
+        'get_feed_root': lambda: FeedReader.get_feed_root(content),
+        'parse_feed': parse_feed,
+        'parse_description': parse_description,
+        'to_json': lambda: feed.to_json().encode('utf-8'),
+    }
+
+
+def measure(run, items, repeat):
+    """
+    :param run: Function running a stage.
+    :param items: Number of items the stage handles.
+    :param repeat: Number of timed runs.
+    :return: A dictionary with the median seconds, items per second and peak bytes allocated.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    # Tracing allocations slows everything down, so memory is measured on a separate, untimed run.
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    seconds = statistics.median(timings)
+    return {'seconds': seconds, 'items_per_sec': items / seconds if seconds else 0.0, 'peak_bytes': peak}
+
+
+def run_benchmarks(sizes, shapes, repeat, seed):
+    """
+    :return: A dictionary mapping each "<shape>/<size>" feed to its stages' measurements.
+    """
+    FeedReader.SESSION.max_bytes = max(FeedReader.SESSION.max_bytes, MAX_BYTES)
+    FeedReader.XML_PARSER.max_bytes = max(FeedReader.XML_PARSER.max_bytes, MAX_BYTES)
+    server = CorpusServer(seed)
+    server.start()
+    results = {}
+    try:
+        for shape in shapes:
+            for size in sizes:
+                runs = stage_runs(server.url(shape, size))
+                results[f'{shape}/{size}'] = {stage: measure(runs[stage], size, repeat) for stage in STAGES}
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    :param results: Measurements, as returned by run_benchmarks.
+    :param baseline: Baseline measurements, in the same structure.
+    :param tolerance: Fraction by which a stage may exceed its baseline.
+    :return: A list of (feed, stage, metric, measured, baseline) tuples, for every regression found.
+    """
+    regressions = []
+    for feed, stages in results.items():
+        for stage, measured in stages.items():
+            expected = baseline.get(feed, {}).get(stage)
+            if expected is None:
+                continue
+            for metric in ('seconds', 'peak_bytes'):
+                if measured[metric] - expected[metric] <= NOISE_FLOOR[metric]:
+                    continue
+                if measured[metric] > expected[metric] * (1 + tolerance):
+                    regressions.append((feed, stage, metric, measured[metric], expected[metric]))
+    return regressions
+
+
+def report(results, baseline, out=sys.stdout):
+    out.write(f'{"feed":<16} {"stage":<18} {"ms":>10} {"items/s":>12} {"peak KB":>10} {"vs base":>8}\n')
+    for feed, stages in results.items():
+        for stage, measured in stages.items():
+            expected = baseline.get(feed, {}).get(stage)
+            ratio = f'{measured["seconds"] / expected["seconds"]:.2f}x' if expected and expected['seconds'] else '-'
+            out.write(f'{feed:<16} {stage:<18} {measured["seconds"] * 1000:>10.3f} '
+                      f'{measured["items_per_sec"]:>12.0f} {measured["peak_bytes"] / 1024:>10.1f} {ratio:>8}\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the feed pipeline against a seeded corpus.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--shapes', nargs='+', choices=SHAPES, default=list(SHAPES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='fraction by which a stage may exceed its baseline before being flagged')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 when regressions are found')
+    parser.add_argument('--output', help='file the results are written to, as JSON')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.shapes, args.repeat, args.seed)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(dict(baseline, **results), f, indent=2, sort_keys=True)
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for feed, stage, metric, measured, expected in regressions:
+        print(f'REGRESSION {feed} {stage}: {metric} {measured:.6g} > {expected:.6g} (+{args.tolerance:.0%})')
+    return 1 if regressions and args.check else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from threading import Thread
+
+from bench.corpus import generate_feed
+
+
+class CorpusHandler(BaseHTTPRequestHandler):
+    """
+    Serves the corpus' feeds at /<shape>/<size>.xml.
+    """
+
+    def do_GET(self):
+        try:
+            shape, name = self.path.strip('/').split('/')
+            size = int(name[:-len('.xml')]) if name.endswith('.xml') else None
+        except ValueError:
+            size = None
+        if size is None:
+            self.send_error(404)
+            return
+        body = self.server.feed(shape, size)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CorpusServer(ThreadingMixIn, HTTPServer):
+    """
+    Local stand-in for the upstream feed servers, so the benchmarks run offline. Feeds are generated on their first
+    request and kept in memory.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, seed=0, address=('127.0.0.1', 0)):
+        """
+        :param seed: Seed the corpus is generated from.
+        :param address: Address to listen on. Port 0 picks a free one.
+        """
+        super().__init__(address, CorpusHandler)
+        self.seed = seed
+        self._feeds = {}
+
+    def feed(self, shape, size):
+        """
+        :param shape: Feed shape, as accepted by generate_feed.
+        :param size: Number of items.
+        :return: The feed's contents, as bytes.
+        """
+        key = (shape, size)
+        if key not in self._feeds:
+            self._feeds[key] = generate_feed(size, shape, self.seed)
+        return self._feeds[key]
+
+    def url(self, shape, size):
+        """
+        :return: The url the feed is served at.
+        """
+        return f'http://{self.server_address[0]}:{self.server_address[1]}/{shape}/{size}.xml'
+
+    def start(self):
+        """
+        Serves requests in a background thread, until shutdown is called.
+        """
+        Thread(target=self.serve_forever, daemon=True).start()
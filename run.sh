@@ -1,3 +1,7 @@
 #!/usr/bin/env bash
 
-gunicorn --bind 0.0.0.0:5000 src.wsgi:app
+if [ "$SERVER" = "asgi" ]; then
+    gunicorn -c src/gunicorn_conf.py --bind 0.0.0.0:5000 --worker-class uvicorn.workers.UvicornWorker src.asgi:app
+else
+    gunicorn -c src/gunicorn_conf.py --bind 0.0.0.0:5000 src.wsgi:app
+fi
@@ -1,9 +1,12 @@
 from flask import Flask
 
-from src.feed.blueprint import mod_feed
+from src.config import Config
+from src.feed.blueprint import mod_feed, mod_metrics
 
 
 def create_app():
     app = Flask(__name__)
+    app.config.from_object(Config)
     app.register_blueprint(mod_feed)
+    app.register_blueprint(mod_metrics)
     return app
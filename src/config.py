@@ -0,0 +1,111 @@
+import os
+
+
+class Config:
+    """
+    Class containing the application's settings. Every setting can be overridden through an environment variable
+    with the same name.
+    """
+
+    # Fetch cache: time (in seconds) a fetched feed is considered fresh, and bounds for the cached entries.
+    FETCH_CACHE_TTL = int(os.environ.get('FETCH_CACHE_TTL', 60))
+    FETCH_CACHE_MAX_ENTRIES = int(os.environ.get('FETCH_CACHE_MAX_ENTRIES', 512))
+    FETCH_CACHE_MAX_BYTES = int(os.environ.get('FETCH_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+    # Result cache: maps a digest of the fetched contents to the serialized response. The backend can be 'memory'
+    # (private to each worker), 'disk' (shared by every worker through RESULT_CACHE_DIR), 'store' (shared by every
+    # worker through the segment store) or 'none'.
+    RESULT_CACHE_BACKEND = os.environ.get('RESULT_CACHE_BACKEND', 'memory')
+    RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 512))
+    RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', '/tmp/feedreader/results')
+
+    # Segment store: memory mapped files shared by every worker of the host, surviving restarts. Directory holding them,
+    # total size past which they are compacted, size past which a new segment is started, and whether fetched contents
+    # are kept in it too.
+    STORE_DIR = os.environ.get('STORE_DIR', '/tmp/feedreader/store')
+    STORE_MAX_BYTES = int(os.environ.get('STORE_MAX_BYTES', 256 * 1024 * 1024))
+    STORE_SEGMENT_BYTES = int(os.environ.get('STORE_SEGMENT_BYTES', 16 * 1024 * 1024))
+    FETCH_CACHE_STORE = bool(int(os.environ.get('FETCH_CACHE_STORE', 0)))
+
+    # Item cache: maps an item's guid (or link) and a digest of its description to its parsed description blocks, so
+    # that only new or changed items of a feed are parsed again. Bounded by its number of entries, and by the total
+    # length of the blocks' contents.
+    ITEM_CACHE_MAX_ENTRIES = int(os.environ.get('ITEM_CACHE_MAX_ENTRIES', 8192))
+    ITEM_CACHE_MAX_BYTES = int(os.environ.get('ITEM_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+    # Batch reads: maximum number of urls per request, size of the shared fetch pool, concurrent fetches allowed per
+    # upstream host, and overall deadline (in seconds) after which unfinished urls are reported as errors.
+    BATCH_MAX_URLS = int(os.environ.get('BATCH_MAX_URLS', 100))
+    BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 16))
+    BATCH_PER_HOST = int(os.environ.get('BATCH_PER_HOST', 4))
+    BATCH_DEADLINE = float(os.environ.get('BATCH_DEADLINE', 10))
+
+    # Description parsing backend: 'events' extracts blocks in a single pass over the HTML tokens, while 'soup' builds a
+    # BeautifulSoup tree first. Both produce identical blocks.
+    DESCRIPTION_PARSER = os.environ.get('DESCRIPTION_PARSER', 'events')
+
+    # Parallel parsing: number of processes parsing descriptions of big feeds (0 parses every feed serially), and the
+    # number of items a feed needs for its descriptions to be parsed in parallel.
+    PARALLEL_PARSE_WORKERS = int(os.environ.get('PARALLEL_PARSE_WORKERS', 0))
+    PARALLEL_PARSE_THRESHOLD = int(os.environ.get('PARALLEL_PARSE_THRESHOLD', 100))
+
+    # HTTP client: connect and read timeouts (in seconds), maximum size of a feed's contents, number of hosts whose
+    # connections are kept alive, and connections kept alive per host.
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 15))
+    HTTP_MAX_BYTES = int(os.environ.get('HTTP_MAX_BYTES', 20 * 1024 * 1024))
+    HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 256))
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 8))
+
+    # XML parsing: feeds are untrusted, so parsing one is aborted as soon as it goes past these many bytes, nested
+    # elements or elements, and document type declarations with an internal subset (which declare entities) are
+    # rejected.
+    XML_MAX_BYTES = int(os.environ.get('XML_MAX_BYTES', HTTP_MAX_BYTES))
+    XML_MAX_DEPTH = int(os.environ.get('XML_MAX_DEPTH', 64))
+    XML_MAX_ELEMENTS = int(os.environ.get('XML_MAX_ELEMENTS', 250000))
+
+    # Upstream health: consecutive failures (errors, timeouts and 5xx responses) after which a host's circuit opens,
+    # failing its requests fast, or serving its stale contents, and seconds until a trial request is let through again.
+    # 0 failures disables the circuit breaker.
+    BREAKER_MAX_FAILURES = int(os.environ.get('BREAKER_MAX_FAILURES', 5))
+    BREAKER_RESET = float(os.environ.get('BREAKER_RESET', 30))
+
+    # Admission control: maximum number of feeds being read at once by a worker, past which requests are refused with a
+    # 503 response, which asks clients to retry after ADMISSION_RETRY_AFTER seconds. When set, the file they are counted
+    # in across the workers of the host, locked and rewritten by every request. 0 disables admission control.
+    ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', 256))
+    ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 1))
+    ADMISSION_STATE = os.environ.get('ADMISSION_STATE', '')
+
+    # Asynchronous server: number of processes parsing feeds for the ASGI application (0 parses them in the event
+    # loop's default thread pool).
+    ASYNC_PARSE_WORKERS = int(os.environ.get('ASYNC_PARSE_WORKERS', 0))
+
+    # Request coalescing: concurrent reads of the same url are always coalesced within a worker. When set, this
+    # directory holds the lock files coalescing them across the workers of a host too.
+    SINGLE_FLIGHT_LOCK_DIR = os.environ.get('SINGLE_FLIGHT_LOCK_DIR', '')
+
+    # Feed poller: subscribed feeds are polled in the background and served straight from memory. Number of polling
+    # threads, seconds between polls of a feed that just changed and of one that rarely does, factor the interval
+    # grows by each time a feed is found unchanged, fraction of the interval polls are randomly shifted by, maximum
+    # number of subscriptions, a file listing feeds to subscribe on start, one url per line, and when set, the file
+    # keeping the subscriptions, shared by every worker of the host and kept across restarts. Results are served for the
+    # feed's Cache-Control max-age, or POLLER_MAX_INTERVAL without one, after their last successful poll.
+    POLLER_WORKERS = int(os.environ.get('POLLER_WORKERS', 4))
+    POLLER_MIN_INTERVAL = float(os.environ.get('POLLER_MIN_INTERVAL', 60))
+    POLLER_MAX_INTERVAL = float(os.environ.get('POLLER_MAX_INTERVAL', 600))
+    POLLER_BACKOFF = float(os.environ.get('POLLER_BACKOFF', 1.5))
+    POLLER_JITTER = float(os.environ.get('POLLER_JITTER', 0.1))
+    POLLER_MAX_SUBSCRIPTIONS = int(os.environ.get('POLLER_MAX_SUBSCRIPTIONS', 1000))
+    POLLER_FEEDS = os.environ.get('POLLER_FEEDS', '')
+    POLLER_REGISTRY = os.environ.get('POLLER_REGISTRY', '')
+
+    # Warm start: file the caches' hot contents are loaded from on start, in the master process when the application is
+    # preloaded (PRELOAD=1, see src/gunicorn_conf.py), and written to by workers when they exit.
+    SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH', '')
+
+    # Metrics: whether each stage of reading a feed is timed, and exposed with byte, item and cache counts at /metrics,
+    # and the number of upstream hosts labeled by name, past which the others are labeled "other".
+    METRICS_ENABLED = bool(int(os.environ.get('METRICS_ENABLED', 0)))
+    METRICS_MAX_HOSTS = int(os.environ.get('METRICS_MAX_HOSTS', 100))
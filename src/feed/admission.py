@@ -0,0 +1,131 @@
+import fcntl
+import os
+from contextlib import contextmanager
+from threading import Lock
+
+
+class AdmissionControl:
+    """
+    Bounds the work in flight, measured in feeds being read: requests whose cost would take it past the budget are
+    refused straight away, instead of queueing behind the others, so that the latency of the admitted ones stays
+    bounded when upstream hosts slow down. Requests costing more than the whole budget are only admitted when nothing
+    else is in flight.
+
+    Without a state file, the work in flight is counted in each process, which only bounds threaded and asynchronous
+    workers: sync workers handle a single request at a time. Given one, it is counted across every process sharing it,
+    such as the workers of a host, at the cost of locking and rewriting the file whenever a count changes. The file
+    holds each process's own count, one "pid start count" line per process, start being the time the process started
+    at. Counts of processes that are gone, such as crashed workers, are dropped, even once their pid is reused.
+    """
+
+    def __init__(self, budget, path=None):
+        """
+        :param budget: Maximum cost in flight. 0 disables admission control.
+        :param path: Path of the state file shared with the other processes, if any.
+        """
+        self.budget = budget
+        self.path = path
+        self.in_flight = 0
+        self._pid = os.getpid()
+        self._start = started(self._pid)
+        self._lock = Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def acquire(self, cost):
+        """
+        :param cost: Cost of the request, such as the number of feeds it reads.
+        :return: Whether the request is admitted, in which case release must be called once it is done.
+        """
+        if self.budget <= 0:
+            return True
+        cost = min(cost, self.budget)
+        with self._lock:
+            self._forked()
+            if not self.path:
+                if self.in_flight + cost > self.budget:
+                    return False
+                self.in_flight += cost
+                return True
+            with self._shared() as counts:
+                if sum(counts.values()) + cost > self.budget:
+                    return False
+                self.in_flight += cost
+                counts[self._pid, self._start] = self.in_flight
+                return True
+
+    def release(self, cost):
+        """
+        :param cost: Cost of an admitted request, which is now done.
+        """
+        if self.budget <= 0:
+            return
+        with self._lock:
+            self.in_flight -= min(cost, self.budget)
+            if self.path:
+                with self._shared() as counts:
+                    counts[self._pid, self._start] = self.in_flight
+
+    def _forked(self):
+        # Requests in flight belong to the process that admitted them, so a forked process starts with none.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._start = started(self._pid)
+            self.in_flight = 0
+
+    @contextmanager
+    def _shared(self):
+        """
+        Locks the state file, and reads the counts of the live processes from it. The counts, as left by the block, are
+        written back when it exits.
+
+        :return: A dictionary mapping the (pid, start) of the processes with work in flight to their count.
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with os.fdopen(os.dup(fd), 'r+') as f:
+                lines = f.read().splitlines()
+            counts = {}
+            for line in lines:
+                fields = line.split()
+                if len(fields) != 3 or not fields[0].isdigit() or not fields[2].isdigit():
+                    continue
+                if alive(int(fields[0]), fields[1]):
+                    counts[int(fields[0]), fields[1]] = int(fields[2])
+            yield counts
+            data = ''.join(f'{pid} {start} {count}\n' for (pid, start), count in counts.items() if count > 0)
+            data = data.encode('ascii')
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+
+def alive(pid, start):
+    """
+    :param pid: A process id.
+    :param start: The time the process started at, as returned by started.
+    :return: Whether the process is still running. Processes of other users, which the pid may have been reused by,
+    are not.
+    """
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return started(pid) == start
+
+
+def started(pid):
+    """
+    :param pid: A process id.
+    :return: The time the process started at, in clock ticks since boot, or '-' where /proc is not available.
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return '-'
+    # The process name, in parentheses, may contain spaces: the start time is the 20th field after it.
+    return stat[stat.rindex(')') + 2:].split()[19]
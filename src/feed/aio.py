@@ -0,0 +1,390 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+from requests import RequestException
+from werkzeug.exceptions import BadRequest, HTTPException, NotFound, MethodNotAllowed
+
+from src.config import Config
+from src.feed.batch import DeadlineExceeded
+from src.feed.metrics import metrics
+from src.feed.blueprint import (result_cache, feed_poller, render_content, render_content_since, render_parsed_since,
+                                render_batch, render_batch_unique, admission, reject, get_batch_urls, get_url,
+                                get_since, get_query, get_dedup, subscribe_feed, unsubscribe_feed)
+from src.feed.health import HostHealth, CircuitOpen
+from src.feed.parallel import ParsePool
+from src.feed.reader import FeedReader
+from src.feed.session import FetchedResponse, ResponseTooLarge
+
+
+async def run_blocking(blocking, function, *args):
+    """
+    Calls a function, in the event loop's default thread pool when it blocks on files, so that it does not block the
+    event loop.
+
+    :param blocking: Whether the function blocks.
+    :param function: Function to be called.
+    :param args: Function's arguments.
+    :return: The function's result.
+    """
+    if blocking:
+        return await asyncio.get_event_loop().run_in_executor(None, function, *args)
+    return function(*args)
+
+
+class AsyncFeedReader:
+    """
+    asyncio counterpart of FeedReader.get_content. Feeds are fetched with a pooled aiohttp session, going through the
+    same FETCH_CACHE, and within the same timeouts and size limit, as the synchronous FeedReader. A FETCH_CACHE backed
+    by the segment store is read and written in the event loop's default thread pool.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, connect_timeout, read_timeout, max_bytes, per_host):
+        """
+        :param connect_timeout: Seconds to wait for a connection to be established.
+        :param read_timeout: Seconds to wait between bytes sent by the server.
+        :param max_bytes: Maximum size of a response's decoded body.
+        :param per_host: Maximum number of connections per host.
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_bytes = max_bytes
+        self.per_host = per_host
+        self._session = None
+
+    def session(self):
+        """
+        :return: The aiohttp ClientSession, created within the running event loop when first needed.
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.per_host),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout))
+        return self._session
+
+    async def close(self):
+        """
+        Closes the session and its pooled connections.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def get_content(self, url):
+        """
+        Coroutine responsible for retrieving a feed's content. If it fails to retrieve it, including timeouts and
+        oversized contents, it will raise a generic RequestException. Hosts are tracked in the same HOST_HEALTH.
+
+        :param url: Feed's complete url
+        :return: Requested feed's contents.
+        """
+        cache = FeedReader.FETCH_CACHE
+        blocking = cache.segment_store is not None
+        cached = await run_blocking(blocking, cache.get, url)
+        if cached is not None and cached.is_fresh():
+            return cached.content
+        try:
+            FeedReader.check_host(url)
+        except CircuitOpen:
+            if cached is not None:
+                return cached.content
+            raise
+        headers = cached.validators() if cached is not None else {}
+        start = time.perf_counter()
+        try:
+            async with self.session().get(url, headers=headers) as res:
+                elapsed = time.perf_counter() - start
+                FeedReader.record_health(url, status_code=res.status)
+                if res.status == 304 and cached is not None:
+                    return (await run_blocking(blocking, cache.revalidate, url, cached)).content
+                if res.status != 200:
+                    raise RequestException(f"The requested feed could not be retrieved. Code: {res.status}")
+                if res.content_length is not None and res.content_length > self.max_bytes:
+                    raise ResponseTooLarge(f'The response is bigger than {self.max_bytes} bytes')
+                chunks = []
+                size = 0
+                async for chunk in res.content.iter_chunked(self.CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ResponseTooLarge(f'The response is bigger than {self.max_bytes} bytes')
+                    chunks.append(chunk)
+                response = FetchedResponse(res.status, res.headers, b''.join(chunks), elapsed)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            FeedReader.record_health(url, error=e)
+            raise RequestException(str(e))
+        if metrics.enabled:
+            FeedReader.observe_fetch(url, response, time.perf_counter() - start)
+        return (await run_blocking(blocking, cache.store, url, response)).content
+
+
+class FeedASGIApp:
+    """
+    ASGI application serving the feed routes with asyncio: waiting on upstream servers does not hold a worker, so a
+    few processes can handle many feed requests at once. Parsing is CPU-bound, so it is run in an executor: the
+    process pool when it is enabled, or the event loop's default thread pool, along with the lookups going through
+    files: the shared subscriptions, admission control's state and the result cache's disk and store backends.
+
+    Requests and responses have the same structure as the Flask blueprint's, but for streamed ones, which are refused.
+    """
+
+    ROUTES = {
+        '/feed/read': 'read_feed',
+        '/feed/read-many': 'read_many_feeds',
+        '/feed/subscribe': 'subscribe',
+        '/feed/unsubscribe': 'unsubscribe',
+    }
+    METRICS_PATH = '/metrics'
+
+    def __init__(self, reader, parse_pool):
+        """
+        :param reader: AsyncFeedReader used to fetch feeds.
+        :param parse_pool: ParsePool running the parsing, if enabled.
+        """
+        self.reader = reader
+        self.parse_pool = parse_pool
+        self._hosts = {}
+        self._inflight = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        try:
+            if scope['path'] == self.METRICS_PATH:
+                await self.read_metrics(scope, send)
+                return
+            route = self.ROUTES.get(scope['path'])
+            if route is None:
+                raise NotFound()
+            if scope['method'] != 'POST':
+                raise MethodNotAllowed(valid_methods=['POST'])
+            body = await getattr(self, route)(await self.read_json(receive))
+            await self.respond(send, 200, body, [(b'content-type', b'application/json')])
+        except HTTPException as e:
+            headers = [(key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in e.get_headers()]
+            await self.respond(send, e.code, e.get_body().encode('utf-8'), headers)
+
+    async def read_metrics(self, scope, send):
+        if not metrics.enabled:
+            raise NotFound()
+        if scope['method'] != 'GET':
+            raise MethodNotAllowed(valid_methods=['GET'])
+        await self.respond(send, 200, metrics.render().encode('utf-8'),
+                           [(b'content-type', metrics.CONTENT_TYPE.encode('latin-1'))])
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.reader.close()
+                self.parse_pool.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def read_json(receive):
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        try:
+            jdata = json.loads(b''.join(chunks).decode('utf-8'))
+        except ValueError:
+            raise BadRequest('Failed to decode JSON object')
+        if not isinstance(jdata, dict):
+            raise BadRequest('The request must be a JSON object')
+        return jdata
+
+    @staticmethod
+    async def respond(send, status, body, headers):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': headers + [(b'content-length', str(len(body)).encode('latin-1'))]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def read_feed(self, jdata):
+        url = get_url(jdata)
+        query = get_query(jdata)
+        if jdata.get('stream'):
+            raise BadRequest('Streamed responses are only available on the default server')
+        await self.admit(1)
+        try:
+            if 'since' in jdata:
+                return await self.render_feed_since(url, get_since(jdata), query)
+            return await self.render_feed(url, query)
+        finally:
+            await self.release(1)
+
+    async def subscribe(self, jdata):
+        return subscribe_feed(get_url(jdata))
+
+    async def unsubscribe(self, jdata):
+        return unsubscribe_feed(get_url(jdata))
+
+    async def read_many_feeds(self, jdata):
+        urls = get_batch_urls(jdata)
+        query = get_query(jdata)
+        dedup = get_dedup(jdata)
+        if not urls:
+            return render_batch([])
+        await self.admit(len(urls))
+        try:
+            return await self.read_batch(urls, query, dedup)
+        finally:
+            await self.release(len(urls))
+
+    @staticmethod
+    async def admit(cost):
+        """
+        Admits a request, as the blueprint's admit does. A state file shared with the other workers is locked and
+        rewritten in the event loop's default thread pool, instead of blocking the event loop.
+
+        :param cost: Number of feeds the request reads.
+        """
+        if not await run_blocking(bool(admission.path), admission.acquire, cost):
+            reject()
+
+    @staticmethod
+    async def release(cost):
+        """
+        Releases the cost of an admitted request, which is now done.
+
+        :param cost: Number of feeds the request read.
+        """
+        await run_blocking(bool(admission.path), admission.release, cost)
+
+    async def read_batch(self, urls, query, dedup):
+        """
+        Reads a batch of feeds concurrently, within BATCH_PER_HOST feeds per host and the BATCH_DEADLINE.
+
+        :param urls: Feeds' complete urls.
+        :param query: FeedQuery selecting the parts of the feeds to be rendered, if any.
+        :param dedup: Whether items found in more than one feed are only rendered once.
+        :return: The serialized batch, as bytes.
+        """
+        read = self.get_content if dedup else lambda url: self.render_feed(url, query)
+        tasks = [asyncio.ensure_future(self.limited(read, url)) for url in urls]
+        _, pending = await asyncio.wait(tasks, timeout=Config.BATCH_DEADLINE)
+        results = []
+        for url, task in zip(urls, tasks):
+            if task in pending:
+                task.cancel()
+                results.append((url, None, DeadlineExceeded()))
+            elif task.exception() is not None:
+                results.append((url, None, task.exception()))
+            else:
+                results.append((url, task.result(), None))
+        if dedup:
+            results = [(url, self.parse_input(content), error) for url, content, error in results]
+            executor = self.parse_pool.executor if self.parse_pool.enabled else None
+            return await asyncio.get_event_loop().run_in_executor(executor, render_batch_unique, results, query)
+        return render_batch(results)
+
+    async def limited(self, read, url):
+        """
+        Reads a feed, waiting while BATCH_PER_HOST feeds of the same host are being read. A host's semaphore is only
+        kept while some of its feeds are being read, or waiting to be.
+
+        :param read: Function receiving the url and returning an awaitable of its result, such as its serialized feed.
+        :param url: Feed's complete url
+        :return: The feed's result.
+        """
+        host = HostHealth.host(url)
+        entry = self._hosts.get(host)
+        if entry is None:
+            entry = self._hosts[host] = [asyncio.Semaphore(Config.BATCH_PER_HOST), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await read(url)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._hosts[host]
+
+    async def render_feed(self, url, query=None):
+        """
+        Fetches, parses and serializes a feed, going through the result cache. Subscribed feeds are served straight from
+        the feed poller, once polled. Concurrent renders of the same url are coalesced into a single one. Failures are
+        raised as BadRequests.
+
+        :param url: Feed's complete url
+        :param query: FeedQuery selecting the parts of the feed to be rendered, if any.
+        :return: The serialized feed, as bytes.
+        """
+        with metrics.timer('render', HostHealth.host(url) if metrics.enabled else None):
+            subscription = await run_blocking(bool(feed_poller.registry), feed_poller.get, url)
+            if subscription is not None:
+                if query is None:
+                    return subscription.body
+                return query.select(subscription.feed).to_json(fields=query.fields).encode('utf-8')
+            key = url if query is None else url + '\0' + query.key()
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = asyncio.ensure_future(self._render_feed(url, query))
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            # Shielded, so that a caller being cancelled does not cancel the render shared with the others.
+            return await asyncio.shield(future)
+
+    async def _render_feed(self, url, query):
+        content = await self.get_content(url)
+        key = result_cache.key(content, query.key() if query is not None else None)
+        body = await run_blocking(result_cache.blocking, result_cache.get, key)
+        if body is None:
+            executor = self.parse_pool.executor if self.parse_pool.enabled else None
+            body = await asyncio.get_event_loop().run_in_executor(executor, render_content, self.parse_input(content),
+                                                                  query)
+            await run_blocking(result_cache.blocking, result_cache.set, key, body)
+        return body
+
+    async def render_feed_since(self, url, since, query=None):
+        """
+        Fetches, parses and serializes the delta of a feed, as the blueprint's render_feed_since does.
+
+        :param url: Feed's complete url
+        :param since: Identifier of the newest item already seen, or None.
+        :param query: FeedQuery selecting the parts of the delta to be rendered, if any.
+        :return: The serialized delta, as bytes.
+        """
+        subscription = await run_blocking(bool(feed_poller.registry), feed_poller.get, url)
+        if subscription is not None:
+            return render_parsed_since(subscription.feed, since, query)
+        content = await self.get_content(url)
+        executor = self.parse_pool.executor if self.parse_pool.enabled else None
+        return await asyncio.get_event_loop().run_in_executor(executor, render_content_since, self.parse_input(content),
+                                                              since, query)
+
+    def parse_input(self, content):
+        """
+        :param content: Feed's contents, possibly a memoryview of the fetch store's memory map.
+        :return: The contents, copied into bytes when they are parsed by the process pool, which views cannot be sent
+        to.
+        """
+        if self.parse_pool.enabled and isinstance(content, memoryview):
+            return content.tobytes()
+        return content
+
+    async def get_content(self, url):
+        try:
+            return await self.reader.get_content(url)
+        except RequestException:
+            raise BadRequest("The url could not be requested")
+
+
+def create_asgi_app():
+    """
+    Builds the ASGI application, configured by src.config.Config.
+
+    :return: A FeedASGIApp.
+    """
+    reader = AsyncFeedReader(Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT, Config.HTTP_MAX_BYTES,
+                             Config.HTTP_POOL_MAXSIZE)
+    return FeedASGIApp(reader, ParsePool(Config.ASYNC_PARSE_WORKERS))
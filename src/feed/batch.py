@@ -0,0 +1,123 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock, BoundedSemaphore
+
+from src.feed.health import HostHealth
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised for the urls of a batch that could not be read before its deadline.
+    """
+
+
+class BatchReader:
+    """
+    Class responsible for reading many feeds concurrently. Feeds are read by a bounded pool of threads shared by every
+    batch, with a limit of concurrent reads per upstream host, so that a single host cannot hog the pool. A host's
+    semaphore is only kept while some of its feeds are being read, or waiting to be.
+    """
+
+    def __init__(self, max_workers, per_host):
+        """
+        :param max_workers: Number of threads reading feeds.
+        :param per_host: Maximum number of feeds from the same host being read at once.
+        """
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self._executor = None
+        self._hosts = {}
+        self._lock = Lock()
+
+    @property
+    def executor(self):
+        # The pool is only started when first needed, so that it is never created before the server forks.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def host_semaphore(self, host):
+        """
+        :param host: Upstream host.
+        :return: The semaphore limiting the concurrent reads from the host. release_host must be called once it is not
+        used anymore.
+        """
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None:
+                entry = self._hosts[host] = [BoundedSemaphore(self.per_host), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def release_host(self, host):
+        """
+        :param host: Upstream host whose semaphore is not used anymore, dropping it once no other read uses it.
+        """
+        with self._lock:
+            entry = self._hosts[host]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._hosts[host]
+
+    def read_many(self, urls, read, deadline, finished=None):
+        """
+        Reads every url with the given function, concurrently. A slow url never delays the others beyond the deadline:
+        urls still unread when it expires are reported with a DeadlineExceeded error, while the reads already started
+        keep running in the pool until they are done.
+
+        :param urls: List of feed urls.
+        :param read: Function receiving a url and returning its result.
+        :param deadline: Time, in seconds, the whole batch may take.
+        :param finished: Function called once every read is done, past the deadline if needed, if any.
+        :return: A list with a (url, result, error) tuple per url, in the given order. Either result or error is None.
+        """
+        expires = time.monotonic() + deadline
+        futures = [self.executor.submit(self._read, url, read, expires) for url in urls]
+        if finished is not None:
+            done = countdown(len(futures) + 1, finished)
+            for future in futures:
+                future.add_done_callback(done)
+            done()
+        wait(futures, timeout=deadline)
+        results = []
+        for url, future in zip(urls, futures):
+            if not future.done():
+                future.cancel()
+                results.append((url, None, DeadlineExceeded()))
+            elif future.exception() is not None:
+                results.append((url, None, future.exception()))
+            else:
+                results.append((url, future.result(), None))
+        return results
+
+    def _read(self, url, read, expires):
+        host = HostHealth.host(url)
+        semaphore = self.host_semaphore(host)
+        try:
+            if not semaphore.acquire(timeout=max(0.0, expires - time.monotonic())):
+                raise DeadlineExceeded()
+            try:
+                return read(url)
+            finally:
+                semaphore.release()
+        finally:
+            self.release_host(host)
+
+
+def countdown(count, callback):
+    """
+    :param count: Number of calls to wait for.
+    :param callback: Function called, without arguments, on the last of them.
+    :return: A function, taking any arguments, to be called count times, from any thread.
+    """
+    lock = Lock()
+    remaining = [count]
+
+    def done(*args):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        callback()
+    return done
@@ -1,10 +1,28 @@
+import json
+from contextlib import contextmanager
+from itertools import chain, islice
 from xml.etree.ElementTree import ParseError
 
-from flask import Blueprint, request, make_response
+from flask import Blueprint, Response, request, make_response, stream_with_context
 from requests import RequestException
-from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import BadRequest, HTTPException, NotFound, ServiceUnavailable
+from werkzeug.wsgi import ClosingIterator
 
+from src.config import Config
+from src.feed.admission import AdmissionControl
+from src.feed.batch import BatchReader, DeadlineExceeded, countdown
+from src.feed.cache import create_result_cache
+from src.feed.dedup import FingerprintIndex
+from src.feed.flight import SingleFlight
+from src.feed.formats import detect_format
+from src.feed.health import HostHealth
+from src.feed.metrics import metrics
+from src.feed.models import Feed, ItemReference
+from src.feed.poller import FeedPoller
+from src.feed.query import FeedQuery
 from src.feed.reader import FeedReader, FeedParser
+from src.feed.safexml import XMLLimitExceeded
+from src.feed.snapshot import load_snapshot
 
 
 def create_blueprint():
@@ -13,27 +31,467 @@ def create_blueprint():
 
 
 mod_feed = create_blueprint()
+mod_metrics = Blueprint('metrics', __name__)
+result_cache = create_result_cache(Config)
+batch_reader = BatchReader(Config.BATCH_MAX_WORKERS, Config.BATCH_PER_HOST)
+single_flight = SingleFlight(Config.SINGLE_FLIGHT_LOCK_DIR or None)
+admission = AdmissionControl(Config.ADMISSION_MAX_IN_FLIGHT, Config.ADMISSION_STATE or None)
 
 
-@mod_feed.route('/read', methods=['POST'])
-def read_feed():
-    jdata = request.get_json()
+def poll_feed(url):
+    """
+    Fetches, parses and serializes a subscribed feed, for the feed poller. Failures are raised as they are.
+
+    :param url: Feed's complete url
+    :return: A (contents, parsed Feed, serialized Feed, Cache-Control max-age) tuple.
+    """
+    content = FeedReader.get_content(url)
+    entry = FeedReader.FETCH_CACHE.get(url)
+    feed = FeedParser.parse_feed(FeedReader.get_feed_root(content))
+    return content, feed, feed.to_json().encode('utf-8'), entry.max_age if entry is not None else None
+
+
+feed_poller = FeedPoller(poll_feed, Config.POLLER_MIN_INTERVAL, Config.POLLER_MAX_INTERVAL, Config.POLLER_BACKOFF,
+                         Config.POLLER_JITTER, Config.POLLER_WORKERS, Config.POLLER_MAX_SUBSCRIPTIONS,
+                         Config.POLLER_REGISTRY or None)
+if Config.POLLER_FEEDS:
+    feed_poller.load(Config.POLLER_FEEDS)
+if Config.SNAPSHOT_PATH:
+    load_snapshot(Config.SNAPSHOT_PATH, FeedReader.FETCH_CACHE, result_cache)
+
+metrics.describe('fetched_bytes', 'Bytes of feed contents downloaded from each upstream host.')
+metrics.describe('items', 'Feed items parsed.')
+metrics.describe('response_bytes', 'Bytes of serialized feeds rendered.')
+metrics.describe('duplicate_items', 'Feed items collapsed into references to the same item in another feed.')
+metrics.gauge('cache_hit_ratio', 'Ratio of lookups that found a cached value.', FeedReader.FETCH_CACHE.hit_ratio,
+              cache='fetch')
+metrics.gauge('cache_hit_ratio', 'Ratio of lookups that found a cached value.', FeedParser.ITEM_CACHE.hit_ratio,
+              cache='item')
+metrics.gauge('cache_hit_ratio', 'Ratio of lookups that found a cached value.', result_cache.hit_ratio,
+              cache='result')
+metrics.gauge('subscriptions', 'Feeds subscribed to the feed poller.', lambda: len(feed_poller.subscriptions))
+metrics.describe('short_circuits', 'Requests to each upstream host refused because its circuit was open.')
+metrics.gauge('open_circuits', 'Upstream hosts whose circuit is open.', FeedReader.HOST_HEALTH.open_circuits)
+metrics.describe('rejected_requests', 'Requests refused by admission control.')
+metrics.gauge('in_flight', 'Feeds being read by the worker, as counted by admission control.',
+              lambda: admission.in_flight)
+
+
+class Overloaded(ServiceUnavailable):
+    """
+    Response to the requests refused by admission control, telling clients when to retry them.
+    """
+
+    def get_headers(self, *args, **kwargs):
+        return super().get_headers(*args, **kwargs) + [('Retry-After', str(Config.ADMISSION_RETRY_AFTER))]
+
+
+def admit(cost):
+    """
+    Admits a request, raising an Overloaded when the worker is already reading too many feeds. Admitted requests must
+    release their cost once they are done.
+
+    :param cost: Number of feeds the request reads.
+    """
+    if not admission.acquire(cost):
+        reject()
+
+
+def reject():
+    """
+    Refuses a request that was not admitted, raising an Overloaded.
+    """
+    metrics.count('rejected_requests')
+    raise Overloaded('Too many feeds are being read, the request should be retried later')
+
+
+@contextmanager
+def admitted(cost):
+    """
+    Context manager admitting a request for as long as it runs.
+
+    :param cost: Number of feeds the request reads.
+    """
+    admit(cost)
     try:
-        url = jdata['url']
-    except KeyError:
-        raise BadRequest('Request missing url')
+        yield
+    finally:
+        admission.release(cost)
+
+
+def render_feed(url, query=None):
+    """
+    Fetches, parses and serializes a feed, going through the result cache. Subscribed feeds are served straight from
+    the feed poller, once polled. Concurrent renders of the same url are coalesced into a single one. Failures are
+    raised as BadRequests.
+
+    :param url: Feed's complete url
+    :param query: FeedQuery selecting the parts of the feed to be rendered, if any.
+    :return: The serialized feed, as bytes.
+    """
+    with metrics.timer('render', HostHealth.host(url) if metrics.enabled else None):
+        subscription = feed_poller.get(url)
+        if subscription is not None:
+            if query is None:
+                return subscription.body
+            return query.select(subscription.feed).to_json(fields=query.fields).encode('utf-8')
+        key = url if query is None else url + '\0' + query.key()
+        return single_flight.do(key, lambda: _render_feed(url, query))
+
+
+def _render_feed(url, query):
+    try:
+        content = FeedReader.get_content(url)
+    except RequestException:
+        raise BadRequest("The url could not be requested")
+
+    key = result_cache.key(content, query.key() if query is not None else None)
+    body = result_cache.get(key)
+    if body is None:
+        body = render_content(content, query)
+        result_cache.set(key, body)
+    return body
+
+
+def render_content(content, query=None):
+    """
+    Parses and serializes a feed's fetched contents. Failures are raised as BadRequests.
+
+    :param content: Feed's contents.
+    :param query: FeedQuery selecting the parts of the feed to be rendered, if any.
+    :return: The serialized feed, as bytes.
+    """
+    root = get_feed_root(content)
+    with metrics.timer('parse_items'):
+        feed = FeedParser.parse_feed(root, query=query)
+    with metrics.timer('serialize'):
+        body = feed.to_json(fields=query.fields if query is not None else None).encode('utf-8')
+    metrics.count('items', len(feed.items))
+    metrics.count('response_bytes', len(body))
+    return body
+
+
+def render_feed_since(url, since, query=None):
+    """
+    Fetches, parses and serializes the delta of a feed: the items newer than the one identified by a cursor, along with
+    the cursor identifying the newest one. Subscribed feeds are served from the feed poller's parsed Feed, once polled.
+    Deltas bypass the result cache and are not coalesced, but items older than the cursor are never parsed. Failures
+    are raised as BadRequests.
+
+    :param url: Feed's complete url
+    :param since: Cursor sent back by a previous delta read, or the guid (or link) of the newest item already seen.
+    None reads the whole feed, along with its cursor.
+    :param query: FeedQuery selecting the parts of the delta to be rendered, if any.
+    :return: The serialized delta, as bytes.
+    """
+    subscription = feed_poller.get(url)
+    if subscription is not None:
+        return render_parsed_since(subscription.feed, since, query)
 
     try:
         content = FeedReader.get_content(url)
     except RequestException:
         raise BadRequest("The url could not be requested")
+    return render_content_since(content, since, query)
+
+
+def render_parsed_since(feed, since, query=None):
+    """
+    Serializes the delta of an already parsed feed, as render_feed_since does.
+
+    :param feed: A parsed Feed.
+    :param since: Identifier of the newest item already seen, or None.
+    :param query: FeedQuery selecting the parts of the delta to be rendered, if any.
+    :return: The serialized delta, as bytes.
+    """
+    delta = feed.since(since)
+    if query is None:
+        return delta.to_json(with_cursor=True).encode('utf-8')
+    return query.select(delta).to_json(with_cursor=True, fields=query.fields).encode('utf-8')
+
+
+def render_content_since(content, since, query=None):
+    """
+    Parses and serializes the delta of a feed's fetched contents, as render_feed_since does. Failures are raised as
+    BadRequests.
+
+    :param content: Feed's contents.
+    :param since: Identifier of the newest item already seen, or None.
+    :param query: FeedQuery selecting the parts of the delta to be rendered, if any.
+    :return: The serialized delta, as bytes.
+    """
+    root = get_feed_root(content)
+    feed = FeedParser.parse_feed(root, since, query)
+    feed_format = detect_format(root.tag)
+    newest = root.find(feed_format.ITEM_TAG)
+    feed.cursor = FeedParser.item_identifier(newest, feed_format) if newest is not None else since
+    return feed.to_json(with_cursor=True, fields=query.fields if query is not None else None).encode('utf-8')
+
+
+def get_feed_root(content):
+    """
+    Finds a feed's data root, raising a BadRequest when its contents can not be parsed.
+
+    :param content: Feed's contents.
+    :return: Feed's data root as an ElementTree.
+    """
+    try:
+        with metrics.timer('parse_xml'):
+            return FeedReader.get_feed_root(content)
+    except XMLLimitExceeded as e:
+        raise BadRequest(f"The requested url's contents were rejected: {e}")
+    except ParseError:
+        raise BadRequest("The requested url's contents could not be parsed")
+
+
+def get_batch_urls(jdata):
+    """
+    Validates a batch request, raising BadRequests for invalid ones.
+
+    :param jdata: The request's JSON data.
+    :return: The list of urls to be read.
+    """
+    try:
+        urls = jdata['urls']
+    except KeyError:
+        raise BadRequest('Request missing urls')
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        raise BadRequest('The urls must be a list of strings')
+    if len(urls) > Config.BATCH_MAX_URLS:
+        raise BadRequest(f'Requests are limited to {Config.BATCH_MAX_URLS} urls')
+    return urls
+
+
+def render_batch(results):
+    """
+    Serializes the results of a batch of feeds.
+
+    :param results: List of (url, body, error) tuples, as returned by BatchReader.read_many.
+    :return: The serialized batch, as bytes.
+    """
+    rendered = []
+    for url, body, error in results:
+        prefix = b'{"url": ' + json.dumps(url, ensure_ascii=False).encode('utf-8')
+        if error is None:
+            # The serialized feed is an object itself, so its members are merged into the result's.
+            rendered.append(prefix + b', ' + body[1:])
+        else:
+            if isinstance(error, HTTPException):
+                message = error.description
+            elif isinstance(error, DeadlineExceeded):
+                message = 'The url could not be read before the deadline'
+            else:
+                message = 'The url could not be read'
+            rendered.append(prefix + b', "error": ' + json.dumps(message, ensure_ascii=False).encode('utf-8') + b'}')
+    return b'{"results": [' + b', '.join(rendered) + b']}'
+
+
+def get_batch_content(url):
+    """
+    Fetches a feed's contents for a deduplicated batch, raising a BadRequest when it cannot be requested.
+
+    :param url: Feed's complete url
+    :return: Feed's contents.
+    """
+    try:
+        return FeedReader.get_content(url)
+    except RequestException:
+        raise BadRequest("The url could not be requested")
+
+
+def render_batch_unique(results, query=None):
+    """
+    Parses and serializes the contents of a batch of feeds, collapsing the items found in more than one of them into
+    references to the first one, in the batch's order, before their descriptions are parsed.
+
+    :param results: List of (url, contents, error) tuples, as returned by BatchReader.read_many.
+    :param query: FeedQuery selecting the parts of the feeds to be rendered, if any.
+    :return: The serialized batch, as bytes.
+    """
+    index = FingerprintIndex()
+    rendered = []
+    for position, (url, content, error) in enumerate(results):
+        if error is not None:
+            rendered.append((url, None, error))
+            continue
+        try:
+            feed = FeedParser.parse_feed_unique(get_feed_root(content), index, position, query)
+        except BadRequest as e:
+            rendered.append((url, None, e))
+            continue
+        if metrics.enabled:
+            metrics.count('duplicate_items', sum(isinstance(item, ItemReference) for item in feed.items))
+        rendered.append((url, feed.to_json(fields=query.fields if query is not None else None).encode('utf-8'), None))
+    return render_batch(rendered)
+
+
+def get_url(jdata):
+    """
+    Validates a single feed request, raising BadRequests for invalid ones.
+
+    :param jdata: The request's JSON data.
+    :return: The url to be read.
+    """
+    try:
+        url = jdata['url']
+    except KeyError:
+        raise BadRequest('Request missing url')
+    if not isinstance(url, str):
+        raise BadRequest('The url must be a string')
+    return url
+
+
+def get_since(jdata):
+    """
+    Validates a delta request's cursor, raising a BadRequest for invalid ones.
+
+    :param jdata: The request's JSON data.
+    :return: The cursor, or None.
+    """
+    since = jdata['since']
+    if since is not None and not isinstance(since, str):
+        raise BadRequest('The since cursor must be a string')
+    return since
+
+
+def get_dedup(jdata):
+    """
+    Validates a batch request's dedup flag, raising a BadRequest for invalid ones.
+
+    :param jdata: The request's JSON data.
+    :return: Whether the batch's duplicate items are to be collapsed.
+    """
+    dedup = jdata.get('dedup', False)
+    if not isinstance(dedup, bool):
+        raise BadRequest('The dedup flag must be a boolean')
+    return dedup
+
+
+def get_query(jdata):
+    """
+    Validates a request's fields, types, offset and limit parameters, raising a BadRequest for invalid ones.
+
+    :param jdata: The request's JSON data.
+    :return: A FeedQuery, or None when the request has none of the parameters.
+    """
+    try:
+        return FeedQuery.from_json(jdata)
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+
+def subscribe_feed(url):
+    """
+    Subscribes a feed to the feed poller, raising a BadRequest when there are too many subscriptions.
+
+    :param url: Feed's complete url
+    :return: The serialized response, as bytes.
+    """
+    if not feed_poller.subscribe(url):
+        raise BadRequest(f'Subscriptions are limited to {Config.POLLER_MAX_SUBSCRIPTIONS} feeds')
+    return b'{"subscribed": true}'
+
 
+def unsubscribe_feed(url):
+    """
+    Removes a feed from the feed poller.
+
+    :param url: Feed's complete url
+    :return: The serialized response, as bytes.
+    """
+    return b'{"unsubscribed": ' + (b'true' if feed_poller.unsubscribe(url) else b'false') + b'}'
+
+
+def render_feed_stream(url, query=None):
+    """
+    Fetches, parses and serializes a feed incrementally: items are parsed while the feed is still being downloaded,
+    and each one is serialized as soon as it is parsed. It bypasses the caches. Failures found before the first item is
+    parsed are raised as BadRequests; later ones are raised as they are while the response is being sent, which cuts it
+    off before the feed is closed, so that clients cannot mistake a partial feed for a complete one.
+
+    :param url: Feed's complete url
+    :param query: FeedQuery selecting the parts of the feed to be rendered, if any.
+    :return: A generator of the serialized feed's fragments.
+    """
     try:
-        root = FeedReader.get_feed_root(content)
+        items = FeedParser.iter_feed(FeedReader.iter_content(url), query)
+        if query is not None:
+            items = query.slice(items)
+        first = list(islice(items, 1))
+    except RequestException:
+        raise BadRequest("The url could not be requested")
+    except XMLLimitExceeded as e:
+        raise BadRequest(f"The requested url's contents were rejected: {e}")
     except ParseError:
         raise BadRequest("The requested url's contents could not be parsed")
+    return Feed.iter_json(chain(first, items), query.fields if query is not None else None)
 
-    feed = FeedParser.parse_feed(root)
-    response = make_response(feed.to_json())
+
+@mod_feed.route('/read', methods=['POST'])
+def read_feed():
+    jdata = request.get_json()
+    url = get_url(jdata)
+    query = get_query(jdata)
+
+    if jdata.get('stream'):
+        # Streamed feeds are read for as long as the response is being sent, so they are only released once it is over.
+        admit(1)
+        try:
+            chunks = ClosingIterator(render_feed_stream(url, query), lambda: admission.release(1))
+        except BaseException:
+            admission.release(1)
+            raise
+        return Response(stream_with_context(chunks), mimetype='application/json'), 200
+
+    with admitted(1):
+        if 'since' in jdata:
+            response = make_response(render_feed_since(url, get_since(jdata), query))
+        else:
+            response = make_response(render_feed(url, query))
     response.mimetype = 'application/json'
     return response, 200
+
+
+@mod_feed.route('/read-many', methods=['POST'])
+def read_many_feeds():
+    jdata = request.get_json()
+    urls = get_batch_urls(jdata)
+    query = get_query(jdata)
+    dedup = get_dedup(jdata)
+    admit(len(urls))
+    # Reads still running past the deadline keep their feeds in flight until they are done.
+    release = countdown(2, lambda: admission.release(len(urls)))
+    try:
+        if dedup:
+            results = batch_reader.read_many(urls, get_batch_content, Config.BATCH_DEADLINE, release)
+            response = make_response(render_batch_unique(results, query))
+        else:
+            results = batch_reader.read_many(urls, lambda url: render_feed(url, query), Config.BATCH_DEADLINE, release)
+            response = make_response(render_batch(results))
+    finally:
+        release()
+    response.mimetype = 'application/json'
+    return response, 200
+
+
+@mod_feed.route('/subscribe', methods=['POST'])
+def subscribe():
+    response = make_response(subscribe_feed(get_url(request.get_json())))
+    response.mimetype = 'application/json'
+    return response, 200
+
+
+@mod_feed.route('/unsubscribe', methods=['POST'])
+def unsubscribe():
+    response = make_response(unsubscribe_feed(get_url(request.get_json())))
+    response.mimetype = 'application/json'
+    return response, 200
+
+
+@mod_metrics.route('/metrics', methods=['GET'])
+def read_metrics():
+    if not metrics.enabled:
+        raise NotFound()
+    response = make_response(metrics.render())
+    response.headers['Content-Type'] = metrics.CONTENT_TYPE
+    return response, 200
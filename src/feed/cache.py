@@ -0,0 +1,507 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from src.feed.store import SegmentStore
+
+
+class LRUCache:
+    """
+    Thread-safe Least Recently Used cache, bounded both by its number of entries and by the total size of its values.
+    It counts its hits and misses, so its efficiency can be monitored.
+    """
+
+    def __init__(self, max_entries, max_size=None, sizeof=len):
+        """
+        :param max_entries: Maximum number of entries kept in the cache.
+        :param max_size: Maximum total size of the cached values, as measured by sizeof. None disables the bound.
+        :param sizeof: Function measuring the size of a cached value.
+        """
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit_ratio(self):
+        """
+        :return: Ratio of lookups that found a cached value, or 0 if there were no lookups yet.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key, default=None):
+        """
+        Retrieves a cached value, marking it as the most recently used one.
+
+        :param key: Cache key.
+        :param default: Value returned when the key is not cached.
+        :return: The cached value, or default.
+        """
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Caches a value, evicting the least recently used entries until the cache is within its bounds again. Values
+        bigger than the whole cache are not stored.
+
+        :param key: Cache key.
+        :param value: Value to be cached.
+        """
+        size = self.sizeof(value) if self.max_size is not None else 0
+        with self._lock:
+            self._discard(key)
+            if self.max_size is not None and size > self.max_size:
+                return
+            self._entries[key] = value
+            self.size += size
+            while len(self._entries) > self.max_entries or \
+                    (self.max_size is not None and self.size > self.max_size):
+                self._discard(next(iter(self._entries)))
+
+    def items(self):
+        """
+        :return: A list of the cached (key, value) pairs, from the least recently used to the most recently used one.
+        """
+        with self._lock:
+            return list(self._entries.items())
+
+    def delete(self, key):
+        """
+        Removes a value from the cache, if present.
+
+        :param key: Cache key.
+        """
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        """
+        Removes every value from the cache, resetting its counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def _discard(self, key):
+        value = self._entries.pop(key, None)
+        if value is not None and self.max_size is not None:
+            self.size -= self.sizeof(value)
+
+
+class CachedContent:
+    """
+    Class representing a fetched feed's contents, along with the validators needed to revalidate it.
+    """
+
+    def __init__(self, content, etag=None, last_modified=None, expires=0.0, max_age=None):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+        self.max_age = max_age
+
+    def is_fresh(self):
+        """
+        :return: Whether the contents can still be served without revalidating them.
+        """
+        return time.monotonic() < self.expires
+
+    def validators(self):
+        """
+        Conditional request headers for revalidating the contents.
+
+        :return: Dictionary containing the If-None-Match and/or If-Modified-Since headers.
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class FetchCache:
+    """
+    Cache of fetched feed contents, keyed by url. Fresh entries are served straight from memory, while stale ones keep
+    their ETag and Last-Modified validators so they can be revalidated with a conditional GET.
+
+    Contents stay fresh for the ttl, unless their response's Cache-Control header says otherwise.
+
+    Given a SegmentStore, contents are written to it, and only their validators and freshness are kept in memory: their
+    contents are read from the store whenever they are looked up, so that the page cache holds a single copy of them
+    for every worker of the host, and they survive restarts. Entries missing from memory, or stale there, are looked up
+    in the store too, since another worker may have fetched or revalidated them since.
+    """
+
+    BODY_PREFIX = 'body:'
+    META_PREFIX = 'meta:'
+
+    def __init__(self, ttl, max_entries, max_bytes, store=None):
+        """
+        :param ttl: Time, in seconds, a fetched content is considered fresh.
+        :param max_entries: Maximum number of cached feeds.
+        :param max_bytes: Maximum total size of the cached contents.
+        :param store: SegmentStore shared with the other workers, if any.
+        """
+        self.ttl = ttl
+        self.segment_store = store
+        self._cache = LRUCache(max_entries, max_bytes,
+                               sizeof=lambda entry: len(entry.content) if entry.content is not None else 0)
+
+    def get(self, url):
+        """
+        :param url: Feed's complete url
+        :return: The url's CachedContent, fresh or not, or None if it was never cached. With a store, its contents are
+        a memoryview of the store's memory map, which is not copied into the process.
+        """
+        entry = self._cache.get(url)
+        if self.segment_store is None:
+            return entry
+        if entry is None or not entry.is_fresh():
+            loaded = self._load_meta(url)
+            if loaded is not None:
+                entry = loaded
+                self._cache.set(url, entry)
+        if entry is None:
+            return None
+        content = self.segment_store.get_view(self.BODY_PREFIX + url)
+        if content is None:
+            # Compacted away from the store.
+            self._cache.delete(url)
+            return None
+        return CachedContent(content, entry.etag, entry.last_modified, entry.expires, entry.max_age)
+
+    def _load_meta(self, url):
+        meta = self.segment_store.get(self.META_PREFIX + url)
+        if meta is None:
+            return None
+        return self.from_meta(None, json.loads(meta.decode('utf-8')))
+
+    def _remember(self, url, entry):
+        # With a store, contents are only read from it, so memory only holds the validators and freshness.
+        if self.segment_store is not None:
+            entry = CachedContent(None, entry.etag, entry.last_modified, entry.expires, entry.max_age)
+        self._cache.set(url, entry)
+
+    def _save(self, url, entry, content=True):
+        if content:
+            self.segment_store.set(self.BODY_PREFIX + url, entry.content)
+        self.segment_store.set(self.META_PREFIX + url, json.dumps(self.to_meta(entry)).encode('utf-8'))
+
+    def to_meta(self, entry):
+        """
+        Describes an entry for other processes, which is why it holds wall clock times instead of monotonic ones.
+
+        :param entry: A CachedContent.
+        :return: A JSON serializable dictionary of the entry's validators, max-age and last validation time.
+        """
+        freshness = self.ttl if entry.max_age is None else entry.max_age
+        validated = time.time() + entry.expires - freshness - time.monotonic()
+        return dict(etag=entry.etag, last_modified=entry.last_modified, max_age=entry.max_age, validated=validated)
+
+    def from_meta(self, content, meta):
+        """
+        :param content: An entry's contents.
+        :param meta: The entry's description, as returned by to_meta.
+        :return: The CachedContent, fresh until the same time it was in the process that described it.
+        """
+        freshness = self.ttl if meta['max_age'] is None else meta['max_age']
+        expires = time.monotonic() + meta['validated'] + freshness - time.time()
+        return CachedContent(content, meta['etag'], meta['last_modified'], expires, meta['max_age'])
+
+    def entries(self):
+        """
+        :return: A list of the (url, CachedContent) pairs kept in memory, the least recently used first. With a store,
+        which already survives restarts, there are none.
+        """
+        if self.segment_store is not None:
+            return []
+        return self._cache.items()
+
+    def restore(self, url, entry):
+        """
+        Caches an entry in memory only, such as one read back from a snapshot. With a store, which already holds the
+        contents fetched by the previous processes, entries are ignored.
+
+        :param url: Feed's complete url
+        :param entry: The url's CachedContent.
+        """
+        if self.segment_store is None:
+            self._cache.set(url, entry)
+
+    def hit_ratio(self):
+        """
+        :return: Ratio of lookups that found a cached content, fresh or not.
+        """
+        return self._cache.hit_ratio()
+
+    def store(self, url, response):
+        """
+        Caches a successful response's contents and validators.
+
+        :param url: Feed's complete url
+        :param response: Response to a successful request for the url.
+        :return: The new CachedContent.
+        """
+        max_age = self.max_age(response.headers.get('Cache-Control'))
+        entry = CachedContent(response.content,
+                              response.headers.get('ETag'),
+                              response.headers.get('Last-Modified'),
+                              time.monotonic() + (self.ttl if max_age is None else max_age),
+                              max_age)
+        self._remember(url, entry)
+        if self.segment_store is not None:
+            self._save(url, entry)
+        return entry
+
+    @staticmethod
+    def max_age(cache_control):
+        """
+        :param cache_control: A response's Cache-Control header, if any.
+        :return: Seconds the response may be considered fresh for, or None when the header does not tell.
+        """
+        if not cache_control:
+            return None
+        for directive in cache_control.lower().split(','):
+            name, _, value = directive.strip().partition('=')
+            if name in ('no-cache', 'no-store'):
+                return 0
+            if name == 'max-age' and value.strip().strip('"').isdigit():
+                return int(value.strip().strip('"'))
+        return None
+
+    def revalidate(self, url, entry):
+        """
+        Marks a stale entry as fresh again, after the server confirmed it did not change.
+
+        :param url: Feed's complete url
+        :param entry: The url's CachedContent.
+        :return: The revalidated CachedContent.
+        """
+        entry.expires = time.monotonic() + (self.ttl if entry.max_age is None else entry.max_age)
+        self._remember(url, entry)
+        if self.segment_store is not None:
+            self._save(url, entry, content=False)
+        return entry
+
+    def clear(self):
+        """
+        Removes every cached content, from memory only: the store is shared with the other workers.
+        """
+        self._cache.clear()
+
+
+class MemoryResultBackend:
+    """
+    Result cache backend keeping the serialized results in an in-process LRU. Each worker process has its own copy.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self._cache = LRUCache(max_entries, max_bytes)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def items(self):
+        return self._cache.items()
+
+    def clear(self):
+        self._cache.clear()
+
+
+class DiskResultBackend:
+    """
+    Result cache backend keeping each serialized result in a file named after its key, so that every worker process
+    on the host shares them. Files are written atomically, and the least recently written ones are pruned once there
+    are more than max_entries of them.
+    """
+
+    PRUNE_INTERVAL = 64
+
+    def __init__(self, directory, max_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.directory, key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(value)
+            os.replace(tmp, os.path.join(self.directory, key))
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        self._writes += 1
+        if self._writes % self.PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self):
+        """
+        Removes the oldest results until there are no more than max_entries of them.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.tmp'):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+
+class ResultCache:
+    """
+    Cache of serialized feed results, keyed by a digest of the feed's raw contents, so that unchanged feeds skip
+    parsing and serialization altogether. Storage is delegated to a pluggable backend; without one, nothing is cached.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(content, variant=None):
+        """
+        :param content: Feed's raw contents.
+        :param variant: String identifying a variant of the result, such as a FeedQuery's key, if any.
+        :return: Cache key for the given contents.
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        digest = hashlib.sha1(content)
+        if variant is not None:
+            digest.update(b'\0' + variant.encode('utf-8'))
+        return digest.hexdigest()
+
+    @property
+    def blocking(self):
+        """
+        :return: Whether lookups and writes go through files, as with every backend but the memory one.
+        """
+        return self.backend is not None and not isinstance(self.backend, MemoryResultBackend)
+
+    def get(self, key):
+        """
+        :param key: Cache key, as returned by ResultCache.key.
+        :return: The cached serialized result, or None.
+        """
+        if self.backend is None:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def hit_ratio(self):
+        """
+        :return: Ratio of lookups that found a cached result, or 0 if there were no lookups yet.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def set(self, key, value):
+        """
+        :param key: Cache key, as returned by ResultCache.key.
+        :param value: Serialized result, as bytes.
+        """
+        if self.backend is not None:
+            self.backend.set(key, value)
+
+    def items(self):
+        """
+        :return: A list of the cached (key, result) pairs, the least recently used first. Only the memory backend,
+        private to each process, lists them: the others are already shared, and kept across restarts.
+        """
+        if isinstance(self.backend, MemoryResultBackend):
+            return self.backend.items()
+        return []
+
+    def clear(self):
+        """
+        Removes every cached result, resetting the counters.
+        """
+        self.hits = 0
+        self.misses = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+
+def create_result_cache(config):
+    """
+    Builds the ResultCache described by the given configuration.
+
+    :param config: Configuration object, such as src.config.Config.
+    :return: A ResultCache using the configured backend.
+    """
+    if config.RESULT_CACHE_BACKEND == 'memory':
+        return ResultCache(MemoryResultBackend(config.RESULT_CACHE_MAX_ENTRIES, config.RESULT_CACHE_MAX_BYTES))
+    if config.RESULT_CACHE_BACKEND == 'disk':
+        return ResultCache(DiskResultBackend(config.RESULT_CACHE_DIR, config.RESULT_CACHE_MAX_ENTRIES))
+    if config.RESULT_CACHE_BACKEND == 'store':
+        return ResultCache(SegmentStore(os.path.join(config.STORE_DIR, 'results'), config.STORE_MAX_BYTES,
+                                        config.STORE_SEGMENT_BYTES))
+    return ResultCache()
+
+
+def create_fetch_store(config):
+    """
+    Builds the SegmentStore backing the fetch cache, if the given configuration enables it.
+
+    :param config: Configuration object, such as src.config.Config.
+    :return: A SegmentStore, or None.
+    """
+    if not config.FETCH_CACHE_STORE:
+        return None
+    return SegmentStore(os.path.join(config.STORE_DIR, 'fetch'), config.STORE_MAX_BYTES, config.STORE_SEGMENT_BYTES)
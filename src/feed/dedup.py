@@ -0,0 +1,119 @@
+import hashlib
+from array import array
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+
+def normalize_link(link):
+    """
+    Normalizes an item's link, so that the links syndicated copies of an article usually have compare equal: the
+    scheme, a www. prefix, the fragment, tracking (utm_) parameters and a trailing slash are dropped, the host is
+    lowercased and the remaining parameters are sorted. Links come from untrusted feeds, so malformed ones, such as
+    those with an invalid port or an unbalanced bracket, are only stripped.
+
+    :param link: The item's link.
+    :return: The normalized link.
+    """
+    link = link.strip()
+    try:
+        parts = urlsplit(link)
+        port = parts.port
+    except ValueError:
+        return link
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if port is not None:
+        host = f'{host}:{port}'
+    query = ''
+    if parts.query:
+        query = urlencode(sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                                 if not name.startswith('utm_')))
+    return f'{host}{parts.path.rstrip("/")}' + (f'?{query}' if query else '')
+
+
+def fingerprint(link, description):
+    """
+    :param link: The item's link, or None.
+    :param description: The item's description text, or None.
+    :return: A 64 bits fingerprint of the item's normalized link and whitespace collapsed description, never 0, or
+    None for items without a link, which are never taken as duplicates.
+    """
+    if not link:
+        return None
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(normalize_link(link).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(' '.join((description or '').split()).encode('utf-8'))
+    return int.from_bytes(digest.digest(), 'little') or 1
+
+
+class FingerprintIndex:
+    """
+    Compact map of item fingerprints to 64 bits values, such as where the item was first seen. Fingerprints and values
+    are kept in flat arrays, with open addressing, so each entry takes from 24 to 48 bytes, instead of the hundred or so
+    of a dictionary of ints: tens of millions of entries fit in a few hundred megabytes.
+
+    Not thread-safe: an index is meant to be filled by a single thread, such as the one rendering a batch.
+    """
+
+    EMPTY = 0
+    MAX_LOAD = 2 / 3
+
+    def __init__(self, capacity=1024):
+        """
+        :param capacity: Initial number of slots, rounded up to a power of two.
+        """
+        size = 1
+        while size < capacity:
+            size *= 2
+        self._keys = array('Q', bytes(8 * size))
+        self._values = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def get(self, fingerprint, default=None):
+        """
+        :param fingerprint: Item's fingerprint, as returned by the fingerprint function.
+        :param default: Value returned when the fingerprint was never seen.
+        :return: The fingerprint's value, or default.
+        """
+        slot = self._slot(fingerprint)
+        return self._values[slot] if self._keys[slot] != self.EMPTY else default
+
+    def setdefault(self, fingerprint, value):
+        """
+        :param fingerprint: Item's fingerprint, as returned by the fingerprint function.
+        :param value: Value stored for the fingerprint, when it was never seen.
+        :return: The fingerprint's value, which is the given one unless the fingerprint was already seen.
+        """
+        slot = self._slot(fingerprint)
+        if self._keys[slot] != self.EMPTY:
+            return self._values[slot]
+        self._keys[slot] = fingerprint
+        self._values[slot] = value
+        self._size += 1
+        if self._size > len(self._keys) * self.MAX_LOAD:
+            self._grow()
+        return value
+
+    def _slot(self, fingerprint):
+        # Linear probing, from the slot given by the fingerprint's low bits, which are as random as the others.
+        keys = self._keys
+        slot = fingerprint & self._mask
+        while keys[slot] != self.EMPTY and keys[slot] != fingerprint:
+            slot = (slot + 1) & self._mask
+        return slot
+
+    def _grow(self):
+        keys, values = self._keys, self._values
+        self._keys = array('Q', bytes(16 * len(keys)))
+        self._values = array('Q', bytes(16 * len(values)))
+        self._mask = len(self._keys) - 1
+        for key, value in zip(keys, values):
+            if key != self.EMPTY:
+                slot = self._slot(key)
+                self._keys[slot] = key
+                self._values[slot] = value
@@ -0,0 +1,297 @@
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution
+
+from src.feed.models import FeedItemDescriptionBlock
+
+
+class DescriptionParser:
+    """
+    Base class of the description parsing backends. Given an item's description HTML, they obey the following rules:
+
+    - PARAGRAPH_TAGs are parsed as TEXT_TYPE description blocks, containing the tags' text content;
+    - IMG_TAGs inside DIV_TAGs are parsed as IMAGE_TYPE description blocks, containing the tags' image URLs;
+    - LINKS_TAG inside DIV_TAGs are parsed as LINKS_TYPE description blocks, containing a list with all of the
+    tags' URLs
+
+    Only the description's top level PARAGRAPH_TAGs and DIV_TAGs are taken into account.
+    """
+
+    PARAGRAPH_TAG = 'p'
+    DIV_TAG = 'div'
+    IMG_TAG = 'img'
+    LINKS_TAG = 'ul'
+    URL_TAG = 'a'
+    IMG_URL_ATTRB = 'src'
+    LINK_REF_ATTRB = 'href'
+
+    def parse(self, text):
+        """
+        Method responsible for parsing an item's description.
+
+        :param text: The item's description HTML.
+        :return: A list of parsed FeedItemDescriptionBlock objects
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def normalize_text(text):
+        """
+        Normalizes a paragraph's text, dropping line breaks and leading whitespace, and turning tabs and non-breaking
+        spaces into plain spaces.
+
+        :param text: Paragraph's text content.
+        :return: Normalized text.
+        """
+        # Chained replaces run in C and return the text itself when there is nothing to replace, while str.translate
+        # falls back to a lookup per character on non-ASCII text, tens of times slower on Portuguese descriptions.
+        return text.replace('\n', '').replace('\xa0', ' ').replace('\t', ' ').lstrip()
+
+
+class SoupDescriptionParser(DescriptionParser):
+    """
+    Description parsing backend building a BeautifulSoup tree of the description, and walking it for blocks.
+    """
+
+    PARSER = 'html.parser'
+
+    def parse(self, text):
+        soup = BeautifulSoup(text, self.PARSER)
+        res = []
+        for child in soup.children:
+            if child.name == self.PARAGRAPH_TAG:
+                # normalize_text strips leading whitespace, so only whitespace-only paragraphs end up empty.
+                txt = self.normalize_text(child.get_text("", strip=False))
+                if txt:
+                    res.append(FeedItemDescriptionBlock(FeedItemDescriptionBlock.TEXT_TYPE, txt))
+            elif child.name == self.DIV_TAG:
+                res.extend(self.parse_div(child))
+        return res
+
+    def parse_div(self, div):
+        """
+        Collects a DIV_TAG's image and links blocks in a single traversal of its descendants. Image blocks come first,
+        then a links block per LINKS_TAG, both in document order. URL_TAGs inside nested LINKS_TAGs belong to every one
+        of them.
+
+        :param div: The DIV_TAG's Tag.
+        :return: A list of FeedItemDescriptionBlock objects.
+        """
+        blocks = []
+        links = []
+        # URLs of each LINKS_TAG seen so far, keyed by the Tag's id, which URL_TAGs find by walking up their parents.
+        urls_by_tag = {}
+        for node in div.descendants:
+            name = node.name
+            if name == self.IMG_TAG:
+                # We are going for a LBYL approach, since we do not have a reliable logging solution in place
+                src = node.get(self.IMG_URL_ATTRB)
+                if src is not None:
+                    blocks.append(FeedItemDescriptionBlock(FeedItemDescriptionBlock.IMAGE_TYPE, src))
+            elif name == self.LINKS_TAG:
+                urls = []
+                links.append(urls)
+                urls_by_tag[id(node)] = urls
+            elif name == self.URL_TAG and urls_by_tag:
+                href = node.get(self.LINK_REF_ATTRB)
+                if href is not None:
+                    parent = node.parent
+                    while parent is not div:
+                        urls = urls_by_tag.get(id(parent))
+                        if urls is not None:
+                            urls.append(href)
+                        parent = parent.parent
+        blocks.extend(FeedItemDescriptionBlock(FeedItemDescriptionBlock.LINKS_TYPE, urls) for urls in links)
+        return blocks
+
+
+class EventDescriptionParser(DescriptionParser):
+    """
+    Description parsing backend extracting blocks in a single pass over the description's tokens, without building
+    any tree. It reproduces the tree BeautifulSoup's html.parser builder would build, so its blocks are identical to
+    SoupDescriptionParser's.
+    """
+
+    def parse(self, text):
+        parser = _DescriptionEvents(self)
+        parser.feed(text or '')
+        parser.close()
+        return parser.blocks
+
+
+class _DescriptionEvents(HTMLParser):
+    """
+    HTMLParser handling the tokens of a single description. Tags are pushed and popped exactly as BeautifulSoup does,
+    and pending text is flushed on the same events, including its collapsing of whitespace-only strings.
+    """
+
+    ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+    EMPTY_ELEMENT_TAGS = frozenset(HTMLTreeBuilder.empty_element_tags)
+    PRESERVE_WHITESPACE_TAGS = frozenset(HTMLTreeBuilder.preserve_whitespace_tags)
+
+    def __init__(self, backend):
+        super().__init__(convert_charrefs=False)
+        self.backend = backend
+        self.blocks = []
+        # Open tags, as (name, links) pairs; links collects the URLs of LINKS_TAGs inside a top level DIV_TAG.
+        self.stack = []
+        self.data = []
+        self.preserving = 0
+        self.already_closed = []
+        self.text = None
+        self.images = None
+        self.links = None
+
+    def close(self):
+        super().close()
+        self.flush()
+        while self.stack:
+            self.pop()
+
+    def flush(self):
+        if not self.data:
+            return
+        data = ''.join(self.data)
+        self.data = []
+        if not self.preserving and data.strip(self.ASCII_SPACES) == '':
+            data = '\n' if '\n' in data else ' '
+        if self.text is not None:
+            self.text.append(data)
+
+    def push(self, name, attrs):
+        links = None
+        if not self.stack:
+            if name == self.backend.PARAGRAPH_TAG:
+                self.text = []
+            elif name == self.backend.DIV_TAG:
+                self.images = []
+                self.links = []
+        elif self.images is not None:
+            if name == self.backend.IMG_TAG:
+                src = self.attribute(attrs, self.backend.IMG_URL_ATTRB)
+                if src is not None:
+                    self.images.append(src)
+            elif name == self.backend.LINKS_TAG:
+                links = []
+                self.links.append(links)
+            elif name == self.backend.URL_TAG:
+                href = self.attribute(attrs, self.backend.LINK_REF_ATTRB)
+                if href is not None:
+                    for _, open_links in self.stack:
+                        if open_links is not None:
+                            open_links.append(href)
+        if name in self.PRESERVE_WHITESPACE_TAGS:
+            self.preserving += 1
+        self.stack.append((name, links))
+
+    def pop(self):
+        name, _ = self.stack.pop()
+        if name in self.PRESERVE_WHITESPACE_TAGS:
+            self.preserving -= 1
+        if self.stack:
+            return name
+        if self.text is not None:
+            txt = self.backend.normalize_text(''.join(self.text))
+            if txt:
+                self.blocks.append(FeedItemDescriptionBlock(FeedItemDescriptionBlock.TEXT_TYPE, txt))
+            self.text = None
+        elif self.images is not None:
+            self.blocks.extend(FeedItemDescriptionBlock(FeedItemDescriptionBlock.IMAGE_TYPE, src)
+                               for src in self.images)
+            self.blocks.extend(FeedItemDescriptionBlock(FeedItemDescriptionBlock.LINKS_TYPE, links)
+                               for links in self.links)
+            self.images = None
+            self.links = None
+        return name
+
+    def pop_to(self, name):
+        # Unmatched end tags pop every open tag, just like BeautifulSoup does.
+        while self.stack and self.pop() != name:
+            pass
+
+    @staticmethod
+    def attribute(attrs, name):
+        value = None
+        for key, attr_value in attrs:
+            if key == name:
+                value = attr_value if attr_value is not None else ''
+        return value
+
+    def handle_startendtag(self, name, attrs):
+        self.handle_starttag(name, attrs, handle_empty_element=False)
+        self.handle_endtag(name)
+
+    def handle_starttag(self, name, attrs, handle_empty_element=True):
+        self.flush()
+        self.push(name, attrs)
+        if handle_empty_element and name in self.EMPTY_ELEMENT_TAGS:
+            self.pop_to(name)
+            self.already_closed.append(name)
+
+    def handle_endtag(self, name, check_already_closed=True):
+        if check_already_closed and name in self.already_closed:
+            self.already_closed.remove(name)
+        else:
+            self.flush()
+            self.pop_to(name)
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_charref(self, name):
+        if name.startswith(('x', 'X')):
+            code = int(name[1:].lstrip('xX'), 16)
+        else:
+            code = int(name)
+        data = None
+        if code < 256:
+            try:
+                data = bytearray([code]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self.handle_data(data or '\N{REPLACEMENT CHARACTER}')
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.handle_data(character if character is not None else f'&{name}')
+
+    def handle_comment(self, data):
+        self.flush()
+
+    def handle_decl(self, data):
+        self.flush()
+
+    def handle_pi(self, data):
+        self.flush()
+
+    def unknown_decl(self, data):
+        self.flush()
+        if data.upper().startswith('CDATA['):
+            self.data.append(data[len('CDATA['):])
+            self.flush()
+
+
+DESCRIPTION_PARSERS = {
+    'soup': SoupDescriptionParser,
+    'events': EventDescriptionParser,
+}
+
+
+def create_description_parser(name):
+    """
+    Builds the description parsing backend with the given name.
+
+    :param name: One of DESCRIPTION_PARSERS' keys.
+    :return: A DescriptionParser instance.
+    """
+    try:
+        return DESCRIPTION_PARSERS[name]()
+    except KeyError:
+        raise ValueError(f'Unknown description parser: {name}')
@@ -0,0 +1,155 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+import time
+from threading import Lock, Event
+
+
+class _Call:
+    """
+    Class representing an in-flight call, whose outcome is shared with every caller waiting on it.
+    """
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Class deduplicating concurrent calls for the same key: the first caller runs the call, while the ones arriving
+    before it finishes wait for it and share its result, or its exception.
+
+    Threads of a worker are coordinated in memory. When given a lock directory, calls are also coordinated across
+    worker processes, through a lock file per key: the process holding it runs the call, and processes waiting on it
+    leave a marker next to the lock, so that its result is left there for them. Results must be bytes to be shared
+    across processes. Lock files are removed by the process releasing them, and the results and markers older than
+    RESULT_TTL are pruned every PRUNE_INTERVAL calls, so the directory only holds the calls in flight.
+    """
+
+    PRUNE_INTERVAL = 64
+    RESULT_TTL = 60
+
+    def __init__(self, lock_dir=None):
+        """
+        :param lock_dir: Directory for the lock, marker and result files. None only coordinates threads of this
+        process.
+        """
+        self.lock_dir = lock_dir
+        self._calls = {}
+        self._runs = 0
+        self._lock = Lock()
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+
+    def do(self, key, fn):
+        """
+        Runs a call, unless one with the same key is already in flight, in which case its outcome is shared.
+
+        :param key: String identifying the call.
+        :param fn: Function performing the call.
+        :return: The call's result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = self._run(key, fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run(self, key, fn):
+        if not self.lock_dir:
+            return fn()
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        lock_path = os.path.join(self.lock_dir, name + '.lock')
+        wait_path = os.path.join(self.lock_dir, name + '.wait')
+        result_path = os.path.join(self.lock_dir, name + '.result')
+        started = time.time()
+        waited = False
+        while True:
+            with open(lock_path, 'a') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another process runs the call: asking it to leave its result before waiting for it.
+                    with open(wait_path, 'a'):
+                        os.utime(wait_path)
+                    waited = True
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    # Lock files are removed once released, so the one locked may not be the current one anymore.
+                    if not self._current(lock, lock_path):
+                        continue
+                    if waited:
+                        # A result written while we were waiting comes from a call that was in flight when ours
+                        # started.
+                        try:
+                            if os.stat(result_path).st_mtime >= started:
+                                with open(result_path, 'rb') as f:
+                                    return f.read()
+                        except OSError:
+                            pass
+                    result = fn()
+                    if isinstance(result, bytes) and os.path.exists(wait_path):
+                        self._write(result_path, result)
+                        self._remove(wait_path)
+                    return result
+                finally:
+                    if self._current(lock, lock_path):
+                        self._remove(lock_path)
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                    self._runs += 1
+                    if self._runs % self.PRUNE_INTERVAL == 0:
+                        self.prune()
+
+    @staticmethod
+    def _current(lock, path):
+        try:
+            return os.fstat(lock.fileno()).st_ino == os.stat(path).st_ino
+        except OSError:
+            return False
+
+    def _write(self, path, result):
+        fd, tmp = tempfile.mkstemp(dir=self.lock_dir, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(result)
+            os.replace(tmp, path)
+        except OSError:
+            self._remove(tmp)
+
+    def prune(self):
+        """
+        Removes the results, markers and lock files older than RESULT_TTL, which no call in flight needs anymore: those
+        of processes that stopped while holding a lock, and the results and markers of calls whose waiters are gone.
+        """
+        expired = time.time() - self.RESULT_TTL
+        for entry in os.scandir(self.lock_dir):
+            try:
+                if entry.stat().st_mtime < expired:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
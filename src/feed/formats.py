@@ -0,0 +1,170 @@
+from xml.etree import ElementTree
+
+CONTENT_ENCODED_TAG = '{http://purl.org/rss/1.0/modules/content/}encoded'
+
+
+class FeedFormat:
+    """
+    Base class of the supported feed formats, describing where each of them keeps its items and their parts. Parts
+    are handed out as Elements whose text is the part's value, so that every format parses the same way as RSS does.
+
+    DESCRIPTION_TAGS are tried in order, the first one found being the item's description.
+    """
+
+    NAME = None
+    ROOT_TAG = None
+    DATA_ROOT_TAG = None
+    ITEM_TAG = None
+    TITLE_TAG = None
+    LINK_TAG = None
+    DESCRIPTION_TAGS = ()
+    GUID_TAG = None
+
+    def data_root(self, root):
+        """
+        :param root: Document's root element.
+        :return: The element whose children are the feed's items, or None.
+        """
+        return root.find(self.DATA_ROOT_TAG)
+
+    def title(self, item):
+        return item.find(self.TITLE_TAG)
+
+    def link(self, item):
+        return item.find(self.LINK_TAG)
+
+    def description(self, item):
+        for tag in self.DESCRIPTION_TAGS:
+            description = item.find(tag)
+            if description is not None:
+                return description
+        return None
+
+    def guid(self, item):
+        return item.find(self.GUID_TAG)
+
+    def identifier(self, item):
+        """
+        :param item: Item's root, as an ElementTree
+        :return: The item's guid, or its link when it has no guid, just like FeedItem.identifier.
+        """
+        identifier = self.guid(item)
+        if identifier is None:
+            identifier = self.link(item)
+        return identifier.text if identifier is not None else None
+
+
+class RSSFormat(FeedFormat):
+    """
+    RSS 0.9x and 2.0: items are children of the channel, and content:encoded bodies stand for missing descriptions.
+    """
+
+    NAME = 'rss'
+    ROOT_TAG = 'rss'
+    DATA_ROOT_TAG = 'channel'
+    ITEM_TAG = 'item'
+    TITLE_TAG = 'title'
+    LINK_TAG = 'link'
+    DESCRIPTION_TAGS = ('description', CONTENT_ENCODED_TAG)
+    GUID_TAG = 'guid'
+
+
+class RDFFormat(FeedFormat):
+    """
+    RSS 1.0: namespaced items are children of the RDF root, next to the channel, and identified by their rdf:about.
+    """
+
+    NAMESPACE = '{http://purl.org/rss/1.0/}'
+    RDF_NAMESPACE = '{http://www.w3.org/1999/02/22-rdf-syntax-ns#}'
+
+    NAME = 'rdf'
+    ROOT_TAG = RDF_NAMESPACE + 'RDF'
+    DATA_ROOT_TAG = ROOT_TAG
+    ITEM_TAG = NAMESPACE + 'item'
+    TITLE_TAG = NAMESPACE + 'title'
+    LINK_TAG = NAMESPACE + 'link'
+    DESCRIPTION_TAGS = (NAMESPACE + 'description', CONTENT_ENCODED_TAG)
+    ABOUT_ATTRB = RDF_NAMESPACE + 'about'
+
+    def data_root(self, root):
+        return root
+
+    def guid(self, item):
+        about = item.get(self.ABOUT_ATTRB)
+        return text_element(self.ABOUT_ATTRB, about) if about is not None else None
+
+
+class AtomFormat(FeedFormat):
+    """
+    Atom 1.0: entries are children of the feed, linked to by their alternate link, and described by their content, or
+    by their summary when they have no content. XHTML contents are serialized back into HTML.
+    """
+
+    NAMESPACE = '{http://www.w3.org/2005/Atom}'
+
+    NAME = 'atom'
+    ROOT_TAG = NAMESPACE + 'feed'
+    DATA_ROOT_TAG = ROOT_TAG
+    ITEM_TAG = NAMESPACE + 'entry'
+    TITLE_TAG = NAMESPACE + 'title'
+    LINK_TAG = NAMESPACE + 'link'
+    DESCRIPTION_TAGS = (NAMESPACE + 'content', NAMESPACE + 'summary')
+    GUID_TAG = NAMESPACE + 'id'
+    XHTML_TYPE = 'xhtml'
+
+    def data_root(self, root):
+        return root
+
+    def link(self, item):
+        links = item.findall(self.LINK_TAG)
+        for link in links:
+            if link.get('rel', 'alternate') == 'alternate':
+                return text_element(self.LINK_TAG, link.get('href'))
+        return text_element(self.LINK_TAG, links[0].get('href')) if links else None
+
+    def description(self, item):
+        description = super().description(item)
+        if description is not None and description.get('type') == self.XHTML_TYPE:
+            return text_element(description.tag, xhtml_text(description))
+        return description
+
+
+def text_element(tag, text):
+    """
+    :param tag: Element's tag.
+    :param text: Element's text.
+    :return: A new Element, holding the given text.
+    """
+    element = ElementTree.Element(tag)
+    element.text = text
+    return element
+
+
+def xhtml_text(element):
+    """
+    Serializes an Atom XHTML construct's markup back into HTML, without its wrapping div nor its namespaces.
+
+    :param element: Element of an XHTML typed construct.
+    :return: The construct's markup, as a string.
+    """
+    if len(element) == 1 and element[0].tag.rpartition('}')[2] == 'div':
+        element = element[0]
+    for child in element.iter():
+        if isinstance(child.tag, str) and child.tag.startswith('{'):
+            child.tag = child.tag.rpartition('}')[2]
+    return (element.text or '') + ''.join(ElementTree.tostring(child, encoding='unicode') for child in element)
+
+
+RSS = RSSFormat()
+FORMATS = {tag: feed_format for feed_format in (RSS, RDFFormat(), AtomFormat())
+           for tag in (feed_format.ROOT_TAG, feed_format.DATA_ROOT_TAG)}
+
+
+def detect_format(tag):
+    """
+    Detects a feed's format from its document root's tag, or its data root's. Unknown ones are taken as RSS.
+
+    :param tag: Tag of the feed's document root, or of its data root.
+    :return: The feed's FeedFormat.
+    """
+    return FORMATS.get(tag, RSS)
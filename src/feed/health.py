@@ -0,0 +1,135 @@
+import time
+from threading import Lock
+from urllib.parse import urlsplit
+
+from requests import RequestException
+
+
+class CircuitOpen(RequestException):
+    """
+    Raised instead of requesting a host whose circuit is open.
+    """
+
+
+class _Circuit:
+    """
+    Class representing the health of a failing host.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+
+
+class HostHealth:
+    """
+    Circuit breaker tracking the health of upstream hosts, so that requests to failing ones fail fast instead of
+    holding a worker until they time out. After max_failures consecutive failures (connection errors, timeouts and 5xx
+    responses) a host's circuit opens, and its requests are refused for reset seconds. Once they are over, a single
+    trial request is let through, and the circuit is open for another reset seconds: it closes as soon as the trial
+    succeeds. Trials never reported, such as cancelled ones, thus only delay the next trial.
+
+    Only hosts whose last request failed are tracked, and urls without a host never are. Each worker process tracks
+    hosts on its own.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, max_failures, reset):
+        """
+        :param max_failures: Number of consecutive failures opening a host's circuit. 0 disables the breaker.
+        :param reset: Seconds a circuit stays open before a trial request is let through.
+        """
+        self.max_failures = max_failures
+        self.reset = reset
+        self._circuits = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def host(url):
+        """
+        :param url: A url.
+        :return: The url's host, or '' for urls without one, and for malformed ones, which are left to fail when
+        requested.
+        """
+        try:
+            return urlsplit(url).hostname or ''
+        except ValueError:
+            return ''
+
+    def allow(self, url):
+        """
+        Tells whether a url may be requested, letting a trial request through when the url's host circuit has been
+        open for long enough. Allowed requests should be followed by a call to success or failure.
+
+        :param url: Requested url.
+        :return: False when the url's host circuit is open, True otherwise.
+        """
+        host = self.host(url)
+        if self.max_failures <= 0 or not host:
+            return True
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.failures < self.max_failures:
+                return True
+            now = time.monotonic()
+            if now < circuit.open_until:
+                return False
+            circuit.open_until = now + self.reset
+            return True
+
+    def success(self, url):
+        """
+        Records a response from a url's host, closing its circuit.
+
+        :param url: Requested url.
+        """
+        if self.max_failures <= 0:
+            return
+        with self._lock:
+            self._circuits.pop(self.host(url), None)
+
+    def failure(self, url):
+        """
+        Records a failed request to a url's host, opening its circuit after max_failures consecutive ones.
+
+        :param url: Requested url.
+        """
+        host = self.host(url)
+        if self.max_failures <= 0 or not host:
+            return
+        with self._lock:
+            circuit = self._circuits.setdefault(host, _Circuit())
+            circuit.failures += 1
+            if circuit.failures >= self.max_failures:
+                circuit.open_until = time.monotonic() + self.reset
+
+    def state(self, url):
+        """
+        :param url: A url.
+        :return: The state of the url's host circuit: CLOSED, OPEN, or HALF_OPEN when a trial request would be let
+        through.
+        """
+        with self._lock:
+            circuit = self._circuits.get(self.host(url))
+            if circuit is None or circuit.failures < self.max_failures:
+                return self.CLOSED
+            if time.monotonic() >= circuit.open_until:
+                return self.HALF_OPEN
+            return self.OPEN
+
+    def clear(self):
+        """
+        Forgets every tracked host, closing their circuits.
+        """
+        with self._lock:
+            self._circuits.clear()
+
+    def open_circuits(self):
+        """
+        :return: Number of hosts whose circuit is not closed.
+        """
+        with self._lock:
+            return sum(1 for circuit in self._circuits.values() if circuit.failures >= self.max_failures)
@@ -0,0 +1,251 @@
+"""
+Parses feeds in bulk, outside of the API, writing each one as a line of newline-delimited JSON:
+
+    python -m src.feed.ingest SOURCE [SOURCE ...] [--output feeds.ndjson] [--workers 8]
+
+Each source is either a directory, whose files are feed documents, a tarball of feed documents, a feed document
+(named *.xml, *.rss or *.atom) or a file listing feed urls, one per line ('-' reads them from the standard input).
+Documents are parsed across a pool of processes, with a bounded number of them in flight, so memory stays bounded
+whatever the number of documents. Lines follow the sources' order, and look like /feed/read-many's results, with a
+"source" member instead of the "url" one. Unlike the API's, they are plain JSON: items are listed as Feed.to_dict
+does, without the "item" keys.
+
+    {"source": "archive.tar.gz:2019/feed.xml", "feed": [{"title": ..., "link": ..., "description": [...]}, ...]}
+    {"source": "https://example.com/feed.xml", "error": "The url could not be requested"}
+
+Throughput, in documents and items per second, is reported on the standard error every --progress seconds, and once
+every source is done.
+"""
+import argparse
+import os
+import sys
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import ParseError
+
+from requests import RequestException
+
+from src.feed.models import to_json_value
+from src.feed.parallel import ParsePool
+from src.feed.reader import FeedReader, FeedParser
+from src.feed.safexml import XMLLimitExceeded
+
+DOCUMENT_SUFFIXES = ('.xml', '.rss', '.atom')
+URL_TASK = 'url'
+PATH_TASK = 'path'
+CONTENT_TASK = 'content'
+ERROR_TASK = 'error'
+
+
+def iter_tasks(sources):
+    """
+    Lists the documents of every source, lazily, so that sources of any size can be read.
+
+    :param sources: Directories, tarballs, documents or url lists, as described in the module's docstring.
+    :return: A generator of (kind, source, payload) tasks: URL_TASKs and PATH_TASKs, whose payload is None,
+    CONTENT_TASKs, whose payload is a tarball member's contents, and ERROR_TASKs, whose payload is an error message.
+    """
+    for source in sources:
+        if source == '-':
+            yield from iter_url_tasks(sys.stdin)
+        elif os.path.isdir(source):
+            for directory, dirnames, filenames in os.walk(source):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if not filename.startswith('.'):
+                        yield PATH_TASK, os.path.join(directory, filename), None
+        elif source.endswith(DOCUMENT_SUFFIXES):
+            yield PATH_TASK, source, None
+        elif tarfile.is_tarfile(source):
+            yield from iter_tarball_tasks(source)
+        else:
+            with open(source, encoding='utf-8') as f:
+                yield from iter_url_tasks(f)
+
+
+def iter_url_tasks(lines):
+    for line in lines:
+        url = line.strip()
+        if url and not url.startswith('#'):
+            yield URL_TASK, url, None
+
+
+def iter_tarball_tasks(path):
+    """
+    Reads a tarball's documents as a stream, so that compressed tarballs are never seeked through. Documents bigger than
+    the XML parser allows are skipped without being read.
+
+    :param path: Tarball's path.
+    :return: A generator of CONTENT_TASKs, and ERROR_TASKs for the skipped documents.
+    """
+    with tarfile.open(path, 'r|*') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            source = f'{path}:{member.name}'
+            if member.size > FeedReader.XML_PARSER.max_bytes:
+                yield ERROR_TASK, source, f'The document is bigger than {FeedReader.XML_PARSER.max_bytes} bytes'
+                continue
+            yield CONTENT_TASK, source, tar.extractfile(member).read()
+
+
+def ingest(task):
+    """
+    Fetches or reads, parses and serializes a single document. Being a module level function, it can be sent to the
+    pool's processes.
+
+    :param task: A (kind, source, payload) task, as generated by iter_tasks.
+    :return: A (line, number of items, whether it failed) tuple, the line being the serialized result, as bytes.
+    """
+    kind, source, payload = task
+    prefix = '{"source": ' + to_json_value(source)
+    if kind == ERROR_TASK:
+        return (prefix + ', "error": ' + to_json_value(payload) + '}\n').encode('utf-8'), 0, True
+    try:
+        if kind == URL_TASK:
+            content = FeedReader.get_content(source)
+        elif kind == PATH_TASK:
+            with open(source, 'rb') as f:
+                content = f.read(FeedReader.XML_PARSER.max_bytes + 1)
+        else:
+            content = payload
+        root = FeedReader.get_feed_root(content)
+        if root is None:
+            raise ParseError('The document holds no feed')
+        feed = FeedParser.parse_feed(root)
+    except RequestException:
+        message = 'The url could not be requested'
+    except OSError:
+        message = 'The document could not be read'
+    except XMLLimitExceeded as e:
+        message = f'The document was rejected: {e}'
+    except Exception:
+        # A malformed document must not stop a backfill, whatever it trips on.
+        message = 'The document could not be parsed'
+    else:
+        line = prefix + ', "feed": [' + ', '.join([item.to_json() for item in feed.items]) + ']}\n'
+        return line.encode('utf-8'), len(feed.items), False
+    return (prefix + ', "error": ' + to_json_value(message) + '}\n').encode('utf-8'), 0, True
+
+
+def ingest_in_worker(task):
+    """
+    Version of ingest run by the pool's processes, which already parse in parallel: big feeds are not sharded any
+    further.
+    """
+    if FeedParser.PARSE_POOL.enabled:
+        FeedParser.PARSE_POOL = ParsePool(0)
+    return ingest(task)
+
+
+def run(tasks, out, workers, window, report=None):
+    """
+    Ingests every task, writing their lines in the tasks' order.
+
+    :param tasks: Iterable of tasks, as generated by iter_tasks.
+    :param out: Binary file the lines are written to.
+    :param workers: Number of processes parsing documents. 0 parses them in this process.
+    :param window: Maximum number of tasks in flight; tasks are only read as earlier ones are done.
+    :param report: Function called with the Stats after every document, if any.
+    :return: The final Stats.
+    """
+    stats = Stats()
+    if workers <= 0:
+        for task in tasks:
+            stats.add(*write(out, ingest(task)))
+            if report is not None:
+                report(stats)
+        return stats
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(ingest_in_worker, task))
+            if len(pending) >= window:
+                stats.add(*write(out, pending.popleft().result()))
+                if report is not None:
+                    report(stats)
+        while pending:
+            stats.add(*write(out, pending.popleft().result()))
+            if report is not None:
+                report(stats)
+    return stats
+
+
+def write(out, result):
+    line, items, failed = result
+    out.write(line)
+    return items, failed
+
+
+class Stats:
+    """
+    Class counting the ingested documents and items, and the time spent ingesting them.
+    """
+
+    def __init__(self):
+        self.documents = 0
+        self.failed = 0
+        self.items = 0
+        self.start = time.perf_counter()
+
+    def add(self, items, failed):
+        self.documents += 1
+        self.failed += failed
+        self.items += items
+
+    def summary(self):
+        """
+        :return: A line with the counts, and the documents and items ingested per second.
+        """
+        seconds = time.perf_counter() - self.start
+        rate = lambda count: count / seconds if seconds else 0.0
+        return (f'{self.documents} documents ({self.failed} failed), {self.items} items in {seconds:.1f}s: '
+                f'{rate(self.documents):.1f} documents/s, {rate(self.items):.1f} items/s')
+
+
+class ProgressReporter:
+    """
+    Callable writing a Stats' summary to a file, no more than once every interval seconds.
+    """
+
+    def __init__(self, out, interval):
+        self.out = out
+        self.interval = interval
+        self.last = time.perf_counter()
+
+    def __call__(self, stats):
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.out.write(stats.summary() + '\n')
+            self.out.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Parses feeds in bulk into newline-delimited JSON.')
+    parser.add_argument('sources', nargs='+',
+                        help="directories, tarballs or documents of feeds, or files listing feed urls ('-' for stdin)")
+    parser.add_argument('--output', help='file the lines are written to, instead of the standard output')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of parsing processes, 0 parsing in this one')
+    parser.add_argument('--window', type=int, default=0,
+                        help='maximum number of documents in flight, 4 per worker by default')
+    parser.add_argument('--progress', type=float, default=10, help='seconds between throughput reports')
+    args = parser.parse_args(argv)
+
+    window = args.window or max(args.workers, 1) * 4
+    report = ProgressReporter(sys.stderr, args.progress)
+    if args.output:
+        with open(args.output, 'wb') as out:
+            stats = run(iter_tasks(args.sources), out, args.workers, window, report)
+    else:
+        stats = run(iter_tasks(args.sources), sys.stdout.buffer, args.workers, window, report)
+        sys.stdout.flush()
+    sys.stderr.write(stats.summary() + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
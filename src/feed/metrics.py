@@ -0,0 +1,245 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from src.config import Config
+
+
+class Histogram:
+    """
+    Thread-safe histogram of observed values, counting them in cumulative buckets as Prometheus does.
+    """
+
+    def __init__(self, buckets):
+        """
+        :param buckets: Sorted upper bounds of the buckets. A last, infinite one is always added.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative_counts(self):
+        """
+        :return: A list of (upper bound, number of values up to it) pairs, ending with the infinite bucket.
+        """
+        with self._lock:
+            counts = list(self.counts)
+        total = 0
+        cumulative = []
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class _Timer:
+    """
+    Context manager observing the time spent within it into a Metrics' stage histogram.
+    """
+
+    __slots__ = ('metrics', 'stage', 'host', 'start')
+
+    def __init__(self, metrics, stage, host):
+        self.metrics = metrics
+        self.stage = stage
+        self.host = host
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, self.host)
+
+
+class _NullTimer:
+    """
+    Context manager doing nothing, handed out while metrics are disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class Metrics:
+    """
+    Registry of the application's metrics: latency histograms for each stage of reading a feed, labeled by upstream
+    host where it is known, counters of bytes and items, and gauges read when the metrics are rendered. Metrics are
+    rendered in Prometheus' text exposition format, and are kept per worker process.
+
+    Hosts come from the urls clients request, so only the first max_hosts of them get their own series: the others are
+    all labeled OTHER_HOST.
+
+    While disabled, every hook returns right away, so the instrumented code pays next to nothing for them.
+    """
+
+    PREFIX = 'feedreader'
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    NULL_TIMER = _NullTimer()
+    OTHER_HOST = 'other'
+
+    def __init__(self, enabled, buckets=BUCKETS, max_hosts=100):
+        """
+        :param enabled: Whether metrics are collected at all.
+        :param buckets: Upper bounds, in seconds, of the stage histograms' buckets.
+        :param max_hosts: Maximum number of hosts labeled by name.
+        """
+        self.enabled = enabled
+        self.buckets = buckets
+        self.max_hosts = max_hosts
+        self._hosts = set()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = []
+        self._help = {}
+        self._lock = Lock()
+
+    def timer(self, stage, host=None):
+        """
+        :param stage: Name of the stage being timed.
+        :param host: Upstream host the stage is working for, if known.
+        :return: A context manager observing the time spent within it.
+        """
+        if not self.enabled:
+            return self.NULL_TIMER
+        return _Timer(self, stage, host)
+
+    def observe(self, stage, seconds, host=None):
+        """
+        Records the time spent in a stage.
+
+        :param stage: Name of the stage.
+        :param seconds: Time spent in it.
+        :param host: Upstream host the stage was working for, if known.
+        """
+        if not self.enabled:
+            return
+        key = (stage, self.host_label(host))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+    def count(self, name, value=1, **labels):
+        """
+        Increments a counter.
+
+        :param name: Counter's name, without the prefix and the _total suffix.
+        :param value: Amount added to it.
+        :param labels: Counter's labels.
+        """
+        if not self.enabled:
+            return
+        if 'host' in labels:
+            labels['host'] = self.host_label(labels['host'])
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def host_label(self, host):
+        """
+        :param host: Upstream host, or None.
+        :return: The host's label: the host itself, unless max_hosts other hosts were labeled already.
+        """
+        if host is None or host in self._hosts:
+            return host
+        with self._lock:
+            if len(self._hosts) >= self.max_hosts:
+                return self.OTHER_HOST
+            self._hosts.add(host)
+        return host
+
+    def gauge(self, name, description, read, **labels):
+        """
+        Registers a gauge, read every time the metrics are rendered.
+
+        :param name: Gauge's name, without the prefix.
+        :param description: Gauge's help text.
+        :param read: Function returning the gauge's current value.
+        :param labels: Gauge's labels.
+        """
+        self._gauges.append((name, tuple(sorted(labels.items())), read))
+        self.describe(name, description)
+
+    def describe(self, name, description):
+        """
+        Sets the help text of a metric.
+
+        :param name: Metric's name, without the prefix.
+        :param description: Help text.
+        """
+        self._help[name] = description
+
+    def reset(self):
+        """
+        Discards every observed value and counter. Gauges stay registered.
+        """
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._hosts.clear()
+
+    def render(self):
+        """
+        :return: Every metric, in Prometheus' text exposition format.
+        """
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items(), key=lambda entry: (entry[0][0], entry[0][1] or ''))
+            counters = sorted(self._counters.items())
+        if histograms:
+            name = f'{self.PREFIX}_stage_seconds'
+            lines.append(f'# HELP {name} Time spent in each stage of reading a feed.')
+            lines.append(f'# TYPE {name} histogram')
+            for (stage, host), histogram in histograms:
+                labels = [('stage', stage)] + ([('host', host)] if host is not None else [])
+                for bound, total in histogram.cumulative_counts():
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f'{name}_bucket{self.labels(labels + [("le", le)])} {total}')
+                lines.append(f'{name}_sum{self.labels(labels)} {histogram.sum!r}')
+                lines.append(f'{name}_count{self.labels(labels)} {histogram.count}')
+        described = set()
+        for (name, labels), value in counters:
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {self.PREFIX}_{name}_total {self._help.get(name, name)}')
+                lines.append(f'# TYPE {self.PREFIX}_{name}_total counter')
+            lines.append(f'{self.PREFIX}_{name}_total{self.labels(labels)} {value}')
+        for name, labels, read in self._gauges:
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {self.PREFIX}_{name} {self._help.get(name, name)}')
+                lines.append(f'# TYPE {self.PREFIX}_{name} gauge')
+            lines.append(f'{self.PREFIX}_{name}{self.labels(labels)} {float(read())!r}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def labels(labels):
+        """
+        :param labels: Sequence of (name, value) pairs.
+        :return: The labels, in the exposition format, with their values escaped.
+        """
+        if not labels:
+            return ''
+        escaped = []
+        for key, value in labels:
+            value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            escaped.append(f'{key}="{value}"')
+        return '{' + ','.join(escaped) + '}'
+
+
+metrics = Metrics(Config.METRICS_ENABLED, max_hosts=Config.METRICS_MAX_HOSTS)
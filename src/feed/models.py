@@ -1,15 +1,52 @@
 import json
+from json.encoder import encode_basestring
+
+
+def to_json_value(value):
+    """
+    Serializes a model attribute's value exactly as json.dumps(value, ensure_ascii=False) would, with fast paths for
+    the strings, lists of strings and Nones models hold.
+
+    :param value: Value to be serialized.
+    :return: JSON representation of the value.
+    """
+    if isinstance(value, str):
+        return encode_basestring(value)
+    if value is None:
+        return 'null'
+    if isinstance(value, list) and all(isinstance(element, str) for element in value):
+        return '[' + ', '.join([encode_basestring(element) for element in value]) + ']'
+    return json.dumps(value, ensure_ascii=False)
 
 
 class Feed:
     """
     Class representing a parsed Feed.
 
-    We collect nothing but the item list from the original feed.
+    We collect nothing but the item list from the original feed. Delta reads also carry a cursor, identifying the
+    feed's newest item, to be sent back on the next read to get only the items newer than it.
     """
 
-    def __init__(self, items=list()):
+    __slots__ = ('items', 'cursor')
+
+    def __init__(self, items=list(), cursor=None):
         self.items = items
+        self.cursor = cursor
+
+    def since(self, cursor):
+        """
+        Delta of the feed: the items newer than the one identified by the cursor. Feeds list their newest items first,
+        so these are the items before it. When the cursor is not found, every item is newer.
+
+        :param cursor: Identifier of the newest item already seen, or None.
+        :return: A Feed with the newer items, and the cursor identifying the newest one.
+        """
+        items = []
+        for item in self.items:
+            if cursor is not None and item.identifier() == cursor:
+                break
+            items.append(item)
+        return Feed(items, self.items[0].identifier() if self.items else cursor)
 
     def to_dict(self):
         """
@@ -19,26 +56,57 @@ class Feed:
         """
         return dict(feed=[item.to_dict() for item in self.items])
 
-    def to_json(self):
+    def to_json(self, with_cursor=False, fields=None):
         """
         JSON-like representation of the feed. It differs from a common JSON in the sense that the list of items
         actually contains dict-like pairs, with an "item" key referencing each item's contents.
 
+        :param with_cursor: Whether the feed's cursor is included, as a "cursor" member.
+        :param fields: Item fields to be serialized, or None for every field.
         :return: JSON-like representation of the feed.
         """
-        return '{"feed": [' + ','.join([f'"item": {json.dumps(item.to_dict(), ensure_ascii=False)}'
-                                        for item in self.items]) + ']}'
+        feed = ''.join(Feed.iter_json(self.items, fields))
+        if with_cursor:
+            return feed[:-1] + ', "cursor": ' + to_json_value(self.cursor) + '}'
+        return feed
+
+    @staticmethod
+    def iter_json(items, fields=None):
+        """
+        Incremental version of to_json, serializing each item as soon as the given iterable produces it. Joining the
+        generated fragments results in the same representation to_json returns.
+
+        :param items: Iterable of FeedItem objects.
+        :param fields: Item fields to be serialized, or None for every field.
+        :return: A generator of the JSON-like representation's fragments.
+        """
+        yield '{"feed": ['
+        separator = ''
+        for item in items:
+            yield f'{separator}"item": {item.to_json(fields)}'
+            separator = ','
+        yield ']}'
 
 
 class FeedItem:
     """
-    Class representing a parsed Feed Item, containing it's title, link and description.
+    Class representing a parsed Feed Item, containing it's title, link and description. Its guid is only kept to
+    identify it, and is not serialized.
     """
 
-    def __init__(self, title=None, link=None, description=None):
+    __slots__ = ('title', 'link', 'description', 'guid')
+
+    def __init__(self, title=None, link=None, description=None, guid=None):
         self.title = title
         self.link = link
         self.description = description
+        self.guid = guid
+
+    def identifier(self):
+        """
+        :return: The item's guid, or its link when it has no guid.
+        """
+        return self.guid if self.guid is not None else self.link
 
     def to_dict(self):
         """
@@ -50,6 +118,57 @@ class FeedItem:
                     link=self.link,
                     description=[block.to_dict() for block in self.description])
 
+    def to_json(self, fields=None):
+        """
+        JSON representation of the feed item, identical to json.dumps(self.to_dict(), ensure_ascii=False), but written
+        directly instead of going through intermediate dictionaries.
+
+        :param fields: Fields to be serialized, in the to_dict order, or None for every field.
+        :return: JSON representation of the feed item.
+        """
+        if fields is None:
+            return ('{"title": ' + to_json_value(self.title) +
+                    ', "link": ' + to_json_value(self.link) +
+                    ', "description": [' + ', '.join([block.to_json() for block in self.description]) + ']}')
+        members = []
+        for field in fields:
+            if field == 'description':
+                members.append('"description": [' + ', '.join([block.to_json() for block in self.description]) + ']')
+            else:
+                members.append(f'"{field}": ' + to_json_value(getattr(self, field)))
+        return '{' + ', '.join(members) + '}'
+
+
+class ItemReference:
+    """
+    Class standing for a duplicate item, rendered in full elsewhere in the same response: as the given item of the
+    given result of a batch.
+    """
+
+    __slots__ = ('result', 'item')
+
+    def __init__(self, result, item):
+        self.result = result
+        self.item = item
+
+    def to_dict(self):
+        """
+        Dictionary representation of the reference.
+
+        :return: Dictionary representation of the reference.
+        """
+        return dict(ref=dict(result=self.result, item=self.item))
+
+    def to_json(self, fields=None):
+        """
+        JSON representation of the reference, identical to json.dumps(self.to_dict()). References have no fields to
+        select.
+
+        :param fields: Ignored.
+        :return: JSON representation of the reference.
+        """
+        return f'{{"ref": {{"result": {self.result}, "item": {self.item}}}}}'
+
 
 class FeedItemDescriptionBlock:
     """
@@ -64,6 +183,8 @@ class FeedItemDescriptionBlock:
     IMAGE_TYPE = 'image'
     LINKS_TYPE = 'links'
 
+    __slots__ = ('type', 'content')
+
     def __init__(self, type=None, content=None):
         self.type = type
         self.content = content
@@ -75,3 +196,11 @@ class FeedItemDescriptionBlock:
         :return: Dictionary representation of the description block.
         """
         return dict(type=self.type, content=self.content)
+
+    def to_json(self):
+        """
+        JSON representation of the description block, identical to json.dumps(self.to_dict(), ensure_ascii=False).
+
+        :return: JSON representation of the description block.
+        """
+        return '{"type": ' + to_json_value(self.type) + ', "content": ' + to_json_value(self.content) + '}'
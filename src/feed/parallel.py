@@ -0,0 +1,52 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+
+class ParsePool:
+    """
+    Persistent pool of processes for CPU-bound parsing work, shared by every request of a worker. The processes are
+    only started when first needed, and started again in a process forked after they were, since a forked child
+    cannot use its parent's pool.
+    """
+
+    def __init__(self, max_workers):
+        """
+        :param max_workers: Number of parsing processes. 0 disables the pool.
+        """
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        return self.max_workers > 0
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def map(self, fn, values):
+        """
+        Applies a function to every value across the pool's processes, sharding them in roughly even chunks.
+
+        :param fn: Picklable function to be applied.
+        :param values: List of picklable values.
+        :return: A list with the function's results, in the values' order.
+        """
+        chunksize = max(1, len(values) // (self.max_workers * 4))
+        return list(self.executor.map(fn, values, chunksize=chunksize))
+
+    def shutdown(self):
+        """
+        Stops the pool's processes, if they were started by this process.
+        """
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
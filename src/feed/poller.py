@@ -0,0 +1,308 @@
+import fcntl
+import hashlib
+import heapq
+import os
+import random
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Condition, Thread
+
+
+class Subscription:
+    """
+    Class representing a feed registered for background polling, along with its latest parsed results.
+    """
+
+    def __init__(self, url, interval):
+        self.url = url
+        self.interval = interval
+        self.next_poll = 0.0
+        self.refreshing = False
+        self.digest = None
+        self.feed = None
+        self.body = None
+        self.polled_at = None
+        self.max_age = None
+        self.failures = 0
+
+
+class FeedPoller:
+    """
+    Registry of subscribed feeds, kept pre-parsed by a background scheduler so that reading them is a pure memory
+    read. Feeds are polled by a bounded pool of threads, on adaptive intervals: the interval of a feed is multiplied
+    by the backoff each time it is found unchanged, up to max_interval, and reset to min_interval when it changes, and
+    jittered so that polls do not happen in bursts. Feeds with a Cache-Control max-age are polled every max-age instead,
+    or min_interval when it is longer. Results are only served for max-age, or max_interval without one, after the last
+    successful poll: past that, feeds are read as if they were not subscribed.
+
+    Each worker process polls its feeds with its own scheduler, started when a feed is first subscribed or read in the
+    process. Given a registry file, subscriptions are kept in it, one url per line, so that they are shared by every
+    worker of the host and survive restarts: subscribing and unsubscribing rewrite it under a lock file, and each
+    worker rereads it whenever it changed, at most every SYNC_INTERVAL seconds. Without one, subscriptions are private
+    to the process they were made in.
+    """
+
+    SYNC_INTERVAL = 1
+
+    def __init__(self, poll, min_interval, max_interval, backoff, jitter, workers, max_subscriptions, registry=None):
+        """
+        :param poll: Function receiving a url and returning a (contents, parsed Feed, serialized Feed, max-age) tuple.
+        :param min_interval: Seconds between polls of a feed that just changed.
+        :param max_interval: Maximum seconds between polls of a feed.
+        :param backoff: Factor the interval is multiplied by each time a feed is found unchanged.
+        :param jitter: Fraction of the interval polls are randomly shifted by.
+        :param workers: Number of threads polling feeds.
+        :param max_subscriptions: Maximum number of subscribed feeds.
+        :param registry: Path of the file sharing the subscriptions with the other workers, if any.
+        """
+        self.poll = poll
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.workers = workers
+        self.max_subscriptions = max_subscriptions
+        self.subscriptions = {}
+        self._schedule = []
+        self._condition = Condition()
+        self._executor = None
+        self._pid = None
+        self.registry = registry
+        self._version = None
+        self._synced = 0.0
+        if registry:
+            os.makedirs(os.path.dirname(os.path.abspath(registry)), exist_ok=True)
+
+    def subscribe(self, url):
+        """
+        Registers a feed for polling, scheduling its first poll right away.
+
+        :param url: Feed's complete url
+        :return: Whether the feed is subscribed. Feeds past max_subscriptions are not.
+        """
+        if self.registry:
+            with self._locked():
+                urls = self._read_registry()
+                if url not in urls:
+                    if len(urls) >= self.max_subscriptions:
+                        return False
+                    self._write_registry(urls + [url])
+        with self._condition:
+            if self.registry:
+                self._sync(force=True)
+            elif url not in self.subscriptions:
+                if len(self.subscriptions) >= self.max_subscriptions:
+                    return False
+                self._add(url)
+            self._start()
+            return True
+
+    def load(self, path):
+        """
+        Registers the feeds listed in a file, one url per line. Blank lines and lines starting with # are skipped.
+        The scheduler is not started, so that it can be loaded before worker processes are forked.
+
+        :param path: Path to the file.
+        """
+        urls = read_urls(path)
+        if self.registry:
+            with self._locked():
+                registered = self._read_registry()
+                added = [url for url in urls if url not in registered]
+                if added:
+                    self._write_registry((registered + added)[:max(self.max_subscriptions, len(registered))])
+            with self._condition:
+                self._sync(force=True)
+            return
+        with self._condition:
+            for url in urls:
+                if url not in self.subscriptions:
+                    if len(self.subscriptions) >= self.max_subscriptions:
+                        break
+                    self._add(url)
+
+    def unsubscribe(self, url):
+        """
+        Removes a feed from the registry.
+
+        :param url: Feed's complete url
+        :return: Whether the feed was subscribed.
+        """
+        if self.registry:
+            with self._locked():
+                urls = self._read_registry()
+                if url in urls:
+                    urls.remove(url)
+                    self._write_registry(urls)
+                    subscribed = True
+                else:
+                    subscribed = False
+            with self._condition:
+                self._sync(force=True)
+            return subscribed
+        with self._condition:
+            return self.subscriptions.pop(url, None) is not None
+
+    def get(self, url):
+        """
+        :param url: Feed's complete url
+        :return: The feed's Subscription if it is subscribed and its results are recent enough, None otherwise.
+        """
+        if self.registry and time.monotonic() - self._synced >= self.SYNC_INTERVAL:
+            with self._condition:
+                self._sync()
+        subscription = self.subscriptions.get(url)
+        if subscription is None:
+            return None
+        if self._pid != os.getpid():
+            with self._condition:
+                self._start()
+        if subscription.body is None or time.time() - subscription.polled_at > self.max_staleness(subscription):
+            return None
+        return subscription
+
+    def max_staleness(self, subscription):
+        """
+        :param subscription: A feed's Subscription.
+        :return: Seconds the feed's results are served for after its last successful poll.
+        """
+        return self.max_interval if subscription.max_age is None else subscription.max_age
+
+    def refresh(self, subscription):
+        """
+        Polls a feed, storing its new results and adapting its polling interval.
+
+        :param subscription: The feed's Subscription.
+        """
+        try:
+            content, feed, body, max_age = self.poll(subscription.url)
+        except Exception:
+            # Failing feeds are retried with the same backoff as unchanged ones.
+            subscription.failures += 1
+            subscription.interval = min(subscription.interval * self.backoff, self.max_interval)
+        else:
+            digest = hashlib.sha1(content).digest()
+            if digest == subscription.digest:
+                subscription.interval = min(subscription.interval * self.backoff, self.max_interval)
+            else:
+                subscription.interval = self.min_interval
+                subscription.digest = digest
+                subscription.feed = feed
+                subscription.body = body
+            subscription.max_age = max_age
+            if max_age is not None:
+                subscription.interval = max(max_age, self.min_interval)
+            subscription.polled_at = time.time()
+            subscription.failures = 0
+        with self._condition:
+            subscription.refreshing = False
+            if self.subscriptions.get(subscription.url) is subscription:
+                delay = subscription.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+                # Jitter does not delay polls past the time the results stop being served.
+                delay = min(delay, max(self.max_staleness(subscription), self.min_interval))
+                self._push(subscription, time.monotonic() + delay)
+
+    def _add(self, url):
+        subscription = self.subscriptions[url] = Subscription(url, self.min_interval)
+        self._push(subscription, time.monotonic())
+
+    def _sync(self, force=False):
+        """
+        Brings the subscriptions up to date with the registry file, if it changed since it was last read: feeds added
+        by any process are scheduled right away, and the removed ones dropped. Must be called holding the condition.
+
+        :param force: Whether to read the registry file even if it was read less than SYNC_INTERVAL seconds ago.
+        """
+        if not force and time.monotonic() - self._synced < self.SYNC_INTERVAL:
+            return
+        self._synced = time.monotonic()
+        try:
+            stat = os.stat(self.registry)
+            version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            version = None
+        if version == self._version:
+            return
+        self._version = version
+        urls = self._read_registry()
+        for url in set(self.subscriptions).difference(urls):
+            del self.subscriptions[url]
+        for url in urls[:self.max_subscriptions]:
+            if url not in self.subscriptions:
+                self._add(url)
+
+    def _read_registry(self):
+        try:
+            return read_urls(self.registry)
+        except OSError:
+            return []
+
+    def _write_registry(self, urls):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.registry)), prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.writelines(url + '\n' for url in urls)
+            os.replace(tmp, self.registry)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    @contextmanager
+    def _locked(self):
+        # The lock file is opened on every acquisition: flock locks belong to the open file, which a fork would share.
+        with open(self.registry + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _push(self, subscription, when):
+        subscription.next_poll = when
+        heapq.heappush(self._schedule, (when, subscription.url))
+        self._condition.notify()
+
+    def _start(self):
+        # Threads do not survive a fork, so each process starts its own scheduler.
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        Thread(target=self._run, name='feed-poller', daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._schedule or self._schedule[0][0] > time.monotonic():
+                    timeout = self._schedule[0][0] - time.monotonic() if self._schedule else None
+                    if self.registry:
+                        # Feeds subscribed and unsubscribed by the other workers are picked up while waiting.
+                        timeout = self.SYNC_INTERVAL if timeout is None else min(timeout, self.SYNC_INTERVAL)
+                    self._condition.wait(timeout)
+                    if self.registry:
+                        self._sync()
+                when, url = heapq.heappop(self._schedule)
+                subscription = self.subscriptions.get(url)
+                # Entries of unsubscribed or rescheduled feeds are stale, and just dropped.
+                if subscription is None or subscription.refreshing or subscription.next_poll != when:
+                    continue
+                subscription.refreshing = True
+            self._executor.submit(self.refresh, subscription)
+
+
+def read_urls(path):
+    """
+    Reads a file listing urls, one per line, skipping blank lines and lines starting with #, and duplicates.
+
+    :param path: Path to the file.
+    :return: The list of urls, in the file's order.
+    """
+    with open(path) as f:
+        lines = [line.strip() for line in f]
+    return list(OrderedDict.fromkeys(url for url in lines if url and not url.startswith('#')))
@@ -0,0 +1,106 @@
+from itertools import islice
+
+from src.feed.models import Feed, FeedItem, FeedItemDescriptionBlock
+
+
+class FeedQuery:
+    """
+    Class representing the parts of a feed a request is interested in: which item fields are serialized, which types of
+    description blocks are kept, and which slice of the items is returned. Parsers honor it lazily, so that items past
+    the slice are never visited and descriptions that are not requested are never parsed.
+    """
+
+    FIELDS = ('title', 'link', 'description')
+    TYPES = (FeedItemDescriptionBlock.TEXT_TYPE, FeedItemDescriptionBlock.IMAGE_TYPE,
+             FeedItemDescriptionBlock.LINKS_TYPE)
+
+    def __init__(self, fields=FIELDS, types=TYPES, offset=0, limit=None):
+        """
+        :param fields: Item fields to be serialized, in FIELDS' order.
+        :param types: Description block types to be kept.
+        :param offset: Number of items skipped.
+        :param limit: Maximum number of items returned, or None for every item.
+        """
+        self.fields = tuple(field for field in self.FIELDS if field in fields)
+        self.types = frozenset(types)
+        self.offset = offset
+        self.limit = limit
+
+    @staticmethod
+    def from_json(jdata):
+        """
+        Builds a query from a request's fields, types, offset and limit parameters. Fields and types can be lists, or
+        comma separated strings. Invalid parameters raise ValueErrors.
+
+        :param jdata: The request's JSON data.
+        :return: A FeedQuery, or None when the request has none of the parameters.
+        """
+        if not any(name in jdata for name in ('fields', 'types', 'offset', 'limit')):
+            return None
+        fields = FeedQuery.names(jdata, 'fields', FeedQuery.FIELDS)
+        types = FeedQuery.names(jdata, 'types', FeedQuery.TYPES)
+        offset = FeedQuery.count(jdata, 'offset', 0)
+        limit = FeedQuery.count(jdata, 'limit', None)
+        return FeedQuery(fields, types, offset, limit)
+
+    @staticmethod
+    def names(jdata, parameter, valid):
+        names = jdata.get(parameter)
+        if names is None:
+            return valid
+        if isinstance(names, str):
+            names = [name.strip() for name in names.split(',') if name.strip()]
+        if not isinstance(names, list) or not all(isinstance(name, str) and name in valid for name in names):
+            raise ValueError(f'The {parameter} must be a list of: {", ".join(valid)}')
+        return names
+
+    @staticmethod
+    def count(jdata, parameter, default):
+        value = jdata.get(parameter)
+        if value is None:
+            return default
+        # bool is an int too, but never a meaningful count.
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError(f'The {parameter} must be a non-negative integer')
+        return value
+
+    def key(self):
+        """
+        :return: A string identifying the query, for cache keys.
+        """
+        return f'{",".join(self.fields)}|{",".join(sorted(self.types))}|{self.offset}|{self.limit}'
+
+    def wants_description(self):
+        """
+        :return: Whether the items' descriptions need to be parsed at all.
+        """
+        return 'description' in self.fields and bool(self.types)
+
+    def slice(self, items):
+        """
+        :param items: Iterable of items.
+        :return: An iterator over the requested slice of the items, which consumes no more of them than it needs.
+        """
+        stop = self.offset + self.limit if self.limit is not None else None
+        return islice(items, self.offset, stop)
+
+    def filter_blocks(self, blocks):
+        """
+        :param blocks: List of parsed FeedItemDescriptionBlock objects.
+        :return: The blocks of the requested types.
+        """
+        if len(self.types) == len(self.TYPES):
+            return blocks
+        return [block for block in blocks if block.type in self.types]
+
+    def select(self, feed):
+        """
+        Applies the query to an already parsed Feed.
+
+        :param feed: A parsed Feed.
+        :return: A Feed with the requested slice of items, keeping only the requested description blocks.
+        """
+        items = [FeedItem(item.title, item.link,
+                          self.filter_blocks(item.description) if 'description' in self.fields else None, item.guid)
+                 for item in self.slice(feed.items)]
+        return Feed(items, feed.cursor)
@@ -1,58 +1,243 @@
+import hashlib
+import time
+from itertools import takewhile
+from urllib.parse import urlsplit
 from xml.etree.ElementTree import ParseError
 
-import requests
-from xml.etree import ElementTree
-from bs4 import BeautifulSoup
 from requests import RequestException
 from werkzeug.exceptions import BadRequest
 
-from src.feed.models import FeedItem, FeedItemDescriptionBlock, Feed
+from src.config import Config
+from src.feed.cache import FetchCache, LRUCache, create_fetch_store
+from src.feed.dedup import fingerprint
+from src.feed.description import create_description_parser
+from src.feed.formats import RSS, detect_format
+from src.feed.health import HostHealth, CircuitOpen
+from src.feed.metrics import metrics
+from src.feed.models import FeedItem, Feed, ItemReference
+from src.feed.parallel import ParsePool
+from src.feed.safexml import BoundedXMLParser
+from src.feed.session import FeedSession, ResponseTooLarge
+
+
+def blocks_size(blocks):
+    """
+    Measures parsed description blocks for the ITEM_CACHE, as the total length of their contents: the text of text
+    blocks, the url of image blocks and every url of links blocks.
+
+    :param blocks: A list of FeedItemDescriptionBlock objects.
+    :return: The blocks' size.
+    """
+    size = 0
+    for block in blocks:
+        if isinstance(block.content, str):
+            size += len(block.content)
+        elif block.content is not None:
+            size += sum(len(url) for url in block.content)
+    return size
 
 
 class FeedParser:
     """
     Class containing static methods related to parsing a feed's contents and returning the corresponding model classes.
+    Feeds are parsed according to their FeedFormat, detected from their data root; the tag constants are RSS's.
     """
 
-    TITLE_TAG = 'title'
-    LINK_TAG = 'link'
-    DESCRIPTION_TAG = 'description'
-
-    PARAGRAPH_TAG = 'p'
-    DIV_TAG = 'div'
-    IMG_TAG = 'img'
-    LINKS_TAG = 'ul'
-    URL_TAG = 'a'
-    IMG_URL_ATTRB = 'src'
-    LINK_REF_ATTRB = 'href'
-    ITEM_TAG = 'item'
-    PARSER = 'html.parser'
+    TITLE_TAG = RSS.TITLE_TAG
+    LINK_TAG = RSS.LINK_TAG
+    DESCRIPTION_TAG = RSS.DESCRIPTION_TAGS[0]
+    GUID_TAG = RSS.GUID_TAG
+    ITEM_TAG = RSS.ITEM_TAG
+    DESCRIPTION_PARSER = create_description_parser(Config.DESCRIPTION_PARSER)
+    ITEM_CACHE = LRUCache(Config.ITEM_CACHE_MAX_ENTRIES, Config.ITEM_CACHE_MAX_BYTES, sizeof=blocks_size)
+    PARSE_POOL = ParsePool(Config.PARALLEL_PARSE_WORKERS)
+    PARALLEL_THRESHOLD = Config.PARALLEL_PARSE_THRESHOLD
 
     @staticmethod
-    def parse_feed(feed):
+    def parse_feed(feed, since=None, query=None):
         """
-        Method responsible for parsing a feed's contents, given its ElementTree data root.
+        Method responsible for parsing a feed's contents, given its ElementTree data root. Feeds with at least
+        PARALLEL_THRESHOLD items have their descriptions parsed in parallel, when the PARSE_POOL is enabled.
+
+        Given a cursor, only the items newer than the one it identifies are parsed: feeds list their newest items first,
+        so items are parsed until that one is reached. Given a FeedQuery, items past its slice are never visited, and
+        descriptions are only parsed when requested.
 
         :param feed: Feed's data root, as an ElementTree
+        :param since: Identifier (guid, or link) of the newest item already seen, if any.
+        :param query: FeedQuery selecting the parts of the feed to be parsed, if any.
         :return: A parsed Feed object
         """
-        items = feed.findall(FeedParser.ITEM_TAG)
-        return Feed([FeedParser.parse_item(item) for item in items])
+        feed_format = detect_format(feed.tag)
+        items = feed.iterfind(feed_format.ITEM_TAG)
+        if since is not None:
+            items = takewhile(lambda item: feed_format.identifier(item) != since, items)
+        if query is not None:
+            items = query.slice(items)
+        items = list(items)
+        if FeedParser.PARSE_POOL.enabled and len(items) >= FeedParser.PARALLEL_THRESHOLD and \
+                (query is None or query.wants_description()):
+            return Feed(FeedParser.parse_items_parallel(items, query, feed_format))
+        return Feed([FeedParser.parse_item(item, query, feed_format) for item in items])
+
+    @staticmethod
+    def parse_feed_unique(feed, index, result, query=None):
+        """
+        Method responsible for parsing one of many feeds read together, collapsing the items already seen in any of
+        them into ItemReferences, before their descriptions are parsed. Items are told apart by their fingerprint, so
+        syndicated copies of an article are collapsed too.
+
+        :param feed: Feed's data root, as an ElementTree
+        :param index: FingerprintIndex shared by the feeds read together, mapping the items' fingerprints to where they
+        were first seen.
+        :param result: Position of the feed among the ones read together.
+        :param query: FeedQuery selecting the parts of the feed to be parsed, if any.
+        :return: A parsed Feed object, whose items are FeedItems and ItemReferences
+        """
+        feed_format = detect_format(feed.tag)
+        items = feed.iterfind(feed_format.ITEM_TAG)
+        if query is not None:
+            items = query.slice(items)
+        parsed = []
+        for position, item in enumerate(items):
+            link = feed_format.link(item)
+            description = feed_format.description(item)
+            key = fingerprint(link.text if link is not None else None,
+                              description.text if description is not None else None)
+            if key is not None:
+                seen = result << 32 | position
+                first = index.setdefault(key, seen)
+                if first != seen:
+                    parsed.append(ItemReference(first >> 32, first & 0xffffffff))
+                    continue
+            parsed.append(FeedParser.parse_item(item, query, feed_format))
+        return Feed(parsed)
+
+    @staticmethod
+    def parse_items_parallel(items, query=None, feed_format=RSS):
+        """
+        Method responsible for parsing many items at once, sharding the descriptions missing from the ITEM_CACHE
+        across the PARSE_POOL's processes.
+
+        :param items: List of items' roots, as ElementTrees
+        :param query: FeedQuery filtering the description blocks, if any.
+        :param feed_format: FeedFormat of the items' feed.
+        :return: A list of parsed FeedItem objects, in the items' order
+        """
+        parsed = []
+        missing = {}
+        for item in items:
+            title = feed_format.title(item)
+            link = feed_format.link(item)
+            description = feed_format.description(item)
+            guid = feed_format.guid(item)
+            key = FeedParser.description_key(guid if guid is not None else link, description)
+            blocks = FeedParser.ITEM_CACHE.get(key)
+            if blocks is None:
+                missing[key] = description.text if description is not None else ''
+            parsed.append((FeedParser.parse_title(title), FeedParser.parse_link(link), key, blocks,
+                           guid.text if guid is not None else None))
+        if missing:
+            keys = list(missing)
+            for key, blocks in zip(keys, FeedParser.PARSE_POOL.map(parse_description_text, list(missing.values()))):
+                missing[key] = blocks
+                FeedParser.ITEM_CACHE.set(key, blocks)
+        parsed = [FeedItem(title, link, blocks if blocks is not None else missing[key], guid)
+                  for title, link, key, blocks, guid in parsed]
+        if query is not None:
+            for item in parsed:
+                item.description = query.filter_blocks(item.description)
+        return parsed
 
     @staticmethod
-    def parse_item(item):
+    def iter_feed(chunks, query=None):
+        """
+        Method responsible for incrementally parsing a feed's contents, given an iterable of its chunks. Items are
+        parsed as soon as their closing tag is read, and discarded right after, so only the item being read is kept in
+        memory. The feed's format is detected from its root element, as soon as it is read. Contents are parsed within
+        the XML_PARSER's limits. Any thrown ParseErrors should reach the outer scope.
+
+        :param chunks: Iterable of the feed's contents chunks.
+        :param query: FeedQuery selecting the parts of the items to be parsed, if any. Its slice is not applied.
+        :return: A generator of parsed FeedItem objects
+        """
+        stack = []
+        feed_format = None
+        for event, element in FeedReader.XML_PARSER.iter_events(chunks):
+            if event == 'start':
+                if feed_format is None:
+                    feed_format = detect_format(element.tag)
+                stack.append(element)
+                continue
+            stack.pop()
+            if element.tag == feed_format.ITEM_TAG and stack and stack[-1].tag == feed_format.DATA_ROOT_TAG:
+                yield FeedParser.parse_item(element, query, feed_format)
+                stack[-1].remove(element)
+
+    @staticmethod
+    def parse_item(item, query=None, feed_format=RSS):
         """
         Method responsible for parsing an item contained in a feed, given it's ElementTree root.
 
         :param item: Item's root, as an ElementTree
+        :param query: FeedQuery selecting the parts of the item to be parsed, if any.
+        :param feed_format: FeedFormat of the item's feed.
         :return: A parsed FeedItem object
         """
-        title = item.find(FeedParser.TITLE_TAG)
-        link = item.find(FeedParser.LINK_TAG)
-        description = item.find(FeedParser.DESCRIPTION_TAG)
+        title = feed_format.title(item)
+        link = feed_format.link(item)
+        wants_description = query is None or query.wants_description()
+        description = feed_format.description(item) if wants_description else None
+        guid = feed_format.guid(item)
+        if wants_description:
+            blocks = FeedParser.parse_cached_description(guid if guid is not None else link, description)
+            if query is not None:
+                blocks = query.filter_blocks(blocks)
+        else:
+            # Descriptions requested with no block types are always empty.
+            blocks = [] if 'description' in query.fields else None
         return FeedItem(FeedParser.parse_title(title),
                         FeedParser.parse_link(link),
-                        FeedParser.parse_description(description))
+                        blocks,
+                        guid.text if guid is not None else None)
+
+    @staticmethod
+    def item_identifier(item, feed_format=RSS):
+        """
+        :param item: Item's root, as an ElementTree
+        :param feed_format: FeedFormat of the item's feed.
+        :return: The item's guid, or its link when it has no guid, just like FeedItem.identifier.
+        """
+        return feed_format.identifier(item)
+
+    @staticmethod
+    def parse_cached_description(identifier, description):
+        """
+        Method responsible for parsing an item's description through the ITEM_CACHE. Descriptions are keyed by their
+        item's identifier and a digest of their text, so unchanged items of an updated feed are not parsed again.
+
+        :param identifier: Element containing the item's guid, or its link when it has no guid.
+        :param description: Element containing the feed item's description.
+        :return: A list of parsed FeedItemDescriptionBlock objects
+        """
+        key = FeedParser.description_key(identifier, description)
+        blocks = FeedParser.ITEM_CACHE.get(key)
+        if blocks is None:
+            with metrics.timer('description'):
+                blocks = FeedParser.parse_description(description)
+            FeedParser.ITEM_CACHE.set(key, blocks)
+        return blocks
+
+    @staticmethod
+    def description_key(identifier, description):
+        """
+        :param identifier: Element containing the item's guid, or its link when it has no guid.
+        :param description: Element containing the feed item's description, or None when it has none.
+        :return: The description's ITEM_CACHE key.
+        """
+        text = description.text if description is not None else None
+        return (identifier.text if identifier is not None else None,
+                hashlib.sha1((text or '').encode('utf-8')).digest())
 
     @staticmethod
     def parse_title(title):
@@ -77,35 +262,24 @@ class FeedParser:
     @staticmethod
     def parse_description(description):
         """
-        Method responsible for parsing an item's description, given its Element. It obeys the following rules:
-
-        - PARAGRAPH_TAGs are parsed as TEXT_TYPE description blocks, containing the tags' text content;
-        - IMG_TAGs inside DIV_TAGs are parsed as IMAGE_TYPE description blocks, containing the tags' image URLs;
-        - LINKS_TAG inside DIV_TAGs are parsed as LINKS_TYPE description blocks, containing a list with all of the
-        tags' URLs
+        Method responsible for parsing an item's description, given its Element, with the configured
+        DESCRIPTION_PARSER backend. See src.feed.description.DescriptionParser for the parsing rules.
 
-        :param description: Element containing the feed item's description.
+        :param description: Element containing the feed item's description, or None when it has none.
         :return: A list of parsed FeedItemDescriptionBlock objects
         """
-        soup = BeautifulSoup(description.text, FeedParser.PARSER)
-        res = []
-        for child in soup.children:
-            if child.name == FeedParser.PARAGRAPH_TAG:
-                txt = child.get_text("", strip=False).replace('\n', '').replace('\xa0', ' ').replace('\t', ' ').lstrip()
-                if txt.strip() != '':
-                    res.append(FeedItemDescriptionBlock(FeedItemDescriptionBlock.TEXT_TYPE, txt))
-            elif child.name == FeedParser.DIV_TAG:
-                for img in child.find_all(FeedParser.IMG_TAG):
-                    # We are going for a LBYL approach, since we do not have a reliable logging solution in place
-                    if FeedParser.IMG_URL_ATTRB in img:
-                        res.append(FeedItemDescriptionBlock(FeedItemDescriptionBlock.IMAGE_TYPE,
-                                                            img[FeedParser.IMG_URL_ATTRB]))
-                for ul in child.find_all(FeedParser.LINKS_TAG):
-                    res.append(FeedItemDescriptionBlock(FeedItemDescriptionBlock.LINKS_TYPE,
-                                                        [a[FeedParser.LINK_REF_ATTRB]
-                                                         for a in ul.find_all(FeedParser.URL_TAG)
-                                                         if FeedParser.LINK_REF_ATTRB in a]))
-        return res
+        return FeedParser.DESCRIPTION_PARSER.parse(description.text if description is not None else '')
+
+
+def parse_description_text(text):
+    """
+    Parses a description's text with the configured backend. Being a module level function, it can be sent to the
+    PARSE_POOL's processes.
+
+    :param text: The item's description HTML.
+    :return: A list of parsed FeedItemDescriptionBlock objects
+    """
+    return FeedParser.DESCRIPTION_PARSER.parse(text)
 
 
 class FeedReader:
@@ -113,30 +287,127 @@ class FeedReader:
     Class containing static methods for getting a feed's contents and preparing those for parsing
     """
 
-    FEED_ROOT = 'channel'
+    FEED_ROOT = RSS.DATA_ROOT_TAG
+    SESSION = FeedSession(Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT, Config.HTTP_MAX_BYTES,
+                          Config.HTTP_POOL_CONNECTIONS, Config.HTTP_POOL_MAXSIZE)
+    FETCH_CACHE = FetchCache(Config.FETCH_CACHE_TTL, Config.FETCH_CACHE_MAX_ENTRIES, Config.FETCH_CACHE_MAX_BYTES,
+                             create_fetch_store(Config))
+    XML_PARSER = BoundedXMLParser(Config.XML_MAX_BYTES, Config.XML_MAX_DEPTH, Config.XML_MAX_ELEMENTS)
+    HOST_HEALTH = HostHealth(Config.BREAKER_MAX_FAILURES, Config.BREAKER_RESET)
 
     @staticmethod
     def get_content(url):
         """
-        Method responsible for retrieving a feed's content. If it fails to retrieve it, it will raise a generic
-        RequestException.
+        Method responsible for retrieving a feed's content through the pooled SESSION. If it fails to retrieve it,
+        including timeouts and oversized contents, it will raise a generic RequestException.
+
+        Contents are kept in the FETCH_CACHE: fresh ones are returned without any request, while stale ones are
+        revalidated with a conditional request, reusing the cached contents when the server answers 304 Not Modified.
+        Hosts whose circuit is open in HOST_HEALTH are not requested: their stale contents are returned as they are, and
+        a CircuitOpen is raised for the others.
 
         :param url: Feed's complete url
         :return: Requested feed's contents.
         """
-        res = requests.get(url=url)
+        cached = FeedReader.FETCH_CACHE.get(url)
+        if cached is not None and cached.is_fresh():
+            return cached.content
+        try:
+            FeedReader.check_host(url)
+        except CircuitOpen:
+            if cached is not None:
+                return cached.content
+            raise
+        headers = cached.validators() if cached is not None else {}
+        start = time.perf_counter()
+        try:
+            res = FeedReader.SESSION.get(url, headers=headers)
+        except Exception as e:
+            FeedReader.record_health(url, error=e)
+            raise
+        FeedReader.record_health(url, status_code=res.status_code)
+        if metrics.enabled:
+            FeedReader.observe_fetch(url, res, time.perf_counter() - start)
+        if res.status_code == 304 and cached is not None:
+            return FeedReader.FETCH_CACHE.revalidate(url, cached).content
+        if res.status_code != 200:
+            raise RequestException(f"The requested feed could not be retrieved. Code: {res.status_code}")
+        return FeedReader.FETCH_CACHE.store(url, res).content
+
+    @staticmethod
+    def check_host(url):
+        """
+        :param url: Url about to be requested.
+        :raises CircuitOpen: When the url's host circuit is open in HOST_HEALTH.
+        """
+        if not FeedReader.HOST_HEALTH.allow(url):
+            metrics.count('short_circuits', host=HostHealth.host(url))
+            raise CircuitOpen(f'The host of {url} is failing, and is not requested for now')
+
+    @staticmethod
+    def record_health(url, status_code=None, error=None):
+        """
+        Records the outcome of a request in HOST_HEALTH. Responses of the server, oversized ones included, tell the host
+        is healthy, unless they are 5xx errors.
+
+        :param url: Requested url.
+        :param status_code: Response's status code, if any.
+        :param error: Exception raised by the request, if any.
+        """
+        if (error is None and status_code < 500) or isinstance(error, ResponseTooLarge):
+            FeedReader.HOST_HEALTH.success(url)
+        else:
+            FeedReader.HOST_HEALTH.failure(url)
+
+    @staticmethod
+    def observe_fetch(url, res, seconds):
+        """
+        Records a request's metrics: the time until its response's headers arrived, covering DNS resolution, connecting
+        and the server's processing, and the time spent downloading its body, along with the body's size.
+
+        :param url: Requested url.
+        :param res: The FetchedResponse.
+        :param seconds: Total time spent on the request.
+        """
+        host = urlsplit(url).hostname or ''
+        elapsed = res.elapsed if res.elapsed is not None else seconds
+        metrics.observe('headers', elapsed, host)
+        metrics.observe('download', max(seconds - elapsed, 0.0), host)
+        metrics.count('fetched_bytes', len(res.content), host=host)
+
+    @staticmethod
+    def iter_content(url):
+        """
+        Method responsible for retrieving a feed's content in chunks, as they are downloaded, so it can be parsed while
+        it is still being received. It bypasses the FETCH_CACHE. If it fails to retrieve it, it will raise a generic
+        RequestException, before yielding anything when the request itself fails, or when the url's host circuit is
+        open.
+
+        :param url: Feed's complete url
+        :return: A generator of the requested feed's contents chunks.
+        """
+        FeedReader.check_host(url)
+        try:
+            res, chunks = FeedReader.SESSION.stream(url)
+        except Exception as e:
+            FeedReader.record_health(url, error=e)
+            raise
+        FeedReader.record_health(url, status_code=res.status_code)
         if res.status_code != 200:
+            res.close()
             raise RequestException(f"The requested feed could not be retrieved. Code: {res.status_code}")
-        return res.content
+        return chunks
 
     @staticmethod
     def get_feed_root(content):
         """
-        Method responsible for finding the feed's data root element, which is assumed to be the FEED_ROOT constant.
-        Any thrown ParseErrors should reach the outer scope.
+        Method responsible for finding the feed's data root element, the one containing its items: the FEED_ROOT
+        channel for RSS feeds, and the document root itself for Atom and RSS 1.0 (RDF) feeds. The format is detected
+        from the document root's tag. Contents are parsed within the XML_PARSER's limits. Any thrown ParseErrors,
+        including XMLLimitExceeded, should reach the outer scope.
 
         :param content: Feed's contents, as a string
         :return: Feed's data root as an ElementTree, ready for parsing.
         """
-        root = ElementTree.XML(content)
-        return root.find(FeedReader.FEED_ROOT)
+        root = FeedReader.XML_PARSER.parse(content)
+        return detect_format(root.tag).data_root(root)
@@ -0,0 +1,161 @@
+import codecs
+from xml.etree import ElementTree
+from xml.etree.ElementTree import ParseError
+
+
+class XMLLimitExceeded(ParseError):
+    """
+    Raised when a document is rejected by a BoundedXMLParser, before it is completely parsed.
+    """
+
+
+class BoundedXMLParser:
+    """
+    XML parser for untrusted documents, whose worst case cost is bound by its limits. Documents are fed to the
+    parser in CHUNK_SIZE slices, and parsing is aborted as soon as one of them goes past:
+
+    - max_bytes, the document's total size;
+    - max_depth, the number of nested elements;
+    - max_elements, the total number of elements.
+
+    Limits are checked between chunks, so no more than a chunk's worth of elements is ever built past them. Document
+    type declarations with an internal subset, where entities are declared, are rejected before being parsed, so no
+    entity is ever expanded. External ones are harmless, since they are never fetched.
+
+    Declarations are looked for in documents' prologs, which must be in an ASCII compatible encoding or in UTF-16,
+    the only other encoding expat reads, and no longer than MAX_PROLOG.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    MAX_PROLOG = 64 * 1024
+    DOCTYPE = '<!DOCTYPE'
+
+    def __init__(self, max_bytes, max_depth, max_elements):
+        """
+        :param max_bytes: Maximum size of a document.
+        :param max_depth: Maximum number of nested elements.
+        :param max_elements: Maximum number of elements in a document.
+        """
+        self.max_bytes = max_bytes
+        self.max_depth = max_depth
+        self.max_elements = max_elements
+
+    def parse(self, content):
+        """
+        :param content: Document, as bytes, a memoryview of bytes or a string.
+        :return: The document's root element.
+        """
+        chunks = (content[start:start + self.CHUNK_SIZE] for start in range(0, len(content), self.CHUNK_SIZE))
+        root = None
+        for event, element in self.iter_events(chunks):
+            if root is None:
+                root = element
+        return root
+
+    def iter_events(self, chunks):
+        """
+        Parses a document incrementally, as XMLPullParser does. Any thrown ParseErrors, XMLLimitExceeded included,
+        should reach the outer scope.
+
+        :param chunks: Iterable of the document's chunks, as bytes or as strings.
+        :return: A generator of ('start', element) and ('end', element) events.
+        """
+        parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        prolog = None
+        safe = False
+        size = depth = elements = 0
+        for chunk in chunks:
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise XMLLimitExceeded(f'The document is bigger than {self.max_bytes} bytes')
+            if not safe:
+                # Views, such as the fetch store's, are only copied for as long as their prolog is being checked.
+                head = chunk.tobytes() if isinstance(chunk, memoryview) else chunk
+                prolog = head if prolog is None else prolog + head
+                safe = self.check_prolog(prolog)
+                if not safe and len(prolog) > self.MAX_PROLOG:
+                    raise XMLLimitExceeded(f'The document\'s prolog is longer than {self.MAX_PROLOG} bytes')
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if event == 'start':
+                    depth += 1
+                    elements += 1
+                    if depth > self.max_depth:
+                        raise XMLLimitExceeded(f'The document is nested deeper than {self.max_depth} elements')
+                    if elements > self.max_elements:
+                        raise XMLLimitExceeded(f'The document has more than {self.max_elements} elements')
+                else:
+                    depth -= 1
+                yield event, element
+        parser.close()
+        yield from parser.read_events()
+
+    def check_prolog(self, prolog):
+        """
+        Looks for a document type declaration with an internal subset in a document's prolog: its XML declaration,
+        processing instructions, comments and document type declaration, up to its root element.
+
+        :param prolog: The document's first bytes, or characters.
+        :return: True when the whole prolog was read, and is safe, False when more of it is needed.
+        :raises XMLLimitExceeded: When the prolog holds a document type declaration with an internal subset.
+        """
+        text = self.decode_prolog(prolog) if isinstance(prolog, bytes) else prolog
+        position = 0
+        while True:
+            while position < len(text) and text[position] in ' \t\r\n\ufeff':
+                position += 1
+            if text.startswith('<?', position):
+                end = text.find('?>', position)
+                if end < 0:
+                    return False
+                position = end + 2
+            elif text.startswith('<!--', position):
+                end = text.find('-->', position)
+                if end < 0:
+                    return False
+                position = end + 3
+            elif text.startswith(self.DOCTYPE, position):
+                end = self.doctype_end(text, position + len(self.DOCTYPE))
+                if end is None:
+                    return False
+                if text[end] == '[':
+                    raise XMLLimitExceeded('Document type declarations with an internal subset are not allowed')
+                position = end + 1
+            else:
+                # Past the prolog, unless its next markup was only partially read.
+                rest = text[position:position + len(self.DOCTYPE)]
+                return not (self.DOCTYPE.startswith(rest) or '<!--'.startswith(rest))
+
+    @staticmethod
+    def doctype_end(text, position):
+        """
+        :param text: A document's prolog.
+        :param position: Position right after a document type declaration's keyword.
+        :return: Position of the '>' ending the declaration, or of the '[' starting its internal subset, or None when
+        neither was read yet.
+        """
+        quote = None
+        for index in range(position, len(text)):
+            char = text[index]
+            if quote is not None:
+                if char == quote:
+                    quote = None
+            elif char in '"\'':
+                quote = char
+            elif char in '[>':
+                return index
+        return None
+
+    @staticmethod
+    def decode_prolog(prolog):
+        """
+        :param prolog: A document's first bytes.
+        :return: The prolog's characters, as far as the markup can tell.
+        """
+        if prolog.startswith((b'\xfe\xff', b'\x00<')):
+            return prolog.decode('utf-16-be', errors='ignore')
+        if prolog.startswith((b'\xff\xfe', b'<\x00')):
+            return prolog.decode('utf-16-le', errors='ignore')
+        if prolog.startswith(codecs.BOM_UTF8):
+            prolog = prolog[len(codecs.BOM_UTF8):]
+        return prolog.decode('latin-1')
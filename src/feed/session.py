@@ -0,0 +1,151 @@
+import os
+from threading import Lock
+
+import requests
+import urllib3
+from requests import RequestException
+from requests.adapters import HTTPAdapter
+from requests.exceptions import InvalidURL
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ResponseTooLarge(RequestException):
+    """
+    Raised when a response's body is bigger than the session allows.
+    """
+
+
+class FetchedResponse:
+    """
+    Class representing a fully downloaded response, along with the seconds it took for its headers to arrive, if known.
+    """
+
+    def __init__(self, status_code, headers, content, elapsed=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.elapsed = elapsed
+
+
+class FeedSession:
+    """
+    HTTP client used to fetch feeds. Each worker process keeps a single requests Session, whose connections are pooled
+    and kept alive per host, and every request is bound by connect and read timeouts and by a maximum body size,
+    which aborts oversized downloads as soon as they go past it.
+
+    Bodies may be transferred compressed with gzip or deflate, and with brotli when the brotli package is installed.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    # Older urllib3 versions do not decode brotli bodies themselves, in which case we do.
+    DECODES_BROTLI = hasattr(urllib3.response, 'BrotliDecoder')
+
+    def __init__(self, connect_timeout, read_timeout, max_bytes, pool_connections, pool_maxsize):
+        """
+        :param connect_timeout: Seconds to wait for a connection to be established.
+        :param read_timeout: Seconds to wait between bytes sent by the server.
+        :param max_bytes: Maximum size of a response's decoded body.
+        :param pool_connections: Number of hosts whose connections are pooled.
+        :param pool_maxsize: Number of connections kept alive per host.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_bytes = max_bytes
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._session = None
+        self._pid = None
+        self._lock = Lock()
+
+    @property
+    def session(self):
+        # Connections must not be shared across forked processes, so each process creates its own session.
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                self._session = self.create_session()
+                self._pid = os.getpid()
+            return self._session
+
+    def create_session(self):
+        """
+        :return: A new requests Session, with its connection pools and accepted encodings set up.
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Accept-Encoding'] = 'gzip, deflate, br' if brotli is not None else 'gzip, deflate'
+        return session
+
+    def get(self, url, headers=None):
+        """
+        Downloads a url's whole response. Failures, including timeouts and oversized bodies, are raised as
+        RequestExceptions.
+
+        :param url: Complete url
+        :param headers: Additional request headers.
+        :return: A FetchedResponse.
+        """
+        res = self.open(url, headers)
+        with res:
+            content = b''.join(self.iter_body(res))
+        return FetchedResponse(res.status_code, res.headers, content, res.elapsed.total_seconds())
+
+    def stream(self, url, headers=None):
+        """
+        Starts downloading a url's response, so its body can be read in chunks as they arrive. Failures to connect
+        are raised right away, while later ones are raised by the chunks generator.
+
+        :param url: Complete url
+        :param headers: Additional request headers.
+        :return: A tuple with the response, whose body was not read yet, and a generator of its body's chunks.
+        """
+        res = self.open(url, headers)
+        return res, self._iter_closing(res)
+
+    def open(self, url, headers=None):
+        """
+        Sends a request, without reading its response's body. Responses announcing a body bigger than the maximum
+        size are refused right away. Malformed urls some urllib3 versions fail to parse are raised as InvalidURLs.
+
+        :param url: Complete url
+        :param headers: Additional request headers.
+        :return: The requests Response.
+        """
+        try:
+            res = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+        except RequestException:
+            raise
+        except ValueError as e:
+            raise InvalidURL(f'The url {url} is malformed: {e}')
+        length = res.headers.get('Content-Length')
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            res.close()
+            raise ResponseTooLarge(f'The response is bigger than {self.max_bytes} bytes')
+        return res
+
+    def iter_body(self, res):
+        """
+        Reads a response's body in decoded chunks, making sure it stays within the maximum size.
+
+        :param res: A requests Response, opened by FeedSession.open.
+        :return: A generator of the body's chunks.
+        """
+        decompressor = None
+        if brotli is not None and not self.DECODES_BROTLI and res.headers.get('Content-Encoding', '').lower() == 'br':
+            decompressor = brotli.Decompressor()
+        size = 0
+        for chunk in res.iter_content(self.CHUNK_SIZE):
+            if decompressor is not None:
+                chunk = decompressor.process(chunk)
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise ResponseTooLarge(f'The response is bigger than {self.max_bytes} bytes')
+            yield chunk
+
+    def _iter_closing(self, res):
+        with res:
+            yield from self.iter_body(res)
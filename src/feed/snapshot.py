@@ -0,0 +1,93 @@
+import json
+import os
+import struct
+import tempfile
+
+MAGIC = b'FEEDSNAP1\n'
+HEADER = struct.Struct('<II')
+FETCH_RECORD = 'fetch'
+RESULT_RECORD = 'result'
+
+
+def save_snapshot(path, fetch_cache, result_cache):
+    """
+    Writes the hot contents of a process' caches to a file, so that the next processes can start with them: the fetch
+    cache's contents, along with their validators and freshness, and the result cache's serialized results. The file
+    is replaced atomically, so that readers never see a partial snapshot.
+
+    Records are laid out as a header holding the lengths of their JSON description and of their payload, followed by
+    both, least recently used first, so that loading them keeps the caches' order.
+
+    :param path: Snapshot file's path.
+    :param fetch_cache: The FetchCache.
+    :param result_cache: The ResultCache. Results are only saved from the memory backend.
+    :return: A (number of feeds, number of results) tuple.
+    """
+    fetched = fetch_cache.entries()
+    results = result_cache.items()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            for url, entry in fetched:
+                write_record(f, dict(fetch_cache.to_meta(entry), type=FETCH_RECORD, url=url), entry.content)
+            for key, value in results:
+                write_record(f, dict(type=RESULT_RECORD, key=key), value)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return len(fetched), len(results)
+
+
+def write_record(f, meta, payload):
+    meta = json.dumps(meta).encode('utf-8')
+    f.write(HEADER.pack(len(meta), len(payload)))
+    f.write(meta)
+    f.write(payload)
+
+
+def load_snapshot(path, fetch_cache, result_cache):
+    """
+    Fills a process' caches with a snapshot written by save_snapshot. Fetched contents keep the freshness they had when
+    the snapshot was written: stale ones are revalidated with a conditional request when first read, which usually
+    finds them unchanged, and then finds their results in the result cache.
+
+    Snapshots are only an optimization, so a missing snapshot is ignored, and so is a snapshot in another format. A
+    truncated one is read up to its last complete record.
+
+    :param path: Snapshot file's path.
+    :param fetch_cache: The FetchCache.
+    :param result_cache: The ResultCache.
+    :return: A (number of feeds, number of results) tuple.
+    """
+    feeds = results = 0
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return feeds, results
+    with f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return feeds, results
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                break
+            meta_length, payload_length = HEADER.unpack(header)
+            meta = f.read(meta_length)
+            payload = f.read(payload_length)
+            if len(meta) < meta_length or len(payload) < payload_length:
+                break
+            meta = json.loads(meta.decode('utf-8'))
+            if meta['type'] == FETCH_RECORD:
+                fetch_cache.restore(meta['url'], fetch_cache.from_meta(payload, meta))
+                feeds += 1
+            elif meta['type'] == RESULT_RECORD:
+                result_cache.set(meta['key'], payload)
+                results += 1
+    return feeds, results
@@ -0,0 +1,231 @@
+import fcntl
+import mmap
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+from threading import Lock
+
+
+class _Segment:
+    """
+    Class representing a segment file, as far as this process has read and mapped it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.scanned = 0
+        self.map = None
+
+
+class SegmentStore:
+    """
+    Key/value store shared by every worker process of a host, and surviving restarts. Values are appended to segment
+    files, as records checksummed against torn writes, and read through read-only memory maps, so the page cache holds
+    a single copy of them for every process. Each process indexes the records by key, and reads the records appended
+    by the others whenever the segments changed, which two stat calls tell.
+
+    Appending and compacting are serialized across processes by a lock file. Once the segments grow past max_bytes,
+    they are compacted into a new segment holding the most recently written value of the most recently written keys,
+    up to half of max_bytes, and the old segments are removed.
+    """
+
+    HEADER = struct.Struct('<IIH')
+    SEGMENT_PREFIX = 'segment-'
+    SEGMENT_SUFFIX = '.dat'
+    LOCK_NAME = 'store.lock'
+
+    def __init__(self, directory, max_bytes, segment_bytes):
+        """
+        :param directory: Directory holding the segments.
+        :param max_bytes: Total size of the segments past which they are compacted.
+        :param segment_bytes: Size past which a new segment is started.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self._segments = {}
+        self._index = {}
+        self._listed = None
+        self._lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._index)
+
+    def get_view(self, key):
+        """
+        :param key: Key, as a string.
+        :return: A memoryview of the key's value, straight from the segment's memory map, or None.
+        """
+        with self._lock:
+            if self._stale():
+                self._refresh()
+            location = self._index.get(key)
+            if location is None:
+                return None
+            segment, offset, length = location
+            return memoryview(segment.map)[offset:offset + length]
+
+    def get(self, key):
+        """
+        :param key: Key, as a string.
+        :return: A copy of the key's value, as bytes, or None.
+        """
+        view = self.get_view(key)
+        return bytes(view) if view is not None else None
+
+    def set(self, key, value):
+        """
+        Appends a value for a key, compacting the segments when they grew too big.
+
+        :param key: Key, as a string.
+        :param value: Value, as bytes.
+        """
+        key_bytes = key.encode('utf-8')
+        record = self.HEADER.pack(zlib.crc32(key_bytes + value), len(value), len(key_bytes)) + key_bytes + value
+        with self._lock, self._locked():
+            self._refresh()
+            segment = self._active_segment(len(record))
+            with open(segment.path, 'ab') as f:
+                f.write(record)
+            self._scan(segment)
+            if sum(segment.scanned for segment in self._segments.values()) > self.max_bytes:
+                self._compact()
+
+    def clear(self):
+        """
+        Removes every value, and the segments holding them.
+        """
+        with self._lock, self._locked():
+            self._refresh()
+            for segment in self._segments.values():
+                self._remove(segment.path)
+            self._segments.clear()
+            self._index.clear()
+
+    @contextmanager
+    def _locked(self):
+        # The lock file is opened on every acquisition: flock locks belong to the open file, which a fork would share.
+        with open(os.path.join(self.directory, self.LOCK_NAME), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _segment_paths(self):
+        names = [name for name in os.listdir(self.directory)
+                 if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX)]
+        return sorted(os.path.join(self.directory, name) for name in names)
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f'{self.SEGMENT_PREFIX}{number:08d}{self.SEGMENT_SUFFIX}')
+
+    def _stale(self):
+        # Segments are only created and removed in the directory, and only appended to while they are the last one.
+        if os.stat(self.directory).st_mtime_ns != self._listed:
+            return True
+        if not self._segments:
+            return False
+        last = self._segments[max(self._segments)]
+        try:
+            return os.path.getsize(last.path) != last.scanned
+        except OSError:
+            return True
+
+    def _refresh(self):
+        """
+        Brings the index up to date with the segments on disk: removed segments are dropped, and records appended by
+        any process since the last refresh are indexed, in order, so that the newest value of a key wins.
+        """
+        self._listed = os.stat(self.directory).st_mtime_ns
+        paths = self._segment_paths()
+        existing = set(paths)
+        for path in list(self._segments):
+            if path not in existing:
+                # Maps of removed segments stay valid for as long as views of them are in use.
+                del self._segments[path]
+        self._index = {key: location for key, location in self._index.items() if location[0].path in existing}
+        for path in paths:
+            segment = self._segments.get(path)
+            if segment is None:
+                segment = self._segments[path] = _Segment(path)
+            self._scan(segment)
+
+    def _scan(self, segment):
+        try:
+            size = os.path.getsize(segment.path)
+        except OSError:
+            return
+        if size <= segment.scanned:
+            return
+        try:
+            with open(segment.path, 'rb') as f:
+                segment.map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Readers do not take the lock file, so the segment may have been compacted away since it was listed, or
+            # truncated since it was measured. The next refresh drops it, or maps it again.
+            return
+        offset = segment.scanned
+        while offset + self.HEADER.size <= size:
+            checksum, value_length, key_length = self.HEADER.unpack_from(segment.map, offset)
+            start = offset + self.HEADER.size
+            end = start + key_length + value_length
+            # A torn or corrupt record ends the segment; appending truncates it away.
+            if end > size or zlib.crc32(segment.map[start:end]) != checksum:
+                break
+            key = segment.map[start:start + key_length].decode('utf-8')
+            self._index[key] = (segment, start + key_length, value_length)
+            offset = end
+        segment.scanned = offset
+
+    def _active_segment(self, length):
+        paths = sorted(self._segments)
+        if paths:
+            segment = self._segments[paths[-1]]
+            if segment.scanned + length <= self.segment_bytes or segment.scanned == 0:
+                if os.path.getsize(segment.path) > segment.scanned:
+                    os.truncate(segment.path, segment.scanned)
+                return segment
+            number = int(os.path.basename(paths[-1])[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]) + 1
+        else:
+            number = 0
+        segment = self._segments[self._segment_path(number)] = _Segment(self._segment_path(number))
+        return segment
+
+    def _compact(self):
+        """
+        Rewrites the newest values of the most recently written keys, up to half of max_bytes, into a new segment,
+        and removes every other segment.
+        """
+        locations = sorted(self._index.items(), key=lambda entry: (entry[1][0].path, entry[1][1]), reverse=True)
+        kept = []
+        size = 0
+        for key, (segment, offset, length) in locations:
+            key_bytes = key.encode('utf-8')
+            value = segment.map[offset:offset + length]
+            record = self.HEADER.pack(zlib.crc32(key_bytes + value), length, len(key_bytes)) + key_bytes + value
+            if size + len(record) > self.max_bytes // 2:
+                break
+            kept.append(record)
+            size += len(record)
+        last = max(self._segments)
+        number = int(os.path.basename(last)[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]) + 1
+        path = self._segment_path(number)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.writelines(reversed(kept))
+        os.replace(tmp, path)
+        for old in list(self._segments):
+            self._remove(old)
+        self._segments = {path: _Segment(path)}
+        self._index = {}
+        self._scan(self._segments[path])
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -0,0 +1,62 @@
+"""
+Gunicorn settings and hooks, loaded by run.sh for both servers.
+
+With PRELOAD set to 1, the application is imported and initialized once, in the master process, before the workers are
+forked, instead of once per worker: workers share its modules and state copy-on-write, the caches filled from
+SNAPSHOT_PATH included. Every worker writes its caches back to SNAPSHOT_PATH when it exits, so that the next ones start
+warm. How long the master, and each worker, took to be ready is logged, and exposed at /metrics.
+"""
+import gc
+import os
+import time
+
+from src.config import Config
+
+# Monotonic clocks are shared by every process of the host, so workers can tell how long ago the master started.
+STARTED = time.monotonic()
+STARTUP_HELP = 'Seconds it took this worker to be ready, since it was forked and since the server was started.'
+
+preload_app = bool(int(os.environ.get('PRELOAD', 0)))
+
+
+def when_ready(server):
+    server.log.info('Master ready in %.3fs%s', time.monotonic() - STARTED,
+                    ', application preloaded' if preload_app else '')
+
+
+def pre_fork(server, worker):
+    # Objects created so far are left out of garbage collections, which would otherwise write to their pages, and copy
+    # them into every worker. Only available since Python 3.7.
+    if preload_app and hasattr(gc, 'freeze'):
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+
+
+def post_worker_init(worker):
+    from src.feed.metrics import metrics
+
+    now = time.monotonic()
+    ready = now - worker.forked_at
+    booted = now - STARTED
+    metrics.gauge('startup_seconds', STARTUP_HELP, lambda: ready, stage='worker')
+    metrics.gauge('startup_seconds', STARTUP_HELP, lambda: booted, stage='server')
+    worker.log.info('Worker %s ready in %.3fs, %.3fs after the server was started', worker.pid, ready, booted)
+
+
+def worker_exit(server, worker):
+    if not Config.SNAPSHOT_PATH:
+        return
+    from src.feed.blueprint import result_cache
+    from src.feed.reader import FeedReader
+    from src.feed.snapshot import save_snapshot
+
+    try:
+        feeds, results = save_snapshot(Config.SNAPSHOT_PATH, FeedReader.FETCH_CACHE, result_cache)
+    except OSError as e:
+        server.log.warning('Snapshot could not be saved to %s: %s', Config.SNAPSHOT_PATH, e)
+    else:
+        server.log.info('Worker %s saved %d feeds and %d results to %s', worker.pid, feeds, results,
+                        Config.SNAPSHOT_PATH)
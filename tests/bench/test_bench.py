@@ -0,0 +1,47 @@
+import unittest
+
+from bench.corpus import SHAPES, generate_feed
+from bench.description import corpus_descriptions, measure_backends
+from bench.run import compare
+from src.feed.reader import FeedReader, FeedParser
+
+
+class BenchTests(unittest.TestCase):
+    """
+    TestCase containing tests for the benchmark harness.
+    """
+
+    def test_generate_feed(self):
+        """
+        Feeds should be identical for the same seed, and parse into the requested number of items.
+        """
+        for shape in SHAPES:
+            with self.subTest(shape=shape):
+                content = generate_feed(20, shape, seed=1)
+                assert content == generate_feed(20, shape, seed=1)
+                assert content != generate_feed(20, shape, seed=2)
+                feed = FeedParser.parse_feed(FeedReader.get_feed_root(content))
+                assert len(feed.items) == 20
+                assert all(item.description for item in feed.items)
+
+    def test_compare(self):
+        """
+        Stages past the baseline by more than the tolerance should be flagged, ignoring timing noise.
+        """
+        baseline = {'feed': {'stage': {'seconds': 0.1, 'peak_bytes': 1000},
+                             'fast': {'seconds': 0.0001, 'peak_bytes': 10}}}
+        results = {'feed': {'stage': {'seconds': 0.2, 'peak_bytes': 1100},
+                            'fast': {'seconds': 0.0003, 'peak_bytes': 20000}},
+                   'new': {'stage': {'seconds': 1, 'peak_bytes': 1}}}
+        assert compare(results, baseline, 0.25) == [('feed', 'stage', 'seconds', 0.2, 0.1)]
+
+    def test_measure_backends(self):
+        """
+        Every backend should be timed on the same descriptions, and produce the same blocks.
+        """
+        descriptions = corpus_descriptions('result', 10, seed=1)
+        assert len(descriptions) == 10 and all(descriptions)
+        results = measure_backends(['soup', 'events'], descriptions, 1)
+        assert set(results) == {'soup', 'events'}
+        assert results['soup']['output'] == results['events']['output']
+        assert all(measured['us_per_item'] > 0 for measured in results.values())
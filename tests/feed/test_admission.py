@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.feed.admission import AdmissionControl, started
+
+
+class AdmissionControlTests(unittest.TestCase):
+    """
+    TestCase containing tests for the admission control.
+    """
+
+    def test_budget(self):
+        """
+        Requests should be admitted while their cost fits in the budget, and again once others are released.
+        """
+        admission = AdmissionControl(10)
+        assert admission.acquire(6)
+        assert not admission.acquire(5)
+        assert admission.acquire(4)
+        assert not admission.acquire(1)
+        admission.release(6)
+        assert admission.acquire(5)
+        assert admission.in_flight == 9
+
+    def test_oversized_cost(self):
+        """
+        Requests costing more than the whole budget should be admitted alone.
+        """
+        admission = AdmissionControl(10)
+        assert admission.acquire(100)
+        assert not admission.acquire(1)
+        admission.release(100)
+        assert admission.in_flight == 0
+        assert admission.acquire(1)
+        assert not admission.acquire(100)
+
+    def test_disabled(self):
+        """
+        Without a budget, every request should be admitted.
+        """
+        admission = AdmissionControl(0)
+        assert all(admission.acquire(1000) for _ in range(10))
+
+    def test_shared_state(self):
+        """
+        With a state file, the budget should be shared by every process using it, as workers would, and the counts of
+        processes that are gone dropped, including when their pid was reused by another process.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'admission')
+            admission = AdmissionControl(10, path)
+            assert admission.acquire(3)
+            # Another worker reading 6 feeds.
+            with open(path, 'a') as f:
+                f.write('4194305 1 6\n')
+            with patch('src.feed.admission.alive', return_value=True):
+                assert not admission.acquire(2)
+                assert admission.acquire(1)
+                admission.release(3)
+                assert admission.acquire(3)
+            assert admission.in_flight == 4
+            # The other worker is gone: its feeds are not in flight anymore.
+            assert admission.acquire(6)
+            start = started(os.getpid())
+            with open(path) as f:
+                assert f.read() == f'{os.getpid()} {start} 10\n'
+            # A worker that crashed before this process reused its pid.
+            admission.release(10)
+            with open(path, 'a') as f:
+                f.write(f'{os.getpid()} {start}0 6\n')
+            assert admission.acquire(10)
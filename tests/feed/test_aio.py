@@ -0,0 +1,225 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from threading import Thread, current_thread
+from unittest.mock import patch, MagicMock
+
+from requests import RequestException
+
+from src.feed.admission import AdmissionControl
+from src.feed.aio import AsyncFeedReader, FeedASGIApp
+from src.feed.blueprint import result_cache
+from src.feed.health import HostHealth, CircuitOpen
+from src.feed.parallel import ParsePool
+from src.feed.reader import FeedReader
+from tests.feed.test_session import _Server, _Handler
+
+
+class _FakeReader:
+    def __init__(self, contents):
+        self.contents = contents
+        self.closed = False
+
+    async def get_content(self, url):
+        if url not in self.contents:
+            raise RequestException()
+        if url == 'slow_url':
+            await asyncio.sleep(1)
+        return self.contents[url]
+
+    async def close(self):
+        self.closed = True
+
+
+class AsyncFeedTests(unittest.TestCase):
+    """
+    TestCase containing tests for the asyncio reader and ASGI application.
+    """
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        result_cache.clear()
+        FeedReader.FETCH_CACHE.clear()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def request(self, app, path, data, method='POST'):
+        """
+        Sends a request to the ASGI application.
+
+        :return: A (status, body) tuple.
+        """
+        messages = [{'type': 'http.request', 'body': json.dumps(data).encode('utf-8'), 'more_body': False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': method, 'path': path}
+        self.loop.run_until_complete(app(scope, receive, send))
+        return sent[0]['status'], b''.join(message.get('body', b'') for message in sent[1:])
+
+    @patch('src.feed.aio.render_content')
+    def test_read_feed(self, render_content):
+        """
+        Feeds should be fetched asynchronously, and parsed in an executor only when their contents are not cached.
+        """
+        render_content.return_value = b'{"feed": []}'
+        app = FeedASGIApp(_FakeReader({'url': b'content'}), ParsePool(0))
+        assert self.request(app, '/feed/read', {'url': 'url'}) == (200, b'{"feed": []}')
+        assert self.request(app, '/feed/read', {'url': 'url'}) == (200, b'{"feed": []}')
+        render_content.assert_called_once_with(b'content', None)
+
+    def test_read_feed_parse_pool(self):
+        """
+        Contents read from the fetch store's memory map should be parsed by the process pool too, as bytes.
+        """
+        content = memoryview(b'<rss><channel><item><title>pool</title><link>l</link></item></channel></rss>')
+        pool = ParsePool(1)
+        try:
+            app = FeedASGIApp(_FakeReader({'url': content}), pool)
+            assert app.parse_input(content) == content.tobytes()
+            status, body = self.request(app, '/feed/read', {'url': 'url'})
+            assert status == 200
+            assert b'"title": "pool"' in body
+        finally:
+            pool.shutdown()
+        assert FeedASGIApp(_FakeReader({}), ParsePool(0)).parse_input(content) is content
+
+    @patch('src.feed.aio.render_content')
+    def test_read_feed_blocking(self, render_content):
+        """
+        Lookups going through files, such as the shared subscriptions' and the disk result cache's, should not be made
+        in the event loop's thread.
+        """
+        threads = []
+
+        def lookup(*args):
+            threads.append(current_thread())
+
+        render_content.return_value = b'{"feed": []}'
+        app = FeedASGIApp(_FakeReader({'url': b'content'}), ParsePool(0))
+        with patch('src.feed.aio.feed_poller', MagicMock(registry='registry', get=MagicMock(side_effect=lookup))), \
+                patch('src.feed.aio.result_cache', MagicMock(blocking=True, get=MagicMock(side_effect=lookup),
+                                                             set=MagicMock(side_effect=lookup))):
+            assert self.request(app, '/feed/read', {'url': 'url'}) == (200, b'{"feed": []}')
+        assert len(threads) == 3
+        assert current_thread() not in threads
+
+    def test_read_feed_errors(self):
+        """
+        Invalid requests, streamed ones and unreachable urls should result in BadRequests, and unknown routes in
+        NotFounds.
+        """
+        app = FeedASGIApp(_FakeReader({}), ParsePool(0))
+        assert self.request(app, '/feed/read', {'nourl': 'url'})[0] == 400
+        assert self.request(app, '/feed/read', {'url': 'url', 'stream': True})[0] == 400
+        assert self.request(app, '/feed/read', {'url': 123})[0] == 400
+        assert self.request(app, '/feed/read', {'url': 'url'})[0] == 400
+        assert self.request(app, '/feed/read', {'url': 'url'}, method='GET')[0] == 405
+        assert self.request(app, '/unknown', {'url': 'url'})[0] == 404
+
+    @patch('src.feed.aio.render_content')
+    @patch('src.feed.aio.Config.BATCH_DEADLINE', 0.2)
+    def test_read_many_feeds(self, render_content):
+        """
+        Every url should be read concurrently, with slow and unreachable ones reported as errors.
+        """
+        render_content.side_effect = lambda content, query: b'{"feed": ["' + content + b'"]}'
+        app = FeedASGIApp(_FakeReader({'url': b'a', 'slow_url': b'b'}), ParsePool(0))
+        status, body = self.request(app, '/feed/read-many', {'urls': ['url', 'bad_url', 'slow_url']})
+        assert status == 200
+        assert json.loads(body) == {'results': [{'url': 'url', 'feed': ['a']},
+                                                {'url': 'bad_url', 'error': 'The url could not be requested'},
+                                                {'url': 'slow_url',
+                                                 'error': 'The url could not be read before the deadline'}]}
+        # Semaphores of hosts no longer read from are dropped.
+        assert app._hosts == {}
+
+    def test_read_many_feeds_dedup(self):
+        """
+        Deduplicated batches should be fetched concurrently, and render the items found in more than one feed once.
+        """
+        content = (b'<rss><channel><item><title>t</title><link>l</link><description></description></item>'
+                   b'</channel></rss>')
+        app = FeedASGIApp(_FakeReader({'url': content, 'copy_url': content}), ParsePool(0))
+        status, body = self.request(app, '/feed/read-many', {'urls': ['url', 'copy_url'], 'dedup': True})
+        assert status == 200
+        assert body == (b'{"results": [{"url": "url", "feed": '
+                        b'["item": {"title": "t", "link": "l", "description": []}]}, '
+                        b'{"url": "copy_url", "feed": ["item": {"ref": {"result": 0, "item": 0}}]}]}')
+
+    def test_admission_control(self):
+        """
+        Requests past the in-flight budget should be refused with a 503, and admitted ones release their budget, whether
+        it is counted in the worker or in a state file shared with others.
+        """
+        app = FeedASGIApp(_FakeReader({}), ParsePool(0))
+        with tempfile.TemporaryDirectory() as directory:
+            for path in (None, os.path.join(directory, 'admission')):
+                admission = AdmissionControl(1, path)
+                with self.subTest(path=path), patch('src.feed.aio.admission', admission):
+                    assert admission.acquire(1)
+                    assert self.request(app, '/feed/read', {'url': 'url'})[0] == 503
+                    assert self.request(app, '/feed/read-many', {'urls': ['url']})[0] == 503
+                    admission.release(1)
+                    assert self.request(app, '/feed/read', {'url': 'url'})[0] == 400
+                    assert self.request(app, '/feed/read-many', {'urls': ['url', 'other_url']})[0] == 200
+                    assert admission.in_flight == 0
+
+    @patch('src.feed.reader.FeedReader.HOST_HEALTH', HostHealth(1, 30))
+    def test_get_content_circuit_open(self):
+        """
+        Hosts failing repeatedly should not be requested anymore by the asynchronous reader either.
+        """
+        reader = AsyncFeedReader(1, 1, 1024, 4)
+        # Nothing listens on the port of a closed server, so connecting to it fails.
+        server = _Server(('127.0.0.1', 0), _Handler)
+        url = f'http://127.0.0.1:{server.server_address[1]}/'
+        server.server_close()
+        self.assertRaises(RequestException, self.loop.run_until_complete, reader.get_content(url))
+        self.assertRaises(CircuitOpen, self.loop.run_until_complete, reader.get_content(url))
+        self.loop.run_until_complete(reader.close())
+
+    def test_lifespan(self):
+        """
+        The reader should be closed when the server shuts down.
+        """
+        reader = _FakeReader({})
+        app = FeedASGIApp(reader, ParsePool(0))
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        self.loop.run_until_complete(app({'type': 'lifespan'}, receive, send))
+        assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+        assert reader.closed
+
+    def test_async_reader(self):
+        """
+        The asynchronous reader should download and cache contents, and enforce the maximum size.
+        """
+        server = _Server(('127.0.0.1', 0), _Handler)
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            reader = AsyncFeedReader(1, 1, 10000, 2)
+            assert self.loop.run_until_complete(reader.get_content(url + '/gzip')) == _Handler.body
+            assert FeedReader.FETCH_CACHE.get(url + '/gzip').content == _Handler.body
+            reader.max_bytes = 1000
+            self.assertRaises(RequestException, self.loop.run_until_complete, reader.get_content(url + '/chunked'))
+            self.loop.run_until_complete(reader.close())
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,72 @@
+import time
+import unittest
+from threading import Event, Lock
+
+from src.feed.batch import BatchReader, DeadlineExceeded
+
+
+class BatchReaderTests(unittest.TestCase):
+    """
+    TestCase containing tests for the BatchReader class.
+    """
+
+    def test_read_many(self):
+        """
+        Results and errors should be returned per url, in the requested order.
+        """
+        def read(url):
+            if url == 'http://b/fail':
+                raise ValueError()
+            return url.upper()
+
+        reader = BatchReader(4, 2)
+        results = reader.read_many(['http://a/1', 'http://b/fail', 'http://c/2'], read, 5)
+        assert [(url, result) for url, result, _ in results] == [('http://a/1', 'HTTP://A/1'),
+                                                                 ('http://b/fail', None),
+                                                                 ('http://c/2', 'HTTP://C/2')]
+        assert results[0][2] is None
+        assert isinstance(results[1][2], ValueError)
+
+    def test_read_many_deadline(self):
+        """
+        A slow url should not delay the others beyond the deadline, being reported as a DeadlineExceeded error, and the
+        batch only be finished once its read is done.
+        """
+        def read(url):
+            if url == 'http://slow/':
+                time.sleep(1)
+            return url
+
+        reader = BatchReader(4, 2)
+        finished = Event()
+        start = time.monotonic()
+        results = reader.read_many(['http://slow/', 'http://fast/'], read, 0.2, finished.set)
+        assert time.monotonic() - start < 0.9
+        assert isinstance(results[0][2], DeadlineExceeded)
+        assert results[1][1] == 'http://fast/'
+        # The slow read is still running, until it is done.
+        assert not finished.is_set()
+        assert finished.wait(5)
+
+    def test_read_many_per_host(self):
+        """
+        No more than per_host urls of the same host should be read at once.
+        """
+        lock = Lock()
+        running = []
+        peak = []
+
+        def read(url):
+            with lock:
+                running.append(url)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(url)
+            return url
+
+        reader = BatchReader(8, 2)
+        reader.read_many([f'http://host/{i}' for i in range(6)], read, 5)
+        assert max(peak) == 2
+        # Semaphores of hosts no longer read from are dropped.
+        assert reader._hosts == {}
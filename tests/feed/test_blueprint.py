@@ -1,11 +1,18 @@
 import json
+import time
 import unittest
-from unittest.mock import patch
+from threading import Event
+from unittest.mock import patch, MagicMock
 from xml.etree.ElementTree import ParseError
 
 from requests import RequestException
 
 from src.app import create_app
+from src.config import Config
+from src.feed.admission import AdmissionControl
+from src.feed.blueprint import result_cache
+from src.feed.metrics import metrics
+from src.feed.safexml import XMLLimitExceeded
 
 
 class FeedBlueprintTests(unittest.TestCase):
@@ -19,6 +26,7 @@ class FeedBlueprintTests(unittest.TestCase):
         """
         self.app = create_app()
         self.app.config['TESTING'] = True
+        result_cache.clear()
 
     @patch('src.feed.blueprint.FeedReader')
     @patch('src.feed.blueprint.FeedParser')
@@ -29,12 +37,32 @@ class FeedBlueprintTests(unittest.TestCase):
         """
         url = 'test_url'
         expected = dict(url=url, data='data')
+        reader.get_content.return_value = b'content'
         parser.parse_feed.return_value.to_json.return_value = json.dumps(expected)
         with self.app.test_client() as client:
             res = client.post('/feed/read', json={'url': url})
         reader.get_content.assert_called_with(url)
         reader.get_feed_root.assert_called_with(reader.get_content.return_value)
-        parser.parse_feed.assert_called_with(reader.get_feed_root.return_value)
+        parser.parse_feed.assert_called_with(reader.get_feed_root.return_value, query=None)
+        assert res.status_code == 200
+        assert res.get_json() == expected
+
+    @patch('src.feed.blueprint.FeedReader')
+    @patch('src.feed.blueprint.FeedParser')
+    def test_read_feed_cached_result(self, parser, reader):
+        """
+        Unchanged contents should be answered from the result cache, without being parsed again.
+        """
+        url = 'test_url'
+        expected = dict(url=url, data='data')
+        reader.get_content.return_value = b'content'
+        parser.parse_feed.return_value.to_json.return_value = json.dumps(expected)
+        with self.app.test_client() as client:
+            client.post('/feed/read', json={'url': url})
+            res = client.post('/feed/read', json={'url': url})
+        assert reader.get_content.call_count == 2
+        assert reader.get_feed_root.call_count == 1
+        assert parser.parse_feed.call_count == 1
         assert res.status_code == 200
         assert res.get_json() == expected
 
@@ -47,7 +75,11 @@ class FeedBlueprintTests(unittest.TestCase):
         url = 'test_url'
         with self.app.test_client() as client:
             res = client.post('/feed/read', json={'nourl': url})
+            for data in ({'url': 123}, {'url': 123, 'fields': ['title']}, {'url': None, 'stream': True}):
+                assert client.post('/feed/read', json=data).status_code == 400
+            assert client.post('/feed/subscribe', json={'url': 123}).status_code == 400
         reader.get_content.assert_not_called()
+        reader.iter_content.assert_not_called()
         reader.get_feed_root.assert_not_called()
         parser.parse_feed.assert_not_called()
         assert res.status_code == 400
@@ -80,6 +112,7 @@ class FeedBlueprintTests(unittest.TestCase):
             raise ParseError()
 
         url = 'test_url'
+        reader.get_content.return_value = b'content'
         reader.get_feed_root.side_effect = exception_side_effect
         with self.app.test_client() as client:
             res = client.post('/feed/read', json={'url': url})
@@ -87,3 +120,272 @@ class FeedBlueprintTests(unittest.TestCase):
         reader.get_feed_root.assert_called_with(reader.get_content.return_value)
         parser.parse_feed.assert_not_called()
         assert res.status_code == 400
+
+    @patch('src.feed.blueprint.FeedReader.get_content')
+    def test_read_feed_rejected_content(self, get_content):
+        """
+        Contents past the XML parser's limits, or declaring entities, should be rejected with a BadRequest telling why.
+        """
+        get_content.return_value = (b'<?xml version="1.0"?>'
+                                    b'<!DOCTYPE rss [<!ENTITY a "aaaaaaaaaa"><!ENTITY b "&a;&a;">]>'
+                                    b'<rss><channel><item><title>&b;</title><link>l</link></item></channel></rss>')
+        with self.app.test_client() as client:
+            res = client.post('/feed/read', json={'url': 'entities_url'})
+            assert res.status_code == 400
+            assert b'internal subset' in res.data
+            res = client.post('/feed/read', json={'url': 'entities_url', 'stream': True})
+            assert res.status_code == 400
+
+    @patch('src.feed.blueprint.FeedReader')
+    @patch('src.feed.blueprint.FeedParser')
+    def test_read_many_feeds(self, parser, reader):
+        """
+        Every url should be read, with its feed or error reported in the requested order.
+        """
+        def content_side_effect(url):
+            if url == 'bad_url':
+                raise RequestException()
+            return url.encode('utf-8')
+
+        reader.get_content.side_effect = content_side_effect
+        parser.parse_feed.return_value.to_json.return_value = '{"feed": []}'
+        with self.app.test_client() as client:
+            res = client.post('/feed/read-many', json={'urls': ['url_1', 'bad_url', 'url_2']})
+        assert res.status_code == 200
+        assert res.get_json() == {'results': [{'url': 'url_1', 'feed': []},
+                                              {'url': 'bad_url', 'error': 'The url could not be requested'},
+                                              {'url': 'url_2', 'feed': []}]}
+
+    @patch('src.feed.blueprint.FeedReader.get_content')
+    def test_read_many_feeds_dedup(self, get_content):
+        """
+        Deduplicated batches should render the items found in more than one feed in full only once.
+        """
+        def content_side_effect(url):
+            if url == 'bad_url':
+                raise RequestException()
+            return (f'<rss><channel><item><title>{url}</title><link>{url}</link><description>&lt;p&gt;{url}&lt;/p&gt;'
+                    f'</description></item><item><title>shared</title><link>https://example.com/shared</link>'
+                    f'<description>&lt;p&gt;shared&lt;/p&gt;</description></item></channel></rss>').encode('utf-8')
+
+        get_content.side_effect = content_side_effect
+        with self.app.test_client() as client:
+            res = client.post('/feed/read-many', json={'urls': ['url_1', 'bad_url', 'url_2'], 'dedup': True,
+                                                       'fields': ['title']})
+            assert client.post('/feed/read-many', json={'urls': ['url_1'], 'dedup': 1}).status_code == 400
+        assert res.status_code == 200
+        assert res.get_data(as_text=True) == (
+            '{"results": [{"url": "url_1", "feed": ["item": {"title": "url_1"},"item": {"title": "shared"}]}, '
+            '{"url": "bad_url", "error": "The url could not be requested"}, '
+            '{"url": "url_2", "feed": ["item": {"title": "url_2"},"item": {"ref": {"result": 0, "item": 1}}]}]}')
+
+    @patch('src.feed.blueprint.FeedReader')
+    def test_read_many_feeds_invalid_urls(self, reader):
+        """
+        A BadRequest should be returned when the urls are missing or are not a list of strings.
+        """
+        with self.app.test_client() as client:
+            assert client.post('/feed/read-many', json={'url': 'url'}).status_code == 400
+            assert client.post('/feed/read-many', json={'urls': 'url'}).status_code == 400
+            assert client.post('/feed/read-many', json={'urls': [1]}).status_code == 400
+        reader.get_content.assert_not_called()
+
+    @patch('src.feed.blueprint.FeedReader')
+    @patch('src.feed.blueprint.FeedParser')
+    def test_read_feed_stream(self, parser, reader):
+        """
+        When streaming is requested, the feed should be incrementally parsed from its content chunks.
+        """
+        url = 'test_url'
+        item = MagicMock()
+        item.to_json.return_value = '{"title": "title"}'
+        parser.iter_feed.return_value = iter([item, item])
+        with self.app.test_client() as client:
+            res = client.post('/feed/read', json={'url': url, 'stream': True})
+            assert res.is_streamed
+            body = res.get_data(as_text=True)
+        reader.iter_content.assert_called_with(url)
+        parser.iter_feed.assert_called_with(reader.iter_content.return_value, None)
+        reader.get_content.assert_not_called()
+        assert res.status_code == 200
+        assert body == '{"feed": ["item": {"title": "title"},"item": {"title": "title"}]}'
+
+    @patch('src.feed.blueprint.FeedReader')
+    @patch('src.feed.blueprint.FeedParser')
+    def test_read_feed_stream_unparseable_content(self, parser, reader):
+        """
+        Contents which cannot be parsed up to their first item should still result in a BadRequest when streaming.
+        """
+        def exception_side_effect():
+            raise ParseError()
+            yield
+
+        parser.iter_feed.return_value = exception_side_effect()
+        with self.app.test_client() as client:
+            res = client.post('/feed/read', json={'url': 'test_url', 'stream': True})
+        assert res.status_code == 400
+
+    @patch('src.feed.blueprint.FeedReader')
+    @patch('src.feed.blueprint.FeedParser')
+    def test_read_feed_stream_failure(self, parser, reader):
+        """
+        Failures found after the first item was sent should abort the response before the feed is closed, instead of
+        ending it as if the feed was complete.
+        """
+        item = MagicMock()
+        item.to_json.return_value = '{"title": "title"}'
+
+        def failing_items():
+            yield item
+            raise XMLLimitExceeded('too many elements')
+
+        parser.iter_feed.return_value = failing_items()
+        with self.app.test_client() as client:
+            res = client.post('/feed/read', json={'url': 'test_url', 'stream': True}, buffered=False)
+            assert res.status_code == 200
+            chunks = []
+            with self.assertRaises(XMLLimitExceeded):
+                for chunk in res.response:
+                    chunks.append(chunk)
+            res.close()
+        self.assertRaises(ValueError, json.loads, b''.join(chunks))
+
+    @patch('src.feed.blueprint.admission', AdmissionControl(2))
+    @patch('src.feed.blueprint.FeedReader')
+    @patch('src.feed.blueprint.FeedParser')
+    def test_admission_control(self, parser, reader):
+        """
+        Requests past the in-flight budget should be refused right away with a 503 asking to retry later, and admitted
+        requests, streamed ones included, should release their budget once done, even when they fail.
+        """
+        from src.feed.blueprint import admission
+        reader.get_content.return_value = b'content'
+        parser.parse_feed.return_value.to_json.return_value = '{"feed": []}'
+        item = MagicMock()
+        item.to_json.return_value = '{"title": "title"}'
+        parser.iter_feed.side_effect = lambda chunks, query: iter([item])
+        assert admission.acquire(2)
+        with self.app.test_client() as client:
+            for path, data in (('/feed/read', {'url': 'url'}), ('/feed/read-many', {'urls': ['url']})):
+                res = client.post(path, json=data)
+                assert res.status_code == 503
+                assert res.headers['Retry-After'] == str(Config.ADMISSION_RETRY_AFTER)
+            reader.get_content.assert_not_called()
+            admission.release(2)
+            assert client.post('/feed/read', json={'url': 'url'}).status_code == 200
+            assert client.post('/feed/read-many', json={'urls': ['url', 'url', 'url']}).status_code == 200
+            assert client.post('/feed/read', json={'url': 'url', 'stream': True}).get_data() == \
+                b'{"feed": ["item": {"title": "title"}]}'
+            parser.iter_feed.side_effect = ParseError()
+            assert client.post('/feed/read', json={'url': 'url', 'stream': True}).status_code == 400
+        assert admission.in_flight == 0
+
+    @patch('src.feed.blueprint.admission', AdmissionControl(2))
+    @patch('src.feed.blueprint.render_feed')
+    @patch('src.config.Config.BATCH_DEADLINE', 0.1)
+    def test_admission_control_deadline(self, render_feed):
+        """
+        Feeds of a batch still being read past its deadline should stay in flight until their reads are done.
+        """
+        from src.feed.blueprint import admission
+        done = Event()
+        render_feed.side_effect = lambda url, query: done.wait(5) and b'{"feed": []}'
+        with self.app.test_client() as client:
+            assert client.post('/feed/read-many', json={'urls': ['url', 'other_url']}).status_code == 200
+            assert admission.in_flight == 2
+            assert client.post('/feed/read', json={'url': 'url'}).status_code == 503
+        done.set()
+        deadline = time.monotonic() + 5
+        while admission.in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert admission.in_flight == 0
+
+    @patch('src.feed.blueprint.feed_poller')
+    @patch('src.feed.blueprint.FeedReader')
+    def test_read_subscribed_feed(self, reader, poller):
+        """
+        Polled subscribed feeds should be served straight from the feed poller, without being fetched.
+        """
+        poller.get.return_value.body = b'{"feed": []}'
+        with self.app.test_client() as client:
+            res = client.post('/feed/read', json={'url': 'test_url'})
+        poller.get.assert_called_with('test_url')
+        reader.get_content.assert_not_called()
+        assert res.get_json() == {'feed': []}
+
+    @patch('src.feed.blueprint.feed_poller')
+    def test_subscribe(self, poller):
+        """
+        Feeds should be subscribed and unsubscribed, and subscriptions past the limit refused.
+        """
+        poller.subscribe.return_value = True
+        poller.unsubscribe.return_value = False
+        with self.app.test_client() as client:
+            assert client.post('/feed/subscribe', json={'url': 'test_url'}).get_json() == {'subscribed': True}
+            assert client.post('/feed/unsubscribe', json={'url': 'test_url'}).get_json() == {'unsubscribed': False}
+            poller.subscribe.return_value = False
+            assert client.post('/feed/subscribe', json={'url': 'test_url'}).status_code == 400
+            assert client.post('/feed/subscribe', json={}).status_code == 400
+        poller.subscribe.assert_called_with('test_url')
+        poller.unsubscribe.assert_called_with('test_url')
+
+    @patch('src.feed.blueprint.FeedReader.get_content')
+    def test_read_feed_since(self, get_content):
+        """
+        Delta reads should only return the items newer than the cursor, along with the newest item's cursor, and
+        refuse cursors that are not strings.
+        """
+        get_content.return_value = (b'<rss><channel>'
+                                    b'<item><title>b</title><link>lb</link><description></description></item>'
+                                    b'<item><title>a</title><link>la</link><description></description></item>'
+                                    b'</channel></rss>')
+        with self.app.test_client() as client:
+            res = client.post('/feed/read', json={'url': 'test_url', 'since': 'la'})
+            assert res.status_code == 200
+            assert res.data == b'{"feed": ["item": {"title": "b", "link": "lb", "description": []}], "cursor": "lb"}'
+            res = client.post('/feed/read', json={'url': 'test_url', 'since': 'lb'})
+            assert res.data == b'{"feed": [], "cursor": "lb"}'
+            res = client.post('/feed/read', json={'url': 'test_url', 'since': None})
+            assert res.data.count(b'"item"') == 2
+            assert client.post('/feed/read', json={'url': 'test_url', 'since': 1}).status_code == 400
+
+    @patch('src.feed.blueprint.FeedReader.get_content')
+    def test_read_feed_query(self, get_content):
+        """
+        Reads should honor the fields, types, offset and limit parameters, and refuse invalid ones.
+        """
+        get_content.return_value = (b'<rss><channel>'
+                                    b'<item><title>b</title><link>lb</link><description></description></item>'
+                                    b'<item><title>a</title><link>la</link><description></description></item>'
+                                    b'</channel></rss>')
+        with self.app.test_client() as client:
+            res = client.post('/feed/read', json={'url': 'test_url', 'fields': 'title', 'limit': 1})
+            assert res.data == b'{"feed": ["item": {"title": "b"}]}'
+            res = client.post('/feed/read', json={'url': 'test_url', 'fields': ['link'], 'offset': 1})
+            assert res.data == b'{"feed": ["item": {"link": "la"}]}'
+            res = client.post('/feed/read', json={'url': 'test_url', 'fields': 'link', 'since': 'la'})
+            assert res.data == b'{"feed": ["item": {"link": "lb"}], "cursor": "lb"}'
+            assert client.post('/feed/read', json={'url': 'test_url', 'fields': 'guid'}).status_code == 400
+
+    @patch('src.feed.blueprint.FeedReader.get_content')
+    def test_metrics(self, get_content):
+        """
+        Reads should be timed per stage once metrics are enabled, and /metrics only be served then.
+        """
+        get_content.return_value = (b'<rss><channel><item><title>a</title><link>la</link><description></description>'
+                                    b'</item></channel></rss>')
+        with self.app.test_client() as client:
+            assert client.get('/metrics').status_code == 404
+            with patch.object(metrics, 'enabled', True):
+                metrics.reset()
+                client.post('/feed/read', json={'url': 'http://host/feed'})
+                res = client.get('/metrics')
+                metrics.reset()
+        assert res.status_code == 200
+        assert res.headers['Content-Type'] == metrics.CONTENT_TYPE
+        body = res.get_data(as_text=True)
+        for stage in ('parse_xml', 'parse_items', 'serialize'):
+            assert f'feedreader_stage_seconds_count{{stage="{stage}"}} 1' in body
+        assert 'feedreader_stage_seconds_count{stage="render",host="host"} 1' in body
+        assert 'feedreader_items_total 1' in body
+        assert 'feedreader_cache_hit_ratio{cache="result"} 0.0' in body
@@ -0,0 +1,155 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from src.feed.cache import LRUCache, FetchCache, ResultCache, DiskResultBackend, MemoryResultBackend
+from src.feed.store import SegmentStore
+
+
+class CacheTests(unittest.TestCase):
+    """
+    TestCase containing tests for the cache classes.
+    """
+
+    def test_lru_eviction_by_entries(self):
+        """
+        Once the cache is full, the least recently used entry should be the one evicted.
+        """
+        cache = LRUCache(2)
+        cache.set('a', 'a')
+        cache.set('b', 'b')
+        cache.get('a')
+        cache.set('c', 'c')
+        assert cache.get('a') == 'a'
+        assert cache.get('b') is None
+        assert cache.get('c') == 'c'
+
+    def test_lru_eviction_by_size(self):
+        """
+        The total size of the cached values should never exceed max_size, and values bigger than it are not stored.
+        """
+        cache = LRUCache(10, max_size=5)
+        cache.set('a', 'aaa')
+        cache.set('b', 'bb')
+        cache.set('c', 'c')
+        assert cache.get('a') is None
+        assert cache.size == 3
+        cache.set('d', 'dddddd')
+        assert cache.get('d') is None
+        assert len(cache) == 2
+
+    def test_fetch_cache_store(self):
+        """
+        Stored responses should keep their contents and validators, and be fresh until their ttl expires.
+        """
+        cache = FetchCache(60, 10, 1024)
+        response = MagicMock()
+        response.content = b'content'
+        response.headers = {'ETag': '"abc"', 'Last-Modified': 'date'}
+        entry = cache.store('url', response)
+        assert cache.get('url') is entry
+        assert entry.is_fresh()
+        assert entry.validators() == {'If-None-Match': '"abc"', 'If-Modified-Since': 'date'}
+        entry.expires = 0
+        assert not entry.is_fresh()
+        cache.revalidate('url', entry)
+        assert entry.is_fresh()
+
+    def test_result_cache_key(self):
+        """
+        Keys should only depend on the contents, regardless of them being bytes or strings.
+        """
+        assert ResultCache.key(b'content') == ResultCache.key('content')
+        assert ResultCache.key(b'content') != ResultCache.key(b'other content')
+
+    def test_result_cache_without_backend(self):
+        """
+        A ResultCache without a backend should never cache anything.
+        """
+        cache = ResultCache()
+        cache.set('key', b'value')
+        assert cache.get('key') is None
+
+    def test_disk_result_backend(self):
+        """
+        The disk backend should persist results to its directory, and prune the oldest ones beyond max_entries.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(DiskResultBackend(directory, 1))
+            cache.set('a', b'value_a')
+            assert cache.get('a') == b'value_a'
+            assert ResultCache(DiskResultBackend(directory, 1)).get('a') == b'value_a'
+            os.utime(os.path.join(directory, 'a'), (0, 0))
+            cache.set('b', b'value_b')
+            cache.backend.prune()
+            assert cache.get('a') is None
+            assert cache.get('b') == b'value_b'
+
+    def test_lru_counters(self):
+        """
+        Hits and misses should be counted on every lookup, and reset when the cache is cleared.
+        """
+        cache = LRUCache(2)
+        assert cache.hit_ratio() == 0.0
+        cache.set('a', 'a')
+        cache.get('a')
+        cache.get('b')
+        assert cache.hits == 1
+        assert cache.misses == 1
+        assert cache.hit_ratio() == 0.5
+        cache.clear()
+        assert cache.hits == cache.misses == 0
+
+    def test_fetch_cache_control(self):
+        """
+        Cache-Control's max-age should override the ttl, and no-cache/no-store should make contents stale right away.
+        """
+        assert FetchCache.max_age(None) is None
+        assert FetchCache.max_age('public') is None
+        assert FetchCache.max_age('public, max-age=300') == 300
+        assert FetchCache.max_age('no-cache') == 0
+        cache = FetchCache(60, 10, 1024)
+        response = MagicMock(content=b'content', headers={'Cache-Control': 'no-store'})
+        assert not cache.store('url', response).is_fresh()
+        response.headers = {'Cache-Control': 'max-age=3600'}
+        entry = cache.store('url', response)
+        assert entry.max_age == 3600
+        assert entry.expires - time.monotonic() > 3000
+
+    def test_result_cache_hit_ratio(self):
+        """
+        The result cache should count its hits and misses, whatever its backend.
+        """
+        cache = ResultCache(MemoryResultBackend(10, 1024))
+        assert cache.hit_ratio() == 0.0
+        cache.get('key')
+        cache.set('key', b'value')
+        cache.get('key')
+        assert cache.hit_ratio() == 0.5
+        cache.clear()
+        assert cache.hits == cache.misses == 0
+
+    def test_fetch_cache_segment_store(self):
+        """
+        Fetched contents should be shared through the store with validators and freshness, and revalidations too.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            first = FetchCache(60, 10, 1024, SegmentStore(directory, 1024 * 1024, 1024 * 1024))
+            second = FetchCache(60, 10, 1024, SegmentStore(directory, 1024 * 1024, 1024 * 1024))
+            response = MagicMock(content=b'content', headers={'ETag': '"a"', 'Cache-Control': 'max-age=0'})
+            first.store('url', response)
+            entry = second.get('url')
+            assert entry.content == b'content'
+            assert entry.etag == '"a"'
+            assert not entry.is_fresh()
+            entry.max_age = 3600
+            first.revalidate('url', entry)
+            assert FetchCache(60, 10, 1024, SegmentStore(directory, 1024 * 1024, 1024 * 1024)).get('url').is_fresh()
+            # Contents are only held by the store, and read from its memory map: memory only keeps their validators.
+            assert first.get('url').content == second.get('url').content == b'content'
+            assert isinstance(second.get('url').content, memoryview)
+            assert [entry.content for _, entry in first._cache.items()] == [None]
+            assert first._cache.size == second._cache.size == 0
+            assert second.get('url').is_fresh()
@@ -0,0 +1,54 @@
+import random
+import unittest
+
+from src.feed.dedup import FingerprintIndex, fingerprint, normalize_link
+
+
+class DedupTests(unittest.TestCase):
+    """
+    TestCase containing tests for the item fingerprints and their index.
+    """
+
+    def test_normalize_link(self):
+        """
+        Links syndicated copies usually have should be normalized into the same one, unlike different articles'.
+        """
+        link = normalize_link('https://www.Example.com/news/article/?b=2&a=1&utm_source=feed#comments')
+        assert link == 'example.com/news/article?a=1&b=2'
+        assert normalize_link('http://example.com/news/article?a=1&b=2') == link
+        assert normalize_link('http://example.com/news/other?a=1&b=2') != link
+        assert normalize_link('http://example.com:8080/news/article?a=1&b=2') != link
+
+    def test_normalize_malformed_link(self):
+        """
+        Malformed links should not raise, and only be stripped, so that exact copies are still taken as duplicates.
+        """
+        assert normalize_link(' http://h:abc/x ') == 'http://h:abc/x'
+        assert normalize_link('http://[h/x') == 'http://[h/x'
+        assert fingerprint('http://h:abc/x', 'text') == fingerprint('http://h:abc/x ', 'text')
+        assert fingerprint('http://h:abc/x', 'text') != fingerprint('http://h:abc/y', 'text')
+
+    def test_fingerprint(self):
+        """
+        Fingerprints should only tell apart items whose normalized links or descriptions differ, and never be 0.
+        """
+        first = fingerprint('https://example.com/a/', '<p>text\n\tmore</p>')
+        assert first == fingerprint('http://www.example.com/a', '<p>text more</p>')
+        assert first != fingerprint('http://example.com/a', '<p>other text</p>')
+        assert first != fingerprint('http://example.com/b', '<p>text more</p>')
+        assert 0 < first < 2 ** 64
+        assert fingerprint(None, '<p>text</p>') is None
+
+    def test_index(self):
+        """
+        The index should map fingerprints to values just like a dictionary does, through any number of resizes.
+        """
+        rng = random.Random(0)
+        index = FingerprintIndex(capacity=4)
+        expected = {}
+        for value in range(5000):
+            key = rng.randrange(1, 2 ** 64) if value % 3 else rng.choice(list(expected) or [1])
+            assert index.setdefault(key, value) == expected.setdefault(key, value)
+        assert len(index) == len(expected)
+        assert all(index.get(key) == value for key, value in expected.items())
+        assert index.get(2 ** 64 - 1, 'missing') == 'missing'
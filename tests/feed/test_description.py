@@ -0,0 +1,127 @@
+import unittest
+from unittest.mock import patch, MagicMock, call
+
+from bs4 import BeautifulSoup as RealBeautifulSoup
+
+from bench.corpus import read_result, description_html
+from src.feed.description import SoupDescriptionParser, EventDescriptionParser, create_description_parser
+from src.feed.models import FeedItemDescriptionBlock
+
+DESCRIPTIONS = [
+    '',
+    '<p>simple</p>',
+    '\n<p>\n\ttabs&nbsp;and\xa0spaces\n</p>\n',
+    '<p>  <b>bold</b>   <i>italic</i>  </p><p> \n </p><p>&nbsp;</p>',
+    '<p>entities &amp; &lt;tags&gt; &#233; &#x41; &#147; &#129; &unknown; &copy</p>',
+    '<p>comment <!-- hidden --> and <![CDATA[ cdata ]]> and <?pi?></p>',
+    '<p>nested <p>paragraph</p> text</p><p>unclosed',
+    '<p>broken </b> end</p>tail',
+    '<p>pre <pre>  </pre> and <pre>\n</pre> and <textarea> </textarea></p>',
+    '<p>a<br>b<br/>c</br>d<img src="x"></img>e</p>',
+    '<p>script <script>var a = "<p>&amp;";</script> style <style> p {} </style></p>',
+    '<div><img src="a.jpg"/><img alt="none"/><img src/><span><img src="b.jpg" src="c.jpg"></span></div>',
+    '<div><ul><li><a href="1">1</a></li><li><a>no href</a></li><li><a href="">empty</a></li></ul></div>',
+    '<div><ul><li><a href="1">1</a><ul><li><a href="2">2</a></li></ul></li></ul><ul></ul></div>',
+    '<div><ul><li><a href="1">1</a></div><a href="outside">x</a><ul><a href="top">y</a></ul>',
+    '<div><p>inner paragraph</p><img src="a.jpg"><ul><a href="1">1</a></ul><img src="b.jpg"></div><p>after</p>',
+    '<div><br/><br><br/><img src="a"><ul><a href="1">1</a></ul></div>',
+    '<div><ul><li><a href="1"><img src="in_link"></a></li></ul><img src="after"><ul><a>1</a><a href="2"/></ul></div>',
+    '<div><ul><li><ul><li><ul><a href="deep">d</a></ul></li></ul><a href="1">1</a></li></ul></div>',
+    '<DIV><IMG SRC="upper.jpg"><UL><A HREF="upper">u</A></UL></DIV><P>UPPER</P>',
+    '<!DOCTYPE html><p>doc</p><div><img src="a"',
+    'text <p>after text</p> <div>  </div> more',
+]
+
+
+def result_fixtures():
+    """
+    Builds description fixtures shaped after result.json's items: each block is turned back into the HTML it was
+    parsed from.
+
+    :return: A list of (description HTML, expected blocks) pairs.
+    """
+    return [(description_html(item['description']), item['description']) for item in read_result()]
+
+
+class DescriptionParserTests(unittest.TestCase):
+    """
+    TestCase containing tests for the description parsing backends.
+    """
+
+    @patch('src.feed.description.BeautifulSoup')
+    @patch('src.feed.description.FeedItemDescriptionBlock')
+    def test_soup_parse(self, block, soup):
+        """
+        The tricky one. There are 4 base cases we should make sure are working:
+
+        1- A filled paragraph, which is a PARAGRAPH_TAG with actual content;
+        2- Images inside DIV_TAGs, which should contain IMG_TAGs with IMG_URL_ATTRB;
+        3- Links inside DIV_TAGs, which should contain LINKS_TAGs with a number of URL_TAGs, each with a LINK_REF_ATTRB.
+        4- An empty paragraph, which is a PARAGRAPH_TAG without valid content;
+        5- Images inside DIV_TAGs, which should contain IMG_TAGs but no IMG_URL_ATTRB;
+        6- URL_TAGs without a LINK_REF_ATTRB.
+
+        We are testing whether cases 1-3 have been appended, making sure that cases 4-6 have not.
+        """
+        block.TEXT_TYPE = 'text'
+        block.IMAGE_TYPE = 'image'
+        block.LINKS_TYPE = 'links'
+        soup.return_value = MagicMock()
+        empty_paragraph = MagicMock()
+        empty_paragraph.name = SoupDescriptionParser.PARAGRAPH_TAG
+        empty_paragraph.get_text.return_value = '\n\xa0\t'
+        filled_paragraph = MagicMock()
+        filled_paragraph.name = SoupDescriptionParser.PARAGRAPH_TAG
+        filled_paragraph.get_text.return_value = 'abc\n\xa0\tdef'
+        div = RealBeautifulSoup('<div><img src="image_url"><img test="invalid_image_url">'
+                                '<ul><li><a href="link_url_1"></a><a href="link_url_2"></a><a test="invalid_link_url">'
+                                '</a></li></ul></div>', SoupDescriptionParser.PARSER).div
+        soup.return_value.children = [empty_paragraph, filled_paragraph, div]
+        SoupDescriptionParser().parse('description')
+        soup.assert_called_with('description', SoupDescriptionParser.PARSER)
+        assert block.call_count == 3
+        block.assert_has_calls([call(FeedItemDescriptionBlock.TEXT_TYPE, 'abc  def'),
+                                call(FeedItemDescriptionBlock.IMAGE_TYPE, 'image_url'),
+                                call(FeedItemDescriptionBlock.LINKS_TYPE, ['link_url_1', 'link_url_2'])
+                                ])
+
+    def test_event_parse(self):
+        """
+        The event backend should apply the same rules as the soup one.
+        """
+        description = ('<p>\n\xa0</p><p>abc\n\xa0\tdef</p>'
+                       '<div><img src="image_url"><img test="invalid_image_url">'
+                       '<ul><li><a href="link_url_1"></a><a href="link_url_2"></a><a test="invalid_link_url"></a>'
+                       '</li></ul></div>')
+        res = [block.to_dict() for block in EventDescriptionParser().parse(description)]
+        assert res == [dict(type=FeedItemDescriptionBlock.TEXT_TYPE, content='abc  def'),
+                       dict(type=FeedItemDescriptionBlock.IMAGE_TYPE, content='image_url'),
+                       dict(type=FeedItemDescriptionBlock.LINKS_TYPE, content=['link_url_1', 'link_url_2'])]
+
+    def test_backends_equivalence(self):
+        """
+        Both backends should produce identical blocks, including for malformed and unusual markup.
+        """
+        soup, events = SoupDescriptionParser(), EventDescriptionParser()
+        for description in DESCRIPTIONS:
+            with self.subTest(description=description):
+                assert [block.to_dict() for block in events.parse(description)] == \
+                       [block.to_dict() for block in soup.parse(description)]
+
+    def test_backends_result_fixtures(self):
+        """
+        Both backends should reproduce result.json's blocks from the HTML they were parsed from.
+        """
+        fixtures = result_fixtures()
+        assert fixtures
+        for backend in (SoupDescriptionParser(), EventDescriptionParser()):
+            for description, expected in fixtures:
+                assert [block.to_dict() for block in backend.parse(description)] == expected
+
+    def test_create_description_parser(self):
+        """
+        Backends should be selectable by name, and unknown names rejected.
+        """
+        assert isinstance(create_description_parser('soup'), SoupDescriptionParser)
+        assert isinstance(create_description_parser('events'), EventDescriptionParser)
+        self.assertRaises(ValueError, create_description_parser, 'unknown')
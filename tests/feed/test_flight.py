@@ -0,0 +1,97 @@
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from unittest.mock import patch
+
+from src.feed.flight import SingleFlight
+
+
+class SingleFlightTests(unittest.TestCase):
+    """
+    TestCase containing tests for the SingleFlight class.
+    """
+
+    def test_concurrent_calls(self):
+        """
+        Concurrent calls with the same key should run once, sharing the result with every caller.
+        """
+        flight = SingleFlight()
+        calls = []
+        release = Event()
+
+        def fn():
+            calls.append(1)
+            release.wait()
+            return b'result'
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(flight.do, 'key', fn) for _ in range(4)]
+            time.sleep(0.1)
+            release.set()
+            assert [future.result() for future in futures] == [b'result'] * 4
+        assert len(calls) == 1
+        assert flight.do('key', fn) == b'result'
+        assert len(calls) == 2
+
+    def test_shared_error(self):
+        """
+        Callers waiting on a failed call should get its exception.
+        """
+        flight = SingleFlight()
+        release = Event()
+
+        def fn():
+            release.wait()
+            raise ValueError()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(flight.do, 'key', fn) for _ in range(2)]
+            time.sleep(0.1)
+            release.set()
+            for future in futures:
+                self.assertRaises(ValueError, future.result)
+
+    def test_lock_dir(self):
+        """
+        With a lock directory, calls made through different instances, as different processes would, should be
+        coalesced, while calls made after one finished should run again.
+        """
+        with tempfile.TemporaryDirectory() as lock_dir:
+            flights = [SingleFlight(lock_dir), SingleFlight(lock_dir)]
+            calls = []
+
+            def fn():
+                calls.append(1)
+                time.sleep(0.2)
+                return b'result'
+
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                first = executor.submit(flights[0].do, 'key', fn)
+                time.sleep(0.05)
+                second = executor.submit(flights[1].do, 'key', fn)
+                assert first.result() == second.result() == b'result'
+            assert len(calls) == 1
+            # Only the result left for the waiting process remains, lock files being removed once released.
+            assert [name.rsplit('.', 1)[1] for name in os.listdir(lock_dir)] == ['result']
+            assert flights[1].do('key', fn) == b'result'
+            assert len(calls) == 2
+
+    def test_lock_dir_cleanup(self):
+        """
+        Calls nobody waited for should leave no file behind, and leftover results should be pruned once expired.
+        """
+        with tempfile.TemporaryDirectory() as lock_dir:
+            flight = SingleFlight(lock_dir)
+            for key in ('a', 'b', 'c'):
+                assert flight.do(key, lambda: b'result') == b'result'
+            assert os.listdir(lock_dir) == []
+            with open(os.path.join(lock_dir, 'leftover.result'), 'wb') as f:
+                f.write(b'result')
+            flight.prune()
+            assert os.listdir(lock_dir) == ['leftover.result']
+            with patch('src.feed.flight.SingleFlight.RESULT_TTL', -1):
+                flight.prune()
+            assert os.listdir(lock_dir) == []
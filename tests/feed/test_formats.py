@@ -0,0 +1,34 @@
+import unittest
+from xml.etree import ElementTree
+
+from src.feed.formats import RSS, AtomFormat, RDFFormat, detect_format
+
+
+class FeedFormatTests(unittest.TestCase):
+    """
+    TestCase containing tests for the feed formats.
+    """
+
+    def test_detect_format(self):
+        """
+        Formats should be detected from both document and data roots, unknown ones being taken as RSS.
+        """
+        assert detect_format('rss') is RSS
+        assert detect_format('channel') is RSS
+        assert isinstance(detect_format('{http://www.w3.org/2005/Atom}feed'), AtomFormat)
+        assert isinstance(detect_format('{http://www.w3.org/1999/02/22-rdf-syntax-ns#}RDF'), RDFFormat)
+        assert detect_format('unknown') is RSS
+
+    def test_atom_entry(self):
+        """
+        Atom entries should be linked to by their alternate link, and XHTML contents should be turned back into HTML.
+        """
+        atom = detect_format(AtomFormat.ROOT_TAG)
+        entry = ElementTree.XML('<entry xmlns="http://www.w3.org/2005/Atom"><link rel="edit" href="e"/>'
+                                '<link rel="alternate" href="l"/><summary>summary</summary><content type="xhtml">'
+                                '<div xmlns="http://www.w3.org/1999/xhtml"><p>a <b>b</b></p><div><img src="i"/></div>'
+                                '</div></content></entry>')
+        assert atom.link(entry).text == 'l'
+        assert atom.description(entry).text == '<p>a <b>b</b></p><div><img src="i" /></div>'
+        assert atom.identifier(entry) == 'l'
+        assert atom.guid(entry) is None
@@ -0,0 +1,74 @@
+import unittest
+from unittest.mock import patch
+
+from src.feed.health import HostHealth
+
+
+class HostHealthTests(unittest.TestCase):
+    """
+    TestCase containing tests for the upstream hosts' circuit breaker.
+    """
+
+    @patch('src.feed.health.time.monotonic')
+    def test_circuit(self, monotonic):
+        """
+        Circuits should open after consecutive failures only, let a single trial through once reset, and close when it
+        succeeds.
+        """
+        monotonic.return_value = 100.0
+        health = HostHealth(3, 30)
+        for _ in range(2):
+            health.failure('http://host/a')
+        health.success('http://host/b')
+        for _ in range(2):
+            health.failure('http://host/a')
+        assert health.allow('http://host/a')
+        health.failure('http://host/a')
+        assert health.state('http://host/c') == HostHealth.OPEN
+        assert not health.allow('http://host/c')
+        assert health.allow('http://other/a')
+        assert health.open_circuits() == 1
+
+        monotonic.return_value = 130.0
+        assert health.state('http://host/a') == HostHealth.HALF_OPEN
+        assert health.allow('http://host/a')
+        assert not health.allow('http://host/b')
+        health.failure('http://host/a')
+        monotonic.return_value = 159.0
+        assert not health.allow('http://host/a')
+
+        monotonic.return_value = 160.0
+        assert health.allow('http://host/a')
+        health.success('http://host/a')
+        assert health.state('http://host/a') == HostHealth.CLOSED
+        assert health.allow('http://host/b')
+        assert health.open_circuits() == 0
+
+    @patch('src.feed.health.time.monotonic')
+    def test_unreported_trial(self, monotonic):
+        """
+        Trials never reported, such as cancelled requests, should only delay the next trial.
+        """
+        monotonic.return_value = 100.0
+        health = HostHealth(1, 30)
+        health.failure('http://host')
+        monotonic.return_value = 130.0
+        assert health.allow('http://host')
+        assert not health.allow('http://host')
+        monotonic.return_value = 160.0
+        assert health.allow('http://host')
+
+    def test_disabled(self):
+        """
+        Breakers without a failure threshold, and urls without a host, should never open.
+        """
+        health = HostHealth(0, 30)
+        health.failure('http://host')
+        assert health.allow('http://host')
+        health = HostHealth(1, 30)
+        health.failure('no_host')
+        assert health.allow('no_host')
+        health.failure('http://[host')
+        assert health.allow('http://[host')
+        assert health.open_circuits() == 0
+        assert HostHealth.host('http://[host') == ''
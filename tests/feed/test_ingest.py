@@ -0,0 +1,80 @@
+import io
+import json
+import os
+import tarfile
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from requests import RequestException
+
+from src.feed.ingest import main, run, iter_tasks
+
+FEED = (b'<rss><channel><item><title>a</title><link>la</link><description>&lt;p&gt;text&lt;/p&gt;</description>'
+        b'</item><item><title>b</title><link>lb</link><description></description></item></channel></rss>')
+
+
+class IngestTests(unittest.TestCase):
+    """
+    TestCase containing tests for the bulk ingestion entry point.
+    """
+
+    def setUp(self):
+        """
+        Every test gets a directory with two documents, one of them invalid, a tarball and a url list.
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.feeds = os.path.join(self.tmp.name, 'feeds')
+        os.makedirs(os.path.join(self.feeds, 'nested'))
+        with open(os.path.join(self.feeds, 'a.xml'), 'wb') as f:
+            f.write(FEED)
+        with open(os.path.join(self.feeds, 'nested', 'b.xml'), 'wb') as f:
+            f.write(b'<rss><channel>')
+        self.tarball = os.path.join(self.tmp.name, 'feeds.tar.gz')
+        with tarfile.open(self.tarball, 'w:gz') as tar:
+            info = tarfile.TarInfo('archived.xml')
+            info.size = len(FEED)
+            tar.addfile(info, io.BytesIO(FEED))
+        self.urls = os.path.join(self.tmp.name, 'urls')
+        with open(self.urls, 'w') as f:
+            f.write('# comment\nhttp://feed\n\nhttp://missing\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch('src.feed.ingest.FeedReader.get_content')
+    def test_run(self, get_content):
+        """
+        Every document of every source should be written as a line, in order, failures included.
+        """
+        def content_side_effect(url):
+            if url == 'http://missing':
+                raise RequestException()
+            return FEED
+
+        get_content.side_effect = content_side_effect
+        out = io.BytesIO()
+        stats = run(iter_tasks([self.feeds, self.tarball, self.urls]), out, 0, 4)
+        lines = [json.loads(line) for line in out.getvalue().decode('utf-8').splitlines()]
+        assert [line['source'] for line in lines] == [os.path.join(self.feeds, 'a.xml'),
+                                                      os.path.join(self.feeds, 'nested', 'b.xml'),
+                                                      f'{self.tarball}:archived.xml', 'http://feed', 'http://missing']
+        assert len(lines[0]['feed']) == 2
+        assert lines[0]['feed'][0]['description'] == [{'type': 'text', 'content': 'text'}]
+        assert 'error' in lines[1]
+        assert lines[2]['feed'] == lines[3]['feed'] == lines[0]['feed']
+        assert lines[4]['error'] == 'The url could not be requested'
+        assert (stats.documents, stats.failed, stats.items) == (5, 2, 6)
+
+    def test_main_workers(self):
+        """
+        Documents parsed across the pool should be written just as the ones parsed serially.
+        """
+        serial = os.path.join(self.tmp.name, 'serial.ndjson')
+        pooled = os.path.join(self.tmp.name, 'pooled.ndjson')
+        with patch('sys.stderr', io.StringIO()) as stderr:
+            assert main([self.feeds, self.tarball, '--workers', '0', '--output', serial]) == 0
+            assert main([self.feeds, self.tarball, '--workers', '2', '--window', '1', '--output', pooled]) == 0
+        with open(serial, 'rb') as f, open(pooled, 'rb') as g:
+            assert f.read() == g.read()
+        assert '3 documents (1 failed), 4 items' in stderr.getvalue()
@@ -0,0 +1,75 @@
+import unittest
+
+from src.feed.metrics import Histogram, Metrics
+
+
+class MetricsTests(unittest.TestCase):
+    """
+    TestCase containing tests for the metrics registry.
+    """
+
+    def test_histogram(self):
+        """
+        Values should be counted in cumulative buckets, bounds included, along with their sum and count.
+        """
+        histogram = Histogram((0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+        assert histogram.cumulative_counts() == [(0.1, 2), (1, 3), (float('inf'), 4)]
+        assert histogram.sum == 2.65
+        assert histogram.count == 4
+
+    def test_disabled(self):
+        """
+        Disabled metrics should record nothing, handing out a shared timer.
+        """
+        metrics = Metrics(False)
+        with metrics.timer('stage'):
+            pass
+        metrics.observe('stage', 1)
+        metrics.count('items')
+        assert metrics.timer('stage') is Metrics.NULL_TIMER
+        assert metrics.render() == '\n'
+
+    def test_render(self):
+        """
+        Metrics should be rendered in Prometheus' text format, with escaped label values.
+        """
+        metrics = Metrics(True, buckets=(1,))
+        with metrics.timer('fetch', 'host'):
+            pass
+        metrics.observe('parse', 2)
+        metrics.count('items', 3)
+        metrics.count('items', 2)
+        metrics.count('fetched_bytes', 10, host='a"b\\c')
+        metrics.describe('items', 'Items parsed.')
+        metrics.gauge('cache_hit_ratio', 'Hit ratio.', lambda: 0.5, cache='fetch')
+        lines = metrics.render().splitlines()
+        assert '# TYPE feedreader_stage_seconds histogram' in lines
+        assert 'feedreader_stage_seconds_bucket{stage="fetch",host="host",le="1.0"} 1' in lines
+        assert 'feedreader_stage_seconds_bucket{stage="parse",le="1.0"} 0' in lines
+        assert 'feedreader_stage_seconds_bucket{stage="parse",le="+Inf"} 1' in lines
+        assert 'feedreader_stage_seconds_sum{stage="parse"} 2.0' in lines
+        assert 'feedreader_stage_seconds_count{stage="parse"} 1' in lines
+        assert '# HELP feedreader_items_total Items parsed.' in lines
+        assert 'feedreader_items_total 5' in lines
+        assert 'feedreader_fetched_bytes_total{host="a\\"b\\\\c"} 10' in lines
+        assert '# TYPE feedreader_cache_hit_ratio gauge' in lines
+        assert 'feedreader_cache_hit_ratio{cache="fetch"} 0.5' in lines
+        metrics.reset()
+        assert 'feedreader_items_total 5' not in metrics.render()
+
+    def test_max_hosts(self):
+        """
+        Hosts past max_hosts should share the same series, while the first ones keep their own.
+        """
+        metrics = Metrics(True, buckets=(1,), max_hosts=2)
+        for host in ('a', 'b', 'c', 'd', 'a'):
+            metrics.observe('fetch', 0.5, host)
+            metrics.count('fetched_bytes', 10, host=host)
+        lines = metrics.render().splitlines()
+        assert 'feedreader_stage_seconds_count{stage="fetch",host="a"} 2' in lines
+        assert 'feedreader_stage_seconds_count{stage="fetch",host="b"} 1' in lines
+        assert 'feedreader_stage_seconds_count{stage="fetch",host="other"} 2' in lines
+        assert 'feedreader_fetched_bytes_total{host="other"} 20' in lines
+        assert not any('host="c"' in line for line in lines)
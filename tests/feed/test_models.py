@@ -1,3 +1,4 @@
+import json
 import unittest
 from unittest.mock import MagicMock
 
@@ -53,11 +54,11 @@ class ModelTests(unittest.TestCase):
         """
         expected = '{"feed": ["item": {"a": "a", "b": "b", "c": []}]}'
         item = MagicMock()
-        item.to_dict.return_value = dict(a='a', b='b', c=[])
+        item.to_json.return_value = '{"a": "a", "b": "b", "c": []}'
         items = [item]
         feed = Feed(items)
         res = feed.to_json()
-        item.to_dict.assert_called()
+        item.to_json.assert_called()
         assert res == expected
 
     def test_feed_item_creation(self):
@@ -108,3 +109,60 @@ class ModelTests(unittest.TestCase):
         expected = dict(type=content_type, content=content)
         block = FeedItemDescriptionBlock(content_type, content)
         assert block.to_dict() == expected
+
+    def test_feed_iter_json(self):
+        """
+        Joining iter_json's fragments should produce exactly the same representation as to_json.
+        """
+        items = [FeedItem('a', 'la', [FeedItemDescriptionBlock('text', 'ã')]),
+                 FeedItem('b', 'lb', [])]
+        fragments = list(Feed.iter_json(iter(items)))
+        assert len(fragments) == 4
+        assert ''.join(fragments) == Feed(items).to_json()
+        assert ''.join(Feed.iter_json([])) == Feed().to_json()
+
+    def test_feed_item_to_json(self):
+        """
+        The directly written JSON of items and blocks should be identical to dumping their dictionaries.
+        """
+        blocks = [FeedItemDescriptionBlock(FeedItemDescriptionBlock.TEXT_TYPE, 'çã "quoted"\n\\ \u2028 \x00'),
+                  FeedItemDescriptionBlock(FeedItemDescriptionBlock.IMAGE_TYPE, ''),
+                  FeedItemDescriptionBlock(FeedItemDescriptionBlock.LINKS_TYPE, ['a', 'ü']),
+                  FeedItemDescriptionBlock(FeedItemDescriptionBlock.LINKS_TYPE, [])]
+        for item in [FeedItem('título', 'link', blocks), FeedItem(None, None, [])]:
+            assert item.to_json() == json.dumps(item.to_dict(), ensure_ascii=False)
+        for block in blocks:
+            assert block.to_json() == json.dumps(block.to_dict(), ensure_ascii=False)
+
+    def test_models_are_slotted(self):
+        """
+        Models should not carry a per-instance dictionary.
+        """
+        for model in [Feed(), FeedItem(), FeedItemDescriptionBlock()]:
+            assert not hasattr(model, '__dict__')
+
+    def test_feed_since(self):
+        """
+        A feed's delta should hold the items before the one identified by the cursor, guids taking precedence over
+        links, and be serialized along with the newest item's identifier.
+        """
+        items = [FeedItem('c', 'lc', [], 'gc'), FeedItem('b', 'lb', []), FeedItem('a', 'la', [])]
+        feed = Feed(items)
+        assert feed.since('lb').items == items[:1]
+        assert feed.since('gc').items == []
+        assert feed.since('unknown').items == items
+        assert feed.since(None).items == items
+        assert feed.since('lb').cursor == 'gc'
+        assert Feed().since('la').cursor == 'la'
+        delta = feed.since('lb')
+        assert delta.to_json(with_cursor=True) == delta.to_json()[:-1] + ', "cursor": "gc"}'
+        assert Feed().to_json(with_cursor=True) == '{"feed": [], "cursor": null}'
+
+    def test_feed_to_json_fields(self):
+        """
+        Only the requested item fields should be serialized, in their usual order.
+        """
+        item = FeedItem('a', 'la', [FeedItemDescriptionBlock('text', 'ã')])
+        assert item.to_json(('title', 'link', 'description')) == item.to_json()
+        assert json.loads(item.to_json(('link',))) == {'link': 'la'}
+        assert Feed([item]).to_json(fields=('title',)) == '{"feed": ["item": {"title": "a"}]}'
@@ -0,0 +1,32 @@
+import os
+import unittest
+
+from src.feed.parallel import ParsePool
+
+
+class ParsePoolTests(unittest.TestCase):
+    """
+    TestCase containing tests for the ParsePool class.
+    """
+
+    def test_map(self):
+        """
+        Results should be computed in other processes, and returned in the values' order.
+        """
+        pool = ParsePool(2)
+        try:
+            assert pool.enabled
+            assert pool.map(abs, list(range(-20, 0))) == list(range(20, 0, -1))
+            assert os.getpid() not in pool.map(_pid, [None] * 4)
+        finally:
+            pool.shutdown()
+
+    def test_disabled(self):
+        """
+        A pool without workers should be disabled.
+        """
+        assert not ParsePool(0).enabled
+
+
+def _pid(_):
+    return os.getpid()
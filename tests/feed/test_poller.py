@@ -0,0 +1,129 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.feed.poller import FeedPoller, Subscription
+
+
+class FeedPollerTests(unittest.TestCase):
+    """
+    TestCase containing tests for the FeedPoller class.
+    """
+
+    @staticmethod
+    def create_poller(poll, **kwargs):
+        settings = dict(min_interval=10, max_interval=100, backoff=2, jitter=0, workers=2, max_subscriptions=2)
+        settings.update(kwargs)
+        return FeedPoller(poll, **settings)
+
+    def test_adaptive_interval(self):
+        """
+        Unchanged feeds should be polled less and less often, up to max_interval, while changed ones should be polled
+        every min_interval again. The feed's max-age should be honored.
+        """
+        poll = MagicMock(return_value=(b'content', 'feed', b'body', None))
+        poller = self.create_poller(poll)
+        poller.subscriptions['url'] = subscription = Subscription('url', 10)
+        poller.refresh(subscription)
+        assert subscription.interval == 10
+        assert subscription.body == b'body'
+        for interval in (20, 40, 80, 100, 100):
+            poller.refresh(subscription)
+            assert subscription.interval == interval
+        poll.return_value = (b'changed', 'feed', b'new body', 30)
+        poller.refresh(subscription)
+        assert subscription.interval == 30
+        assert subscription.body == b'new body'
+        assert subscription.feed == 'feed'
+
+    def test_failed_poll(self):
+        """
+        Failed polls should back off, keeping the last results.
+        """
+        poll = MagicMock(return_value=(b'content', 'feed', b'body', None))
+        poller = self.create_poller(poll)
+        poller.subscriptions['url'] = subscription = Subscription('url', 10)
+        poller.refresh(subscription)
+        poll.side_effect = ValueError()
+        poller.refresh(subscription)
+        assert subscription.failures == 1
+        assert subscription.interval == 20
+        assert subscription.body == b'body'
+
+    def test_stale_results(self):
+        """
+        Results should only be served for the feed's max-age after its last successful poll, or max_interval without
+        one.
+        """
+        poll = MagicMock(return_value=(b'content', 'feed', b'body', 30))
+        poller = self.create_poller(poll)
+        poller.subscriptions['url'] = subscription = Subscription('url', 10)
+        poller._pid = os.getpid()
+        poller.refresh(subscription)
+        assert poller.get('url') is subscription
+        subscription.polled_at -= 31
+        assert poller.get('url') is None
+        poll.return_value = (b'content', 'feed', b'body', None)
+        poller.refresh(subscription)
+        subscription.polled_at -= 99
+        assert poller.get('url') is subscription
+        poll.side_effect = ValueError()
+        poller.refresh(subscription)
+        subscription.polled_at -= 2
+        assert poller.get('url') is None
+
+    def test_background_polling(self):
+        """
+        Subscribed feeds should be polled in the background, and only be served once polled.
+        """
+        poll = MagicMock(return_value=(b'content', 'feed', b'body', None))
+        poller = self.create_poller(poll)
+        assert poller.get('url') is None
+        assert poller.subscribe('url')
+        assert poller.subscribe('other')
+        assert not poller.subscribe('third')
+        deadline = time.monotonic() + 5
+        while poller.get('url') is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert poller.get('url').body == b'body'
+        assert poller.unsubscribe('url')
+        assert not poller.unsubscribe('url')
+        assert poller.get('url') is None
+
+    def test_load(self):
+        """
+        Feeds listed in a file should be subscribed, skipping blank lines and comments.
+        """
+        poller = self.create_poller(MagicMock(), max_subscriptions=10)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feeds')
+            with open(path, 'w') as f:
+                f.write('# feeds\nurl_1\n\nurl_2\nurl_1\n')
+            poller.load(path)
+        assert sorted(poller.subscriptions) == ['url_1', 'url_2']
+
+    def test_shared_registry(self):
+        """
+        With a registry file, subscriptions made through any poller, as any worker would, should be shared by all of
+        them, within the same limit, and be kept by the pollers created next.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            registry = os.path.join(directory, 'subscriptions')
+            pollers = [self.create_poller(MagicMock(), registry=registry) for _ in range(2)]
+            assert pollers[0].subscribe('url_1')
+            assert pollers[1].subscribe('url_2')
+            assert not pollers[1].subscribe('url_3')
+            with patch('src.feed.poller.FeedPoller.SYNC_INTERVAL', 0):
+                pollers[0].get('url_1')
+            assert sorted(pollers[0].subscriptions) == sorted(pollers[1].subscriptions) == ['url_1', 'url_2']
+            assert pollers[1].unsubscribe('url_1')
+            assert not pollers[0].unsubscribe('url_1')
+            assert list(pollers[0].subscriptions) == ['url_2']
+            feeds = os.path.join(directory, 'feeds')
+            with open(feeds, 'w') as f:
+                f.write('url_2\nurl_4\n')
+            restarted = self.create_poller(MagicMock(), registry=registry)
+            restarted.load(feeds)
+            assert sorted(restarted.subscriptions) == ['url_2', 'url_4']
@@ -0,0 +1,66 @@
+import unittest
+
+from src.feed.models import Feed, FeedItem, FeedItemDescriptionBlock
+from src.feed.query import FeedQuery
+
+
+class FeedQueryTests(unittest.TestCase):
+    """
+    TestCase containing tests for the FeedQuery class.
+    """
+
+    def test_from_json(self):
+        """
+        Queries should be built from lists or comma separated strings, and invalid parameters refused.
+        """
+        assert FeedQuery.from_json({'url': 'url'}) is None
+        query = FeedQuery.from_json({'fields': 'link, title', 'types': ['image'], 'offset': 2, 'limit': 3})
+        assert query.fields == ('title', 'link')
+        assert query.types == {'image'}
+        assert (query.offset, query.limit) == (2, 3)
+        query = FeedQuery.from_json({'limit': 1})
+        assert query.fields == FeedQuery.FIELDS
+        assert query.offset == 0
+        for jdata in [{'fields': ['guid']}, {'types': 'video'}, {'fields': 1}, {'limit': -1}, {'offset': 'a'},
+                      {'limit': True}]:
+            with self.subTest(jdata=jdata):
+                self.assertRaises(ValueError, FeedQuery.from_json, jdata)
+
+    def test_key(self):
+        """
+        Equivalent queries should share their key, and different ones not.
+        """
+        assert FeedQuery(['link', 'title']).key() == FeedQuery(['title', 'link']).key()
+        assert FeedQuery(limit=1).key() != FeedQuery(limit=2).key()
+        assert FeedQuery(types=['text']).key() != FeedQuery().key()
+
+    def test_wants_description(self):
+        """
+        Descriptions should only be parsed when requested with some block type.
+        """
+        assert FeedQuery().wants_description()
+        assert not FeedQuery(['title']).wants_description()
+        assert not FeedQuery(types=[]).wants_description()
+
+    def test_slice(self):
+        """
+        Slices should not consume more items than they need.
+        """
+        items = iter(range(10))
+        assert list(FeedQuery(offset=2, limit=3).slice(items)) == [2, 3, 4]
+        assert next(items) == 5
+        assert list(FeedQuery(offset=8).slice(range(10))) == [8, 9]
+
+    def test_select(self):
+        """
+        Selecting from a parsed feed should slice its items and filter their blocks, leaving the feed untouched.
+        """
+        blocks = [FeedItemDescriptionBlock(FeedItemDescriptionBlock.TEXT_TYPE, 'text'),
+                  FeedItemDescriptionBlock(FeedItemDescriptionBlock.IMAGE_TYPE, 'image')]
+        feed = Feed([FeedItem(str(i), f'l{i}', blocks) for i in range(3)], 'cursor')
+        selected = FeedQuery(types=['image'], offset=1).select(feed)
+        assert [item.title for item in selected.items] == ['1', '2']
+        assert [block.content for block in selected.items[0].description] == ['image']
+        assert selected.cursor == 'cursor'
+        assert len(feed.items[1].description) == 2
+        assert FeedQuery(['title']).select(feed).items[0].description is None
@@ -4,8 +4,13 @@ from xml.etree.ElementTree import ParseError
 
 from requests import RequestException
 
+from src.feed.dedup import FingerprintIndex
+from src.feed.formats import RSS
+from src.feed.health import HostHealth, CircuitOpen
 from src.feed.models import FeedItemDescriptionBlock
-from src.feed.reader import FeedReader, FeedParser
+from src.feed.parallel import ParsePool
+from src.feed.query import FeedQuery
+from src.feed.reader import FeedReader, FeedParser, blocks_size
 
 
 class FeedReaderTests(unittest.TestCase):
@@ -13,19 +18,61 @@ class FeedReaderTests(unittest.TestCase):
     TestCase containing tests for the feed Reader and Parser classes.
     """
 
-    @patch('src.feed.reader.requests.get')
+    def setUp(self):
+        """
+        Every test starts with empty caches.
+        """
+        FeedReader.FETCH_CACHE.clear()
+        FeedReader.HOST_HEALTH.clear()
+        FeedParser.ITEM_CACHE.clear()
+
+    @patch('src.feed.reader.FeedReader.SESSION.get')
     def test_get_content(self, requests):
         """
-        In the optimal scenario, we need only to make sure that the requests library is called with the correct inputs,
-        and that the returned contents are those also returned by the requests.get, so we mock the library
+        In the optimal scenario, we need only to make sure that the session is called with the correct inputs,
+        and that the returned contents are those also returned by the session's get, so we mock the session
         """
         url = 'test_url'
         requests.return_value.content = 'test_content'
         requests.return_value.status_code = 200
+        requests.return_value.headers = {}
         res = FeedReader.get_content(url)
-        requests.assert_called_with(url=url)
+        requests.assert_called_with(url, headers={})
         assert res == requests.return_value.content
 
+    @patch('src.feed.reader.FeedReader.SESSION.get')
+    def test_get_content_fresh_cache(self, requests):
+        """
+        A feed requested again while its cached contents are still fresh should not be requested at all.
+        """
+        url = 'test_url'
+        requests.return_value.content = 'test_content'
+        requests.return_value.status_code = 200
+        requests.return_value.headers = {}
+        FeedReader.get_content(url)
+        res = FeedReader.get_content(url)
+        assert requests.call_count == 1
+        assert res == 'test_content'
+
+    @patch('src.feed.reader.FeedReader.SESSION.get')
+    def test_get_content_revalidation(self, requests):
+        """
+        Stale contents should be revalidated with their validators, and reused when the server answers 304.
+        """
+        url = 'test_url'
+        requests.return_value.content = 'test_content'
+        requests.return_value.status_code = 200
+        requests.return_value.headers = {'ETag': '"abc"', 'Last-Modified': 'Mon, 18 Feb 2019 10:00:00 GMT'}
+        FeedReader.get_content(url)
+        FeedReader.FETCH_CACHE.get(url).expires = 0
+        requests.return_value.content = b''
+        requests.return_value.status_code = 304
+        res = FeedReader.get_content(url)
+        requests.assert_called_with(url, headers={'If-None-Match': '"abc"',
+                                                 'If-Modified-Since': 'Mon, 18 Feb 2019 10:00:00 GMT'})
+        assert res == 'test_content'
+        assert FeedReader.FETCH_CACHE.get(url).is_fresh()
+
     def test_get_content_invalid_url(self):
         """
         We need to make sure that a thrown RequestException is raised if something goes wrong.
@@ -35,7 +82,7 @@ class FeedReaderTests(unittest.TestCase):
         url = 'test_url'
         self.assertRaises(RequestException, FeedReader.get_content, url)
 
-    @patch('src.feed.reader.requests.get')
+    @patch('src.feed.reader.FeedReader.SESSION.get')
     def test_get_content_invalid_status_code(self, requests):
         """
         We also need to make sure that a RequestException is raised when a different status_code is returned
@@ -44,16 +91,51 @@ class FeedReaderTests(unittest.TestCase):
         url = 'http://test_url'
         self.assertRaises(RequestException, FeedReader.get_content, url)
 
-    @patch('src.feed.reader.ElementTree.XML')
-    def test_get_feed_root(self, xml):
+    @patch('src.feed.reader.FeedReader.HOST_HEALTH', HostHealth(2, 30))
+    @patch('src.feed.reader.FeedReader.SESSION.get')
+    def test_get_content_circuit_open(self, requests):
+        """
+        Hosts failing repeatedly should not be requested anymore: their stale contents should be served as they are,
+        and their other urls fail right away.
+        """
+        requests.return_value = MagicMock(content=b'content', status_code=200, headers={'Cache-Control': 'no-cache'})
+        FeedReader.get_content('http://host/cached')
+        requests.return_value.status_code = 503
+        self.assertRaises(RequestException, FeedReader.get_content, 'http://host/cached')
+        requests.side_effect = RequestException()
+        self.assertRaises(RequestException, FeedReader.get_content, 'http://host/other')
+        assert FeedReader.HOST_HEALTH.state('http://host') == HostHealth.OPEN
+        requests.reset_mock()
+        assert FeedReader.get_content('http://host/cached') == b'content'
+        self.assertRaises(CircuitOpen, FeedReader.get_content, 'http://host/other')
+        self.assertRaises(CircuitOpen, FeedReader.iter_content, 'http://host/other')
+        requests.assert_not_called()
+        assert FeedReader.HOST_HEALTH.state('http://other_host') == HostHealth.CLOSED
+
+    @patch('src.feed.reader.FeedReader.SESSION.stream')
+    def test_iter_content(self, stream):
+        """
+        The contents should be streamed in chunks, and a RequestException raised right away for invalid status codes.
+        """
+        url = 'test_url'
+        res = MagicMock(status_code=200)
+        stream.return_value = (res, iter([b'a', b'b']))
+        assert list(FeedReader.iter_content(url)) == [b'a', b'b']
+        stream.assert_called_with(url)
+        res.status_code = 404
+        self.assertRaises(RequestException, FeedReader.iter_content, url)
+        res.close.assert_called()
+
+    @patch('src.feed.reader.FeedReader.XML_PARSER')
+    def test_get_feed_root(self, xml_parser):
         """
         In the optimal scenario, we only need to make sure that the content is correctly being sent to the
-        etree methods, so we mock the ElementTree.
+        bounded XML parser, so we mock it.
         """
         content = 'test_content'
         FeedReader.get_feed_root(content)
-        xml.assert_called_with(content)
-        xml.return_value.find.assert_called_with(FeedReader.FEED_ROOT)
+        xml_parser.parse.assert_called_with(content)
+        xml_parser.parse.return_value.find.assert_called_with(FeedReader.FEED_ROOT)
 
     def test_get_feed_root_invalid_content(self):
         """
@@ -69,14 +151,143 @@ class FeedReaderTests(unittest.TestCase):
         We should make sure that we are looking for the right tag, sending all results to parse_item and returning a
         Feed object.
         """
-        parse_item.side_effect = lambda x: x+1
+        parse_item.side_effect = lambda x, query, feed_format: x+1
         items = [1, 2, 3, 4]
         feed = MagicMock()
-        feed.findall.return_value = items
+        feed.iterfind.return_value = iter(items)
         FeedParser.parse_feed(feed)
-        feed.findall.assert_called_with(FeedParser.ITEM_TAG)
-        parse_item.assert_has_calls([call(item) for item in items])
-        feed_cls.assert_called_with([parse_item.side_effect(x) for x in items])
+        feed.iterfind.assert_called_with(FeedParser.ITEM_TAG)
+        parse_item.assert_has_calls([call(item, None, RSS) for item in items])
+        feed_cls.assert_called_with([parse_item.side_effect(x, None, RSS) for x in items])
+
+    def test_parse_feed_parallel(self):
+        """
+        Feeds past the parallel threshold should be parsed by the pool, with the same results as a serial parse, and
+        their descriptions cached.
+        """
+        content = ('<rss><channel>' + ''.join(f'<item><title>{i}</title><link>l{i}</link>'
+                                              f'<description>&lt;p&gt;text {i}&lt;/p&gt;</description></item>'
+                                              for i in range(10)) + '</channel></rss>')
+        root = FeedReader.get_feed_root(content)
+        serial = FeedParser.parse_feed(root).to_json()
+        FeedParser.ITEM_CACHE.clear()
+        pool = ParsePool(2)
+        try:
+            with patch('src.feed.reader.FeedParser.PARSE_POOL', pool), \
+                    patch('src.feed.reader.FeedParser.PARALLEL_THRESHOLD', 5):
+                assert FeedParser.parse_feed(root).to_json() == serial
+        finally:
+            pool.shutdown()
+        assert len(FeedParser.ITEM_CACHE) == 10
+
+    @patch('src.feed.reader.FeedParser.parse_description')
+    def test_parse_feed_since(self, parse_description):
+        """
+        Given a cursor, only the items before the one it identifies should be parsed, guids taking precedence over
+        links.
+        """
+        content = ('<rss><channel>'
+                   '<item><title>c</title><link>lc</link><guid>gc</guid><description>dc</description></item>'
+                   '<item><title>b</title><link>lb</link><description>db</description></item>'
+                   '<item><title>a</title><link>la</link><description>da</description></item>'
+                   '</channel></rss>')
+        root = FeedReader.get_feed_root(content)
+        assert [item.title for item in FeedParser.parse_feed(root, 'lb').items] == ['c']
+        assert [c[0][0].text for c in parse_description.call_args_list] == ['dc']
+        assert FeedParser.parse_feed(root, 'gc').items == []
+        assert len(FeedParser.parse_feed(root, 'lc').items) == 3
+        assert FeedParser.parse_feed(root).items[0].identifier() == 'gc'
+
+    @patch('src.feed.reader.FeedParser.parse_description')
+    def test_parse_feed_query(self, parse_description):
+        """
+        Given a query, items past its slice should not be visited, and descriptions only be parsed when requested.
+        """
+        content = ('<rss><channel>' + ''.join(f'<item><title>{i}</title><link>l{i}</link>'
+                                              f'<description>d{i}</description></item>'
+                                              for i in range(5)) + '</channel></rss>')
+        root = FeedReader.get_feed_root(content)
+        parse_description.return_value = [FeedItemDescriptionBlock(FeedItemDescriptionBlock.TEXT_TYPE, 'text')]
+        feed = FeedParser.parse_feed(root, query=FeedQuery(['title', 'link'], offset=1, limit=2))
+        assert [item.title for item in feed.items] == ['1', '2']
+        assert all(item.description is None for item in feed.items)
+        parse_description.assert_not_called()
+        feed = FeedParser.parse_feed(root, 'l3', FeedQuery(types=['image'], offset=1))
+        assert [item.title for item in feed.items] == ['1', '2']
+        assert all(item.description == [] for item in feed.items)
+        assert [c[0][0].text for c in parse_description.call_args_list] == ['d1', 'd2']
+
+    @patch('src.feed.reader.FeedParser.parse_description')
+    def test_iter_feed(self, parse_description):
+        """
+        Items should be yielded in order as their chunks arrive, ignoring item tags outside of the FEED_ROOT, and
+        removed from the tree once parsed.
+        """
+        content = (b'<rss><channel><title>feed</title>'
+                   b'<item><title>a</title><link>la</link><description>da</description></item>'
+                   b'<other><item><title>x</title></item></other>'
+                   b'<item><title>b</title><link>lb</link><description>db</description></item>'
+                   b'</channel></rss>')
+        chunks = [content[i:i + 7] for i in range(0, len(content), 7)]
+        items = list(FeedParser.iter_feed(chunks))
+        assert [(item.title, item.link) for item in items] == [('a', 'la'), ('b', 'lb')]
+        assert [c[0][0].text for c in parse_description.call_args_list] == ['da', 'db']
+
+    def test_parse_feed_formats(self):
+        """
+        Atom, RSS 1.0 (RDF) and content:encoded bodies should be detected and parsed into the same model as RSS.
+        """
+        description = '&lt;p&gt;body&lt;/p&gt;'
+        contents = {
+            'rss': '<rss xmlns:content="http://purl.org/rss/1.0/modules/content/"><channel><item><title>t</title>'
+                   f'<link>l</link><guid>g</guid><content:encoded>{description}</content:encoded></item>'
+                   '</channel></rss>',
+            'rdf': '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/">'
+                   '<channel rdf:about="c"><title>feed</title></channel><item rdf:about="g"><title>t</title>'
+                   f'<link>l</link><description>{description}</description></item></rdf:RDF>',
+            'atom': '<feed xmlns="http://www.w3.org/2005/Atom"><title>feed</title><entry><title>t</title>'
+                    '<link rel="self" href="s"/><link href="l"/><id>g</id>'
+                    f'<content type="html">{description}</content></entry></feed>',
+        }
+        for name, content in contents.items():
+            with self.subTest(format=name):
+                feed = FeedParser.parse_feed(FeedReader.get_feed_root(content))
+                assert len(feed.items) == 1
+                item = feed.items[0]
+                assert (item.title, item.link, item.guid) == ('t', 'l', 'g')
+                assert [block.content for block in item.description] == ['body']
+                streamed = list(FeedParser.iter_feed([content.encode('utf-8')]))
+                assert [(item.title, item.link, item.guid) for item in streamed] == [('t', 'l', 'g')]
+                since = FeedParser.parse_feed(FeedReader.get_feed_root(content), since='g')
+                assert since.items == []
+
+    @patch('src.feed.reader.FeedParser.parse_description')
+    def test_parse_feed_unique(self, parse_description):
+        """
+        Items already seen in the same batch, syndicated copies included, should be collapsed into references before
+        their descriptions are parsed.
+        """
+        parse_description.side_effect = lambda description: [
+            FeedItemDescriptionBlock(FeedItemDescriptionBlock.TEXT_TYPE, description.text)]
+        first = ('<rss><channel><item><title>a</title><link>https://example.com/a</link><description>a</description>'
+                 '</item><item><title>b</title><link>https://example.com/b</link><description>b</description></item>'
+                 '</channel></rss>')
+        second = ('<feed xmlns="http://www.w3.org/2005/Atom"><entry><title>c</title><link href="http://c"/>'
+                  '<content>c</content></entry><entry><title>copy</title>'
+                  '<link href="https://www.example.com/b/?utm_source=x"/><content> b </content></entry></feed>')
+        index = FingerprintIndex()
+        feeds = [FeedParser.parse_feed_unique(FeedReader.get_feed_root(content), index, result)
+                 for result, content in enumerate([first, second])]
+        assert [item.title for item in feeds[0].items] == ['a', 'b']
+        assert feeds[1].items[0].title == 'c'
+        assert feeds[1].items[1].to_dict() == {'ref': {'result': 0, 'item': 1}}
+        assert parse_description.call_count == 3
+
+    def test_iter_feed_invalid_content(self):
+        """
+        If any parsing error occurs, we should make sure that it reaches the outer scope.
+        """
+        self.assertRaises(ParseError, list, FeedParser.iter_feed([b'<rss><channel>', b'</rss>']))
 
     @patch('src.feed.reader.FeedItem')
     @patch('src.feed.reader.FeedParser.parse_title')
@@ -84,20 +295,59 @@ class FeedReaderTests(unittest.TestCase):
     @patch('src.feed.reader.FeedParser.parse_description')
     def test_parse_item(self, parse_description, parse_link, parse_title, feeditem_cls):
         """
-        We need to make sure that the three content tags are being searched for; the correct tags are being sent to
+        We need to make sure that the content tags are being searched for; the correct tags are being sent to
         their parse_ functions; and that the FeedItem class is being correctly build. We mock everything else.
         """
+        elements = {}
+
+        def find_side_effect(tag):
+            elements[tag] = MagicMock(text=tag[::-1])
+            return elements[tag]
 
         item = MagicMock()
-        item.find.side_effect = lambda x: x[::-1]
+        item.find.side_effect = find_side_effect
         FeedParser.parse_item(item)
-        item.find.assert_has_calls([call(tag) for tag in [FeedParser.TITLE_TAG, FeedParser.LINK_TAG, FeedParser.DESCRIPTION_TAG]])
-        parse_title.assert_called_with(item.find.side_effect(FeedParser.TITLE_TAG))
-        parse_link.assert_called_with(item.find.side_effect(FeedParser.LINK_TAG))
-        parse_description.assert_called_with(item.find.side_effect(FeedParser.DESCRIPTION_TAG))
+        item.find.assert_has_calls([call(tag) for tag in [FeedParser.TITLE_TAG, FeedParser.LINK_TAG,
+                                                          FeedParser.DESCRIPTION_TAG, FeedParser.GUID_TAG]])
+        parse_title.assert_called_with(elements[FeedParser.TITLE_TAG])
+        parse_link.assert_called_with(elements[FeedParser.LINK_TAG])
+        parse_description.assert_called_with(elements[FeedParser.DESCRIPTION_TAG])
         feeditem_cls.assert_called_with(parse_title.return_value,
                                         parse_link.return_value,
-                                        parse_description.return_value)
+                                        parse_description.return_value,
+                                        elements[FeedParser.GUID_TAG].text)
+
+    @patch('src.feed.reader.FeedParser.parse_description')
+    def test_parse_cached_description(self, parse_description):
+        """
+        Descriptions should only be parsed once per item identifier and description text.
+        """
+        guid = MagicMock(text='guid')
+        description = MagicMock(text='<p>description</p>')
+        first = FeedParser.parse_cached_description(guid, description)
+        second = FeedParser.parse_cached_description(guid, description)
+        assert first is second is parse_description.return_value
+        parse_description.assert_called_once_with(description)
+        assert FeedParser.ITEM_CACHE.hits == 1
+        assert FeedParser.ITEM_CACHE.misses == 1
+        FeedParser.parse_cached_description(guid, MagicMock(text='<p>changed</p>'))
+        FeedParser.parse_cached_description(MagicMock(text='other_guid'), description)
+        assert parse_description.call_count == 3
+
+    def test_item_cache_size(self):
+        """
+        The item cache should be bounded by the total length of the cached blocks' contents, too.
+        """
+        blocks = [FeedItemDescriptionBlock(FeedItemDescriptionBlock.TEXT_TYPE, 'text'),
+                  FeedItemDescriptionBlock(FeedItemDescriptionBlock.IMAGE_TYPE, 'img'),
+                  FeedItemDescriptionBlock(FeedItemDescriptionBlock.LINKS_TYPE, ['a', 'bb'])]
+        assert blocks_size(blocks) == 10
+        with patch('src.feed.reader.FeedParser.ITEM_CACHE.max_size', 25):
+            for guid in ('a', 'b', 'c'):
+                with patch('src.feed.reader.FeedParser.parse_description', return_value=blocks):
+                    FeedParser.parse_cached_description(MagicMock(text=guid), MagicMock(text='description'))
+            assert len(FeedParser.ITEM_CACHE) == 2
+            assert FeedParser.ITEM_CACHE.size == 20
 
     def test_parse_title(self):
         """
@@ -117,49 +367,12 @@ class FeedReaderTests(unittest.TestCase):
         result = FeedParser.parse_link(link)
         assert result == link.text
 
-    @patch('src.feed.reader.BeautifulSoup')
-    @patch('src.feed.reader.FeedItemDescriptionBlock')
-    def test_parse_description(self, block, soup):
-        """
-        The tricky one. There are 4 base cases we should make sure are working:
-
-        1- A filled paragraph, which is a PARAGRAPH_TAG with actual content;
-        2- Images inside DIV_TAGs, which should contain IMG_TAGs with IMG_URL_ATTRB;
-        3- Links inside DIV_TAGs, which should contain LINKS_TAGs with a number of URL_TAGs, each with a LINK_REF_ATTRB.
-        4- An empty paragraph, which is a PARAGRAPH_TAG without valid content;
-        5- Images inside DIV_TAGs, which should contain IMG_TAGs but no IMG_URL_ATTRB;
-        6- URL_TAGs without a LINK_REF_ATTRB.
-
-        We are testing whether cases 1-3 have been appended, making sure that cases 4-6 have not.
-        """
-        def div_side_effect(x):
-            if x == FeedParser.IMG_TAG:
-                return [{FeedParser.IMG_URL_ATTRB: 'image_url'},
-                        {'test': 'invalid_image_url'}]
-            if x == FeedParser.LINKS_TAG:
-                ul = MagicMock()
-                ul.find_all.return_value = [{FeedParser.LINK_REF_ATTRB: 'link_url_1'},
-                                            {FeedParser.LINK_REF_ATTRB: 'link_url_2'},
-                                            {'test': 'invalid_link_url'}]
-                return [ul]
-        block.TEXT_TYPE = 'text'
-        block.IMAGE_TYPE = 'image'
-        block.LINKS_TYPE = 'links'
-        soup.return_value = MagicMock()
-        empty_paragraph = MagicMock()
-        empty_paragraph.name = FeedParser.PARAGRAPH_TAG
-        empty_paragraph.get_text.return_value = '\n\xa0\t'
-        filled_paragraph = MagicMock()
-        filled_paragraph.name = FeedParser.PARAGRAPH_TAG
-        filled_paragraph.get_text.return_value = 'abc\n\xa0\tdef'
-        div = MagicMock()
-        div.name = FeedParser.DIV_TAG
-        div.find_all.side_effect = div_side_effect
-        soup.return_value.children = [empty_paragraph, filled_paragraph, div]
+    @patch('src.feed.reader.FeedParser.DESCRIPTION_PARSER')
+    def test_parse_description(self, backend):
+        """
+        Descriptions should be parsed by the configured backend, given their text.
+        """
         description = MagicMock()
-        FeedParser.parse_description(description)
-        block.assert_called()
-        block.assert_has_calls([call(FeedItemDescriptionBlock.TEXT_TYPE, 'abc  def'),
-                                call(FeedItemDescriptionBlock.IMAGE_TYPE, 'image_url'),
-                                call(FeedItemDescriptionBlock.LINKS_TYPE, ['link_url_1', 'link_url_2'])
-                                ])
+        res = FeedParser.parse_description(description)
+        backend.parse.assert_called_with(description.text)
+        assert res == backend.parse.return_value
@@ -0,0 +1,56 @@
+import unittest
+from xml.etree.ElementTree import ParseError
+
+from src.feed.safexml import BoundedXMLParser, XMLLimitExceeded
+
+
+class BoundedXMLParserTests(unittest.TestCase):
+    """
+    TestCase containing tests for the BoundedXMLParser class.
+    """
+
+    def setUp(self):
+        self.parser = BoundedXMLParser(1024 * 1024, 8, 100)
+
+    def test_parse(self):
+        """
+        Documents within the limits should be parsed, external document type declarations included.
+        """
+        root = self.parser.parse(b'<?xml version="1.0"?>\n<!-- comment -->\n'
+                                 b'<!DOCTYPE rss PUBLIC "-//Netscape//DTD RSS 0.91//EN" "rss-0.91[1].dtd">'
+                                 b'<rss><channel><title>t</title></channel></rss>')
+        assert root.tag == 'rss'
+        assert root.find('channel/title').text == 't'
+        assert self.parser.parse('<rss>ç</rss>').text == 'ç'
+        assert self.parser.parse(memoryview(b'<rss>t</rss>')).text == 't'
+        self.assertRaises(ParseError, self.parser.parse, b'<rss>')
+        self.assertRaises(ParseError, self.parser.parse, b'')
+
+    def test_limits(self):
+        """
+        Documents past any of the limits should be rejected, as well as the ones declaring entities, in any encoding.
+        """
+        entities = '<?xml version="1.0"?><!DOCTYPE x [<!ENTITY a "a"><!ENTITY b "&a;&a;">]><x>&b;</x>'
+        documents = {
+            'entities': entities.encode('utf-8'),
+            'utf-16 entities': entities.encode('utf-16'),
+            'bom entities': entities.encode('utf-8-sig'),
+            'depth': b'<a>' * 9 + b'</a>' * 9,
+            'elements': b'<r>' + b'<a/>' * 100 + b'</r>',
+            'bytes': b'<r>' + b' ' * 1024 * 1024 + b'</r>',
+            'prolog': b'<!--' + b' ' * 1024 * 1024,
+        }
+        for name, document in documents.items():
+            with self.subTest(document=name):
+                self.assertRaises(XMLLimitExceeded, self.parser.parse, document)
+                self.assertRaises(XMLLimitExceeded, self.parser.parse, memoryview(document))
+
+    def test_iter_events(self):
+        """
+        Events should be the same as XMLPullParser's, wherever the chunks are split, and declarations split across
+        chunks should be rejected before they are parsed.
+        """
+        events = [(event, element.tag) for event, element in self.parser.iter_events([b'<r', b'ss><a/><', b'/rss>'])]
+        assert events == [('start', 'rss'), ('start', 'a'), ('end', 'a'), ('end', 'rss')]
+        chunks = [b'<?xml version="1.0"?><!DOC', b'TYPE x [<!ENTITY a "b">]><x>&a;</x>']
+        self.assertRaises(XMLLimitExceeded, list, self.parser.iter_events(chunks))
@@ -0,0 +1,109 @@
+import gzip
+import time
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from threading import Thread
+
+from requests import RequestException
+
+from src.feed.session import FeedSession, ResponseTooLarge
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    body = b'<rss>' + b'x' * 2000 + b'</rss>'
+
+    def do_GET(self):
+        body = self.body
+        headers = {}
+        if self.path == '/gzip':
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        elif self.path == '/slow':
+            time.sleep(0.5)
+        self.send_response(200)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        if self.path == '/chunked':
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for _ in range(4):
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(body), body))
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients aborting oversized downloads break the connection on purpose.
+        pass
+
+
+class FeedSessionTests(unittest.TestCase):
+    """
+    TestCase containing tests for the FeedSession class, against a local HTTP server.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = _Server(('127.0.0.1', 0), _Handler)
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_get(self):
+        """
+        Responses should be fully downloaded, and decoded when compressed.
+        """
+        session = FeedSession(1, 1, 10000, 10, 2)
+        for path in ['/', '/gzip']:
+            res = session.get(self.url + path)
+            assert res.status_code == 200
+            assert res.content == _Handler.body
+        assert 'gzip' in session.session.headers['Accept-Encoding']
+
+    def test_session_reuse(self):
+        """
+        The same session, and its connection pools, should be used by every request of a process.
+        """
+        session = FeedSession(1, 1, 10000, 10, 2)
+        assert session.session is session.session
+
+    def test_max_bytes(self):
+        """
+        Bodies bigger than the maximum size should be refused, whether announced by their Content-Length or not.
+        """
+        session = FeedSession(1, 1, 1000, 10, 2)
+        self.assertRaises(ResponseTooLarge, session.get, self.url + '/')
+        session = FeedSession(1, 1, 5000, 10, 2)
+        self.assertRaises(ResponseTooLarge, session.get, self.url + '/chunked')
+        res, chunks = session.stream(self.url + '/chunked')
+        self.assertRaises(ResponseTooLarge, list, chunks)
+
+    def test_read_timeout(self):
+        """
+        Servers slower than the read timeout should result in a RequestException.
+        """
+        session = FeedSession(1, 0.1, 10000, 10, 2)
+        self.assertRaises(RequestException, session.get, self.url + '/slow')
+
+    def test_malformed_url(self):
+        """
+        Urls the HTTP client fails to parse should result in a RequestException too.
+        """
+        session = FeedSession(1, 1, 10000, 10, 2)
+        for url in ('http://[host/', 'http://host:port/'):
+            self.assertRaises(RequestException, session.get, url)
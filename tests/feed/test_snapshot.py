@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from src.feed.cache import FetchCache, ResultCache, MemoryResultBackend, DiskResultBackend
+from src.feed.snapshot import save_snapshot, load_snapshot, MAGIC
+
+
+class SnapshotTests(unittest.TestCase):
+    """
+    TestCase containing tests for the caches' snapshots.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'snapshot.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @staticmethod
+    def filled_caches():
+        fetch_cache = FetchCache(60, 10, 1024)
+        fetch_cache.store('fresh', MagicMock(content=b'fresh content', headers={'ETag': '"a"'}))
+        fetch_cache.store('stale', MagicMock(content=b'stale content', headers={'Last-Modified': 'date',
+                                                                                'Cache-Control': 'max-age=0'}))
+        result_cache = ResultCache(MemoryResultBackend(10, 1024))
+        result_cache.set('key_1', b'result 1')
+        result_cache.set('key_2', b'result 2')
+        return fetch_cache, result_cache
+
+    def test_snapshot_roundtrip(self):
+        """
+        Loaded snapshots should restore the fetched contents with their validators and freshness, and the results, in
+        their least recently used order.
+        """
+        assert save_snapshot(self.path, *self.filled_caches()) == (2, 2)
+        fetch_cache, result_cache = FetchCache(60, 10, 1024), ResultCache(MemoryResultBackend(10, 1024))
+        assert load_snapshot(self.path, fetch_cache, result_cache) == (2, 2)
+        fresh, stale = fetch_cache.get('fresh'), fetch_cache.get('stale')
+        assert (fresh.content, fresh.etag, fresh.is_fresh()) == (b'fresh content', '"a"', True)
+        assert (stale.content, stale.validators(), stale.is_fresh()) == (b'stale content',
+                                                                         {'If-Modified-Since': 'date'}, False)
+        assert result_cache.items() == [('key_1', b'result 1'), ('key_2', b'result 2')]
+        assert [url for url, _ in fetch_cache.entries()] == ['fresh', 'stale']
+        assert not [name for name in os.listdir(self.directory.name) if name != 'snapshot.bin']
+
+    def test_snapshot_shared_results(self):
+        """
+        Results of shared backends should be left out of snapshots, since they already outlive the processes.
+        """
+        fetch_cache, _ = self.filled_caches()
+        result_cache = ResultCache(DiskResultBackend(os.path.join(self.directory.name, 'results'), 10))
+        result_cache.set('key', b'result')
+        assert save_snapshot(self.path, fetch_cache, result_cache) == (2, 0)
+
+    def test_load_invalid_snapshot(self):
+        """
+        Missing snapshots, and snapshots in another format, should be ignored, and truncated ones read up to their
+        last complete record.
+        """
+        caches = FetchCache(60, 10, 1024), ResultCache(MemoryResultBackend(10, 1024))
+        assert load_snapshot(self.path, *caches) == (0, 0)
+        with open(self.path, 'wb') as f:
+            f.write(b'not a snapshot')
+        assert load_snapshot(self.path, *caches) == (0, 0)
+        save_snapshot(self.path, *self.filled_caches())
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        assert content.startswith(MAGIC)
+        with open(self.path, 'wb') as f:
+            f.write(content[:-3])
+        assert load_snapshot(self.path, *caches) == (2, 1)
+        assert caches[1].items() == [('key_1', b'result 1')]
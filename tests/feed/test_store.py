@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.feed.store import SegmentStore, _Segment
+
+
+class SegmentStoreTests(unittest.TestCase):
+    """
+    TestCase containing tests for the SegmentStore class.
+    """
+
+    def setUp(self):
+        """
+        Every test gets its own store directory.
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_set(self):
+        """
+        The newest value of a key should be read, straight from the memory map when asked for a view.
+        """
+        store = SegmentStore(self.directory, 1024 * 1024, 1024)
+        assert store.get('key') is None
+        store.set('key', b'value')
+        store.set('other', b'')
+        store.set('key', b'new value')
+        assert store.get('key') == b'new value'
+        assert store.get('other') == b''
+        view = store.get_view('key')
+        assert isinstance(view, memoryview)
+        assert view == b'new value'
+        assert len(store) == 2
+
+    def test_shared(self):
+        """
+        Values should survive restarts, and be shared by stores on the same directory, overwrites included.
+        """
+        first = SegmentStore(self.directory, 1024 * 1024, 1024)
+        second = SegmentStore(self.directory, 1024 * 1024, 1024)
+        first.set('key', b'value')
+        assert second.get('key') == b'value'
+        second.set('key', b'changed')
+        assert first.get('key') == b'changed'
+        assert SegmentStore(self.directory, 1024 * 1024, 1024).get('key') == b'changed'
+        first.clear()
+        assert second.get('key') is None
+
+    def test_segments_and_compaction(self):
+        """
+        Segments should be rotated past segment_bytes, and compacted into the most recent values past max_bytes,
+        without disturbing views already handed out.
+        """
+        store = SegmentStore(self.directory, 4096, 1024)
+        view = None
+        for i in range(100):
+            store.set(f'key{i}', bytes([i]) * 100)
+            if i == 0:
+                view = store.get_view('key0')
+        segments = [name for name in os.listdir(self.directory) if name.endswith('.dat')]
+        assert 0 < sum(os.path.getsize(os.path.join(self.directory, name)) for name in segments) <= 4096
+        assert store.get('key99') == bytes([99]) * 100
+        assert store.get('key0') is None
+        assert view == bytes([0]) * 100
+        assert SegmentStore(self.directory, 4096, 1024).get('key99') == bytes([99]) * 100
+
+    def test_torn_record(self):
+        """
+        A torn record at the end of a segment should be ignored, and overwritten by the next append.
+        """
+        store = SegmentStore(self.directory, 1024 * 1024, 1024 * 1024)
+        store.set('key', b'value')
+        path = os.path.join(self.directory, [name for name in os.listdir(self.directory) if name.endswith('.dat')][0])
+        with open(path, 'ab') as f:
+            f.write(b'\x00\x01\x02')
+        reopened = SegmentStore(self.directory, 1024 * 1024, 1024 * 1024)
+        assert reopened.get('key') == b'value'
+        reopened.set('next', b'value')
+        assert SegmentStore(self.directory, 1024 * 1024, 1024 * 1024).get('next') == b'value'
+
+    def test_removed_segment(self):
+        """
+        Segments removed by another process's compaction between being measured and mapped should just be skipped.
+        """
+        store = SegmentStore(self.directory, 1024 * 1024, 1024)
+        segment = _Segment(os.path.join(self.directory, 'segment-00000000.dat'))
+        with patch('src.feed.store.os.path.getsize', return_value=64):
+            store._scan(segment)
+        assert segment.scanned == 0
+        assert store.get('key') is None